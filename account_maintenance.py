@@ -0,0 +1,94 @@
+import os
+import time
+import create_song
+from aws.aws import AWS
+import utils.utils as utils
+import constants as CONSTANTS
+from datetime import datetime
+from dotenv import load_dotenv
+from db.supabase import Supabase
+import driver.driver as SELENIUM_DRIVER
+import login_profiles as LOGIN_PROFILES
+from scrape_song.suno_api import SunoApi
+from checkpoint.checkpoint import get_pending_song_ids
+from structured_logging.structured_logging import setup_logging
+
+def get_song_age(song):
+    """Seconds since a library song was created, or None if Suno didn't say."""
+    try:
+        return time.time() - datetime.fromisoformat(song["created_at"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def clean_up_library(driver, phone_number):
+    """Trash every song of the account's library that no pending generation is waiting for. Returns the number of trashed songs or None."""
+    protected_song_ids = get_pending_song_ids(Supabase(), phone_number)
+    if protected_song_ids is None:
+        print("ACCOUNT_MAINTENANCE: Could not read the pending checkpoints, so nothing can be safely deleted.")
+        return None
+
+    suno_api = SunoApi(driver)
+    songs = suno_api.list_library()
+    if songs is None:
+        print("ACCOUNT_MAINTENANCE: Could not list the songs of the library.")
+        return None
+
+    stale_song_ids = []
+    for song in songs:
+        song_age = get_song_age(song)
+        if song.get("is_trashed") or song.get("id") in protected_song_ids or song_age is None or song_age < CONSTANTS.LIBRARY_CLEANUP_MIN_AGE:
+            continue
+        stale_song_ids.append(song["id"])
+
+    print(f"ACCOUNT_MAINTENANCE: Found {len(stale_song_ids)} songs to delete out of {len(songs)} ({len(protected_song_ids)} protected by pending generations).")
+    if not stale_song_ids:
+        return 0
+
+    trashed_songs = suno_api.trash_songs(stale_song_ids)
+    print(f"ACCOUNT_MAINTENANCE: Deleted {trashed_songs} songs from the library of {phone_number}.")
+    return trashed_songs
+
+def run_account_maintenance():
+    """Logs into the account of PHONE_NUMBER and empties its library of stale songs."""
+    load_dotenv()
+
+    phone_number = os.getenv('PHONE_NUMBER')
+    if not phone_number or phone_number not in LOGIN_PROFILES.login_profiles:
+        print("ACCOUNT_MAINTENANCE: Inexistent phone number.")
+        return False
+
+    if not create_song.check_suno_creds() or not create_song.check_general_vars():
+        print("ACCOUNT_MAINTENANCE: Could not pass the initial checks.")
+        return False
+
+    aws = AWS()
+    chrome_profiles_dir = utils.place_working_directory(CONSTANTS.CHROME_PROFILES_DIR_PATH, CONSTANTS.CHROME_PROFILE_TMPFS_RESERVE)
+    downloads_dir = os.path.join(utils.place_working_directory(CONSTANTS.DOWNLOADS_DIR_PATH, CONSTANTS.DOWNLOADS_TMPFS_RESERVE), "account_maintenance")
+
+    driver = SELENIUM_DRIVER.setup_chrome_driver(aws, chrome_profiles_dir, downloads_dir)
+    if not driver:
+        print("ACCOUNT_MAINTENANCE: Could not instantiate the Selenium driver.")
+        return False
+
+    trashed_songs = None
+    try:
+        driver.set_page_load_timeout(CONSTANTS.PAGE_LOAD_TIMEOUT)
+
+        open_create_page_error = create_song.open_create_page(driver)
+        if open_create_page_error:
+            print(f"ACCOUNT_MAINTENANCE: {open_create_page_error}")
+            return False
+
+        trashed_songs = clean_up_library(driver, phone_number)
+    except Exception as e:
+        print(f"ACCOUNT_MAINTENANCE: An unexpected error occurred: {e}.")
+    finally:
+        create_song.close_driver(driver)
+        utils.delete_directory(downloads_dir)
+        create_song.save_chrome_profile(aws, chrome_profiles_dir, phone_number)
+
+    return trashed_songs is not None
+
+if __name__ == '__main__':
+    setup_logging()
+    run_account_maintenance()
@@ -0,0 +1,230 @@
+import os
+import wave
+import shutil
+import struct
+import subprocess
+import multiprocessing
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor
+
+MP3_BITRATES = {
+    "mpeg1": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    "mpeg2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000]
+}
+
+class AudioPostProcessor:
+    """Validates, probes and transcodes downloaded songs in worker processes so the browser thread never waits on CPU-heavy work."""
+
+    def __init__(self):
+        load_dotenv()
+        self.target_formats = [target_format for target_format in os.getenv("AUDIO_TARGET_FORMATS", CONSTANTS.AUDIO_TARGET_FORMATS).split(",") if target_format]
+        self.normalize_loudness = os.getenv("AUDIO_NORMALIZE_LOUDNESS", str(CONSTANTS.AUDIO_NORMALIZE_LOUDNESS)).lower() == "true"
+        # Spawned workers don't inherit the driver and heartbeat threads of this process
+        self.executor = ProcessPoolExecutor(max_workers=CONSTANTS.AUDIO_PROCESSING_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, song_path):
+        """Start processing a downloaded song. The future resolves to the result of process_audio."""
+        return self.executor.submit(process_audio, song_path, self.target_formats, self.normalize_loudness)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+def process_audio(song_path, target_formats=(), normalize_loudness=False):
+    """Check that a song decodes, read its real duration, transcode it and summarize its waveform."""
+    result = {"valid": False, "duration": None, "waveform": None, "outputs": {}}
+
+    probe = probe_audio(song_path)
+    if not probe or not probe["duration"]:
+        print(f"AUDIO_PROCESSING: Could not read the headers of {song_path}.")
+        return result
+
+    result["duration"] = round(probe["duration"], 2)
+    if result["duration"] < CONSTANTS.MIN_SONG_LENGTH:
+        print(f"AUDIO_PROCESSING: {song_path} only lasts {result['duration']} seconds.")
+        return result
+
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path and not decodes_cleanly(ffmpeg_path, song_path):
+        print(f"AUDIO_PROCESSING: {song_path} does not decode cleanly.")
+        return result
+
+    result["valid"] = True
+    result["waveform"] = compute_waveform(ffmpeg_path, song_path, probe)
+
+    for target_format in target_formats:
+        if not ffmpeg_path:
+            print("AUDIO_PROCESSING: ffmpeg is not installed, so the song can't be transcoded.")
+            break
+
+        output_path = transcode(ffmpeg_path, song_path, target_format, normalize_loudness)
+        if output_path:
+            result["outputs"][target_format] = output_path
+
+    return result
+
+def probe_audio(song_path):
+    """Read the format and the duration of a song from its container headers."""
+    extension = os.path.splitext(song_path)[1].lower()
+    try:
+        if extension == ".wav":
+            return probe_wav(song_path)
+        return probe_mp3(song_path)
+    except Exception as e:
+        print(f"AUDIO_PROCESSING: Got an error reading the headers of {song_path}. Details: {e}")
+        return None
+
+def probe_wav(song_path):
+    with wave.open(song_path, 'rb') as wav_file:
+        return {
+            "format": "wav",
+            "duration": wav_file.getnframes() / wav_file.getframerate(),
+            "sample_rate": wav_file.getframerate(),
+            "channels": wav_file.getnchannels(),
+            "sample_width": wav_file.getsampwidth()
+        }
+
+def probe_mp3(song_path):
+    """Find the first MPEG audio frame and get the duration from its Xing/Info or VBRI header, or from the bitrate for CBR files."""
+    file_size = os.path.getsize(song_path)
+    with open(song_path, 'rb') as song_file:
+        # Skip the ID3 tag (cover art can make it larger than the scan window) before reading the frames
+        audio_start = 0
+        id3_header = song_file.read(10)
+        if id3_header[:3] == b"ID3" and len(id3_header) == 10:
+            tag_size = (id3_header[6] << 21) | (id3_header[7] << 14) | (id3_header[8] << 7) | id3_header[9]
+            audio_start = 10 + tag_size + (10 if id3_header[5] & 0x10 else 0)
+
+        song_file.seek(audio_start)
+        data = song_file.read(CONSTANTS.AUDIO_HEADER_SCAN_BYTES)
+
+    offset = 0
+    while offset + 4 <= len(data):
+        frame = parse_mp3_frame_header(data[offset:offset + 4])
+        # A real frame is followed by another one, which rules out stray sync bytes
+        if frame and parse_mp3_frame_header(data[offset + frame["length"]:offset + frame["length"] + 4]):
+            break
+        offset += 1
+    else:
+        return None
+
+    side_info_size = (32 if frame["channels"] == 2 else 17) if frame["version"] == 3 else (17 if frame["channels"] == 2 else 9)
+    xing_offset = offset + 4 + side_info_size
+    frame_count = None
+    if data[xing_offset:xing_offset + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing_offset + 4:xing_offset + 8])[0]
+        if flags & 0x1:
+            frame_count = struct.unpack(">I", data[xing_offset + 8:xing_offset + 12])[0]
+    elif data[offset + 36:offset + 40] == b"VBRI":
+        frame_count = struct.unpack(">I", data[offset + 50:offset + 54])[0]
+
+    if frame_count:
+        duration = frame_count * frame["samples_per_frame"] / frame["sample_rate"]
+    else:
+        duration = (file_size - audio_start - offset) * 8 / (frame["bitrate"] * 1000)
+
+    return {
+        "format": "mp3",
+        "duration": duration,
+        "sample_rate": frame["sample_rate"],
+        "channels": frame["channels"],
+        "bitrate": frame["bitrate"]
+    }
+
+def parse_mp3_frame_header(header):
+    """Parse a Layer III frame header. Returns None if the bytes aren't one."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+
+    version = (header[1] >> 3) & 0x3
+    layer = (header[1] >> 1) & 0x3
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = MP3_BITRATES["mpeg1" if version == 3 else "mpeg2"][bitrate_index]
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    samples_per_frame = 1152 if version == 3 else 576
+    padding = (header[2] >> 1) & 0x1
+
+    return {
+        "version": version,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "samples_per_frame": samples_per_frame,
+        "channels": 1 if header[3] >> 6 == 3 else 2,
+        "length": samples_per_frame // 8 * bitrate * 1000 // sample_rate + padding
+    }
+
+def decodes_cleanly(ffmpeg_path, song_path):
+    """Decode the whole song without writing anything and check that ffmpeg reported no error."""
+    try:
+        completed = subprocess.run(
+            [ffmpeg_path, "-v", "error", "-xerror", "-i", song_path, "-f", "null", "-"],
+            capture_output=True, timeout=CONSTANTS.AUDIO_PROCESSING_TIMEOUT
+        )
+        return completed.returncode == 0
+    except Exception as e:
+        print(f"AUDIO_PROCESSING: Could not decode {song_path}. Details: {e}")
+        return False
+
+def compute_waveform(ffmpeg_path, song_path, probe):
+    """Peak amplitudes (0 to 1) of AUDIO_WAVEFORM_POINTS equal slices of the song."""
+    try:
+        if ffmpeg_path:
+            completed = subprocess.run(
+                [ffmpeg_path, "-v", "error", "-i", song_path, "-ac", "1", "-ar", str(CONSTANTS.AUDIO_WAVEFORM_SAMPLE_RATE), "-f", "s16le", "-"],
+                capture_output=True, timeout=CONSTANTS.AUDIO_PROCESSING_TIMEOUT
+            )
+            if completed.returncode != 0:
+                return None
+            samples, channels = completed.stdout, 1
+        elif probe["format"] == "wav" and probe["sample_width"] == 2:
+            with wave.open(song_path, 'rb') as wav_file:
+                samples, channels = wav_file.readframes(wav_file.getnframes()), probe["channels"]
+        else:
+            return None
+    except Exception as e:
+        print(f"AUDIO_PROCESSING: Could not compute the waveform of {song_path}. Details: {e}")
+        return None
+
+    amplitudes = memoryview(samples[:len(samples) // 2 * 2]).cast("h")[::channels]
+    if not amplitudes:
+        return None
+
+    slice_size = max(1, len(amplitudes) // CONSTANTS.AUDIO_WAVEFORM_POINTS)
+    return [
+        round(max(abs(amplitude) for amplitude in amplitudes[index:index + slice_size]) / 32768, 3)
+        for index in range(0, slice_size * CONSTANTS.AUDIO_WAVEFORM_POINTS, slice_size)
+        if index < len(amplitudes)
+    ]
+
+def transcode(ffmpeg_path, song_path, target_format, normalize_loudness):
+    """Write the song in one of AUDIO_FORMATS next to the original. Returns the new path or None."""
+    if target_format not in CONSTANTS.AUDIO_FORMATS:
+        print(f"AUDIO_PROCESSING: Unknown target format {target_format}.")
+        return None
+
+    output_path = os.path.splitext(song_path)[0] + CONSTANTS.AUDIO_FORMATS[target_format]["suffix"]
+    command = [ffmpeg_path, "-v", "error", "-y", "-i", song_path, "-vn"]
+    if normalize_loudness:
+        command += ["-af", CONSTANTS.AUDIO_LOUDNESS_FILTER]
+    command += CONSTANTS.AUDIO_FORMATS[target_format]["ffmpeg_args"] + [output_path]
+
+    try:
+        completed = subprocess.run(command, capture_output=True, timeout=CONSTANTS.AUDIO_PROCESSING_TIMEOUT)
+    except Exception as e:
+        print(f"AUDIO_PROCESSING: Could not transcode {song_path} to {target_format}. Details: {e}")
+        return None
+
+    if completed.returncode != 0 or not os.path.exists(output_path):
+        print(f"AUDIO_PROCESSING: ffmpeg failed to transcode {song_path} to {target_format}: {completed.stderr.decode(errors='ignore')[:200]}")
+        return None
+
+    return output_path
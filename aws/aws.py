@@ -4,6 +4,7 @@ import shutil
 import zipfile
 from dotenv import load_dotenv
 import utils.utils as utils
+from metrics.metrics import instrument_s3_client
 
 class AWS:
     def __init__(self):
@@ -16,6 +17,7 @@ class AWS:
                                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
                                region_name=os.getenv("AWS_REGION"))
         self.aws_bucket_name = os.getenv("AWS_BUCKET_NAME")
+        instrument_s3_client(self.s3)
 
     def check_object_exists(self, phone_number):
         """Check if a Chrome profile exists in S3 for the given phone number."""
@@ -54,6 +56,17 @@ class AWS:
             print(e)
             return False
 
+    def save_file_in_bucket(self, file_path, s3_key):
+        """Upload a file to S3, replacing any object with the same key."""
+        try:
+            self.s3.upload_file(file_path, self.aws_bucket_name, s3_key)
+            print(f"AWS: Uploaded {file_path} to s3://{self.aws_bucket_name}/{s3_key}")
+            return True
+        except Exception as e:
+            print(f"AWS: Could not upload {file_path} to s3://{self.aws_bucket_name}/{s3_key}")
+            print(e)
+            return False
+
     def _delete_old_profile(self, s3_key):
         """Helper method to delete old profile if it exists."""
         try:
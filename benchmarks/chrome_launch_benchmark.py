@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.utils as utils
+import constants as CONSTANTS
+import driver.driver as SELENIUM_DRIVER
+import undetected_chromedriver as uc
+from driver.resource_manager import ChromeResourceMonitor
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+
+def launch(launch_backend, operating_system):
+    """Start a browser with the same options as the scraper, minus the S3 profile and the proxy."""
+    profile_dir = tempfile.mkdtemp()
+    downloads_dir = tempfile.mkdtemp()
+
+    uc.TARGET_VERSION = SELENIUM_DRIVER.get_os_chrome_version(operating_system)
+    chrome_options = uc.ChromeOptions()
+    user_agent = CONSTANTS.HEADERS_MACOS if operating_system == "macOS" else CONSTANTS.HEADERS_LINUX
+    SELENIUM_DRIVER.add_chrome_options(chrome_options, profile_dir, downloads_dir, user_agent, None, operating_system)
+
+    caps = DesiredCapabilities().CHROME
+    caps["pageLoadStrategy"] = "none"
+
+    started_at = time.time()
+    driver = SELENIUM_DRIVER.launch_chrome(launch_backend, chrome_options, caps)
+    return driver, time.time() - started_at, [profile_dir, downloads_dir]
+
+def measure_page_load(driver, url):
+    started_at = time.time()
+    driver.get(url)
+    while driver.execute_script("return document.readyState") != "complete":
+        if time.time() - started_at > CONSTANTS.PAGE_LOAD_TIMEOUT:
+            return None
+        time.sleep(0.05)
+    return time.time() - started_at
+
+def get_browser_rss(driver):
+    browser_pid = getattr(driver, "browser_pid", None) or driver.service.process.pid
+    sample = ChromeResourceMonitor(browser_pid).sample()
+    return sample["rss"] if sample else None
+
+def benchmark_backend(launch_backend, url, runs, page_loads, settle_time):
+    operating_system = SELENIUM_DRIVER.is_macos_or_linux()
+    results = {"cold_start": [], "page_load": [], "steady_rss": []}
+
+    for run in range(runs):
+        print(f"BENCHMARK: {launch_backend} run #{run + 1}...")
+        driver, cold_start, temp_dirs = launch(launch_backend, operating_system)
+        try:
+            results["cold_start"].append(cold_start)
+            for _ in range(page_loads):
+                page_load = measure_page_load(driver, url)
+                if page_load is not None:
+                    results["page_load"].append(page_load)
+
+            time.sleep(settle_time)
+            steady_rss = get_browser_rss(driver)
+            if steady_rss:
+                results["steady_rss"].append(steady_rss / 1024 / 1024)
+        finally:
+            driver.quit()
+            for temp_dir in temp_dirs:
+                utils.delete_directory(temp_dir)
+
+    return {metric: summarize(values) for metric, values in results.items()}
+
+def summarize(values):
+    if not values:
+        return None
+    return {"median": statistics.median(values), "min": min(values), "max": max(values), "samples": len(values)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold start, steady-state RSS and page load latency of the Chrome launch backends.")
+    parser.add_argument("url", help="URL of the page to load, e.g. the mock Suno Create page")
+    parser.add_argument("--backends", nargs="+", default=[CONSTANTS.CHROME_LAUNCH_BACKEND_UNDETECTED, CONSTANTS.CHROME_LAUNCH_BACKEND_HEADLESS_SHELL])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--page-loads", type=int, default=3)
+    parser.add_argument("--settle-time", type=float, default=5)
+    args = parser.parse_args()
+
+    report = {}
+    for launch_backend in args.backends:
+        report[launch_backend] = benchmark_backend(launch_backend, args.url, args.runs, args.page_loads, args.settle_time)
+
+    print(json.dumps(report, indent=4))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver.webdriver_profiler import compare_profiles
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the WebDriver time and command count per call site of two profiles, e.g. of two releases.")
+    parser.add_argument("old_profile", help="JSON summary saved with WEBDRIVER_PROFILING=true")
+    parser.add_argument("new_profile", help="JSON summary saved with WEBDRIVER_PROFILING=true")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.old_profile, 'r') as old_file, open(args.new_profile, 'r') as new_file:
+        old_summary, new_summary = json.load(old_file), json.load(new_file)
+
+    print(f"COMPARE: WebDriver time went from {old_summary['webdriver_seconds']}s to {new_summary['webdriver_seconds']}s "
+          f"and the command count from {old_summary['commands']} to {new_summary['commands']}.")
+    for change in compare_profiles(old_summary, new_summary)[:args.top]:
+        print(f"COMPARE: {change['seconds_change']:+.3f}s {change['count_change']:+d} commands in {change['call_site']}")
+
+if __name__ == '__main__':
+    main()
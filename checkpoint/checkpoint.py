@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import tempfile
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from structured_logging.structured_logging import get_logger
+
+logger = get_logger("CHECKPOINT")
+
+class GenerationCheckpoint:
+    """Persists how far a generation got so that a rerun of the same GENERATION_ID continues instead of generating again."""
+
+    def __init__(self, supabase):
+        load_dotenv()
+        self.supabase = supabase
+        self.generation_id = os.getenv('GENERATION_ID')
+        self.phone_number = os.getenv('PHONE_NUMBER')
+        self.backend = os.getenv("CHECKPOINT_BACKEND", CONSTANTS.CHECKPOINT_BACKEND_SUPABASE)
+        self.checkpoints_dir = os.path.abspath(os.getenv("CHECKPOINTS_DIR_PATH", CONSTANTS.CHECKPOINTS_DIR_PATH))
+        self.data = self.load() or {}
+
+    def load(self):
+        """Load the checkpoint of the current generation."""
+        if self.backend == CONSTANTS.CHECKPOINT_BACKEND_LOCAL:
+            try:
+                with open(self.get_local_path(), 'r') as checkpoint_file:
+                    return json.load(checkpoint_file)
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                logger.warning(f"Could not read the local checkpoint for {self.generation_id}. Details: {e}")
+                return None
+
+        return self.supabase.get_scrape_checkpoint()
+
+    def save(self):
+        """Persist the checkpoint of the current generation."""
+        if self.backend == CONSTANTS.CHECKPOINT_BACKEND_LOCAL:
+            try:
+                os.makedirs(self.checkpoints_dir, exist_ok=True)
+                with tempfile.NamedTemporaryFile('w', dir=self.checkpoints_dir, delete=False) as temp_file:
+                    json.dump(self.data, temp_file)
+                os.replace(temp_file.name, self.get_local_path())
+                return True
+            except Exception as e:
+                logger.warning(f"Could not write the local checkpoint for {self.generation_id}. Details: {e}")
+                return False
+
+        return self.supabase.update_scrape_checkpoint(self.data)
+
+    def get_local_path(self):
+        return os.path.join(self.checkpoints_dir, f"{self.generation_id}.json")
+
+    def record(self, phase, **fields):
+        """Mark a phase as completed, store the given fields with it and persist the checkpoint."""
+        self.data["phase"] = phase
+        self.data["phone_number"] = self.phone_number
+        self.data["updated_at"] = int(time.time())
+        self.data.update(fields)
+
+        if not self.save():
+            logger.warning(f"Could not save the {phase} checkpoint.")
+            return False
+
+        logger.info(f"Saved the {phase} checkpoint.")
+        return True
+
+    def reached(self, phase):
+        """Check if the generation already completed the given phase."""
+        current_phase = self.data.get("phase")
+        if current_phase not in CONSTANTS.CHECKPOINT_PHASES:
+            return False
+        return CONSTANTS.CHECKPOINT_PHASES.index(current_phase) >= CONSTANTS.CHECKPOINT_PHASES.index(phase)
+
+    def get(self, field, default=None):
+        return self.data.get(field, default)
+
+    def can_resume(self):
+        """Check if a previous run already clicked Create with this account and identified the songs it created."""
+        resumable_phase = self.reached(CONSTANTS.CHECKPOINT_SONGS_IDENTIFIED) and not self.reached(CONSTANTS.CHECKPOINT_SAVED)
+        if resumable_phase and self.data.get("phone_number") != self.phone_number:
+            logger.warning("The previous run used another Suno account, so its songs cannot be resumed.")
+            return False
+
+        return is_resumable_checkpoint(self.data, self.phone_number)
+
+def is_resumable_checkpoint(checkpoint, phone_number):
+    """
+    Check if a checkpoint identified songs of the given account that a rerun can pick up instead of generating again.
+    A submitted checkpoint has no song IDs yet, so the songs of that run can't be told apart from others and it isn't resumable.
+    """
+    phase = (checkpoint or {}).get("phase")
+    if phase not in CONSTANTS.CHECKPOINT_PHASES or phase == CONSTANTS.CHECKPOINT_SAVED:
+        return False
+
+    if CONSTANTS.CHECKPOINT_PHASES.index(phase) < CONSTANTS.CHECKPOINT_PHASES.index(CONSTANTS.CHECKPOINT_SONGS_IDENTIFIED):
+        return False
+
+    return checkpoint.get("phone_number") == phone_number and bool(checkpoint.get("song_ids"))
+
+def get_pending_song_ids(supabase, phone_number):
+    """The Suno IDs of the songs an account created for generations that aren't saved yet. Returns None if they can't be read."""
+    load_dotenv()
+
+    if os.getenv("CHECKPOINT_BACKEND", CONSTANTS.CHECKPOINT_BACKEND_SUPABASE) == CONSTANTS.CHECKPOINT_BACKEND_LOCAL:
+        checkpoints_dir = os.path.abspath(os.getenv("CHECKPOINTS_DIR_PATH", CONSTANTS.CHECKPOINTS_DIR_PATH))
+        checkpoints = []
+        try:
+            for checkpoint_file_name in os.listdir(checkpoints_dir) if os.path.isdir(checkpoints_dir) else []:
+                with open(os.path.join(checkpoints_dir, checkpoint_file_name), 'r') as checkpoint_file:
+                    checkpoint = json.load(checkpoint_file)
+                if checkpoint.get("phone_number") == phone_number and checkpoint.get("phase") != CONSTANTS.CHECKPOINT_SAVED:
+                    checkpoints.append(checkpoint)
+        except Exception as e:
+            logger.warning(f"Could not read the local checkpoints. Details: {e}")
+            return None
+    else:
+        checkpoints = supabase.get_pending_scrape_checkpoints(phone_number)
+        if checkpoints is None:
+            return None
+
+    return {song_id for checkpoint in checkpoints for song_id in checkpoint.get("song_ids") or []}
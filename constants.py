@@ -29,6 +29,7 @@ SONG_OPTIONS_MENU = "//div[@role='menu' and @data-state='open']"
 CREATE_SCREEN_SONG_TITLE_SPAN = "//span[@title and normalize-space(@title) != '']//a//span"
 CREATE_SCREEN_SONG_GENRE = "//span[@title and normalize-space(@title) != '']//a[contains(@class, 'hover:underline')]"
 SONG_SCREEN_LYRICS_TEXT_AREA = "//section//div//textarea"
+SONG_ROW_DETAILS_LINK = "//a[contains(@href, '/song/')]"
 CREATE_SCREEN_CREATE_BUTTON = "//button/div/span[text()='Create']"
 SUNO_TUTORIAL_OVERLAY = "//div[@data-test-id='overlay' and @role='presentation']"
 
@@ -42,6 +43,46 @@ SUNO_CUSTOM_LYRICS_INPUT_FIELD = "//textarea[@maxlength > 1000 and contains(tran
 SUNO_CUSTOM_GENRE_INPUT_FIELD = "//textarea[@maxlength > 100 and @maxlength < 1000 and contains(translate(@placeholder, 'STYLE', 'style'), 'style')]"
 SUNO_CUSTOM_TITLE_INPUT_FIELD = "//textarea[@maxlength > 10 and @maxlength < 100 and contains(translate(@placeholder, 'TITLE', 'title'), 'title')]"
 
+# Faster strategies tried before the XPath of the same name. Each must select exactly what its XPath selects:
+# ("css", selector), ("css_text", selector, text, match) where match is "contains" (lowercase text in the text content),
+# "own_text_equals" (a direct text node equal to the text) or "first_text_contains" (lowercase text in the first direct text node),
+# and ("css_maxlength", selector, exclusive minimum, exclusive maximum or None) for the numeric maxlength comparisons
+LOCATOR_STRATEGIES = {
+    "SUNO_ACCOUNT_LEFTOVER_CREDITS": [("css_text", "a[href='/account'] div div div", "credits", "contains")],
+    "SUNO_MODEL_VERSION_SPAN": [("css", "div[aria-label='Model Select Dropdown'] span")],
+    "SUNO_MODEL_LIST_VERSION_DIV": [("css", "div[aria-label*='Model Selection:'] div > div:first-of-type")],
+    "SUNO_CREATE_SONG_LIST": [("css", "div[role='grid']")],
+    "SUNO_SONG_ELEMENT": [("css", "div[data-testid='song-row']")],
+    "SONG_DURATION_SPAN": [("css", "div[data-testid='song-row-play-button'] div span")],
+    "SONG_MENU_TOGGLE_BUTTON": [("css", "button[type='button'][data-state='closed']")],
+    "SONG_DOWNLOAD_BUTTON": [("css_text", "div[role='menuitem']", "Download", "own_text_equals")],
+    "SONG_MP3_DOWNLOAD_OPTION": [("css", "div[data-testid='download-audio-menu-item'][role='menuitem']")],
+    "SONG_AUDIO_DELETE": [("css_text", "div[role='menuitem'] div span", "trash", "first_text_contains")],
+    "SONG_OPTIONS_MENU": [("css", "div[role='menu'][data-state='open']")],
+    "SONG_SCREEN_LYRICS_TEXT_AREA": [("css", "section div textarea")],
+    "SONG_ROW_DETAILS_LINK": [("css", "a[href*='/song/']")],
+    "SUNO_TUTORIAL_OVERLAY": [("css", "div[data-test-id='overlay'][role='presentation']")],
+    "SUNO_CUSTOM_MODE_GET_STARTED_BUTTON": [("css_text", "button", "get started", "first_text_contains")],
+    "SUNO_CUSTOM_SONG_DISABLED_BUTTON": [("css", "div[aria-label='Custom'][class*='bg-tertiary']:has(span:not([class*='translate-x-4']))")],
+    "SUNO_CUSTOM_SONG_ENABLED_BUTTON": [("css", "div[aria-label='Custom'][class*='bg-primary']:has(span[class*='translate-x-4'])")],
+    "SUNO_INSTRUMENTAL_DISABLED_BUTTON": [("css", "div[aria-label='Instrumental'][class*='bg-tertiary']:has(span:not([class*='translate-x-4']))")],
+    "SUNO_INSTRUMENTAL_ENABLED_BUTTON": [("css", "div[aria-label='Instrumental'][class*='bg-primary']:has(span[class*='translate-x-4'])")],
+    "SUNO_CUSTOM_LYRICS_INPUT_FIELD": [("css_maxlength", "textarea[maxlength][placeholder*='lyrics' i]", 1000, None)],
+    "SUNO_CUSTOM_GENRE_INPUT_FIELD": [("css_maxlength", "textarea[maxlength][placeholder*='style' i]", 100, 1000)],
+    "SUNO_CUSTOM_TITLE_INPUT_FIELD": [("css_maxlength", "textarea[maxlength][placeholder*='title' i]", 10, 100)]
+}
+LOCATOR_CACHE_PATH = "./locators/locator_cache.json"
+LOCATOR_CACHE_BACKEND_SUPABASE = "supabase"
+LOCATOR_CACHE_BACKEND_LOCAL = "local"
+# Elements read in the single snapshot of the Create page state, with the first strategy of LOCATOR_STRATEGIES
+UI_STATE_SNAPSHOT_LOCATORS = [
+    "SUNO_INSTRUMENTAL_ENABLED_BUTTON",
+    "SUNO_INSTRUMENTAL_DISABLED_BUTTON",
+    "SUNO_CUSTOM_SONG_ENABLED_BUTTON",
+    "SUNO_CUSTOM_SONG_DISABLED_BUTTON",
+    "SUNO_TUTORIAL_OVERLAY"
+]
+
 # Text for Static Elements on Pages
 SIGN_IN_TITLE = "Sign in"
 SIGN_IN_CHECK_PHONE = "Check your phone"
@@ -55,6 +96,11 @@ ACCEPTED_SONG_FILE_TYPES = ['.mp3', '.wav', '.mpeg']
 
 # Bot Limitations
 RUNTIME_ERROR_MARGIN = 100
+RUNTIME_STATS_PATH = "./runtime_budget/runtime_stats.json"
+RUNTIME_STATS_BACKEND_SUPABASE = "supabase"
+RUNTIME_STATS_BACKEND_LOCAL = "local"
+PHASE_OUTCOME_COMPLETED = "completed"
+PHASE_OUTCOME_UNFINISHED = "unfinished"
 MIN_SUNO_CREDIT_BALANCE = 50
 MIN_RUNTIME = 420 # 7 minutes
 MAX_RUNTIME = 840 # 14 minutes
@@ -64,6 +110,25 @@ PAGE_LOAD_RETRY_SESSION = 20
 MAX_PAGE_RELOAD_TRIES = 3
 PAGE_LOAD_TIMEOUT = 60
 
+# Runtime Budget Params
+PHASE_SETUP = "setup"
+PHASE_GENERATION = "generation"
+PHASE_METADATA = "metadata"
+PHASE_DOWNLOAD = "download"
+PHASE_LYRICS = "lyrics"
+PHASE_UPLOAD = "upload"
+DEFAULT_PHASE_DURATIONS = {
+    PHASE_SETUP: 30,
+    PHASE_GENERATION: 120,
+    PHASE_METADATA: 10,
+    PHASE_DOWNLOAD: 20,
+    PHASE_LYRICS: 35,
+    PHASE_UPLOAD: 10
+}
+RUNTIME_STATS_MAX_SAMPLES = 200
+RUNTIME_STATS_MIN_SAMPLES = 5
+RUNTIME_STATS_PERCENTILE = 0.9
+
 # SMS Params
 SMS_MAX_TIME_DELTA_MINUTES = 3
 MAX_SMS_TO_READ = 3
@@ -72,6 +137,21 @@ START_TIME_DELTA = 5 # minutes
 # Error Handling
 ERROR_EMAIL_TITLE = "Error from the Scraping Bot - Phone Number {phone_number}"
 
+# Logging Params
+LOGGER_NAME = "suno_scraper"
+LOG_FORMAT_JSON = "json"
+LOG_FORMAT_PLAIN = "plain"
+LOG_FORMAT = LOG_FORMAT_JSON
+LOG_LEVEL = "INFO"
+# Only 1 out of this many records of a polling loop (logged with a sample_key) is kept
+LOG_SAMPLE_RATE = 10
+
+# Metrics Params
+METRICS_NAMESPACE = "SunoScraper"
+# Release the metrics are tagged with (the Version dimension) when SCRAPER_VERSION isn't set
+SCRAPER_VERSION = "unknown"
+EMF_MAX_VALUES = 100
+
 # Supabase params
 MAX_JWT_LIFETIME = 120
 SUPABASE_SCRAPER_ROLE = "suno_scraper_role"
@@ -80,12 +160,66 @@ SUPABASE_DISCORD_SONG_GENERATIONS_TABLE = "discord_song_generations"
 SUPABASE_SCRAPER_STATUS_TABLE = "scraper_status"
 SUPABASE_USERS_TABLE = "users"
 SUPABASE_SONG_OUTPUT_AUDIO_BUCKET = "song-output-audio"
+SUPABASE_SONG_OUTPUT_AUDIO_TABLE = "song_output_audio"
+SUPABASE_RUNTIME_PHASE_DURATIONS_TABLE = "runtime_phase_durations"
+SUPABASE_LOCATOR_STRATEGIES_TABLE = "locator_strategies"
+SUPABASE_GENERATION_INDEX_TABLE = "generation_index"
+# Songs are stored under the SHA-256 of their bytes, e.g. sha256/ab/abcd...mp3
+SUPABASE_CONTENT_ADDRESSED_AUDIO_PREFIX = "sha256"
+FILE_HASH_CHUNK_SIZE = 1024 * 1024
+# PostgREST error code of an RPC call to a function that doesn't exist
+POSTGREST_MISSING_FUNCTION_CODE = "PGRST202"
+# Credits and error updates are buffered, coalesced per row and written every few seconds (always before a job ends)
+WRITE_BEHIND_ENABLED = True
+WRITE_BEHIND_FLUSH_INTERVAL = 2
+WRITE_BEHIND_ACK_FLUSH_TRIES = 5
+
+# Generation Index Params
+GENERATION_INDEX_BACKEND_SUPABASE = "supabase"
+GENERATION_INDEX_BACKEND_SQLITE = "sqlite"
+GENERATION_INDEX_PATH = "./generation_index/generation_index.db"
+GENERATION_INDEX_LOCK_TIMEOUT = 10
+GENERATION_STATE_IN_FLIGHT = "in_flight"
+GENERATION_STATE_COMPLETED = "completed"
+GENERATION_STATE_FAILED = "failed"
+
+# Checkpoint Params
+CHECKPOINT_BACKEND_SUPABASE = "supabase"
+CHECKPOINT_BACKEND_LOCAL = "local"
+CHECKPOINTS_DIR_PATH = "./checkpoint/checkpoints"
+CHECKPOINT_SUBMITTED = "submitted"
+CHECKPOINT_SONGS_IDENTIFIED = "songs_identified"
+CHECKPOINT_DOWNLOADED = "downloaded"
+CHECKPOINT_UPLOADED = "uploaded"
+CHECKPOINT_SAVED = "saved"
+CHECKPOINT_PHASES = [CHECKPOINT_SUBMITTED, CHECKPOINT_SONGS_IDENTIFIED, CHECKPOINT_DOWNLOADED, CHECKPOINT_UPLOADED, CHECKPOINT_SAVED]
+
+# Job Queue Params
+SUPABASE_GENERATION_JOBS_TABLE = "generation_jobs"
+JOB_QUEUE_BACKEND_SUPABASE = "supabase"
+JOB_QUEUE_BACKEND_SQLITE = "sqlite"
+JOB_QUEUE_SQLITE_PATH = "./job_queue/generation_jobs.db"
+JOB_QUEUE_LOCK_TIMEOUT = 10
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_LEASED = "leased"
+JOB_STATUS_DONE = "done"
+JOB_STATUS_FAILED = "failed"
+JOB_LEASE_SECONDS = 120
+JOB_HEARTBEAT_INTERVAL = 30
+MAX_JOB_ATTEMPTS = 3
+WORKER_POLL_INTERVAL = 10
+WORKER_MAX_IDLE_TIME = 600
+WORKER_REUSE_BROWSER = True
+# Seconds the oldest pending job may be passed over so that jobs with the current creation mode run first (0 disables the reordering)
+DISPATCHER_FAIRNESS_WINDOW = 120
+DISPATCHER_LOOKAHEAD = 20
 
 # Suno Params
 MAX_CUSTOM_TITLE_LENGTH = 60
 MIN_CUSTOM_LYRICS_LENGTH = 30
 MAX_CUSTOM_LYRICS_LENGTH = 1000
 SUNO_MAX_SONGS_PER_GENERATION = 2
+HARVEST_ALL_SONGS = True
 MIN_PROMPT_LENGTH = 5
 MAX_PROMPT_LENGTH = 190
 MIN_GENRE_LENGTH = 3
@@ -95,8 +229,20 @@ TIME_SLEPT_STEP_GOING_TO_SONG_DETAILS = 15
 MAX_SONG_CREATION_WAIT_TIME = 270
 SONG_CREATION_SLEEP_TIME = 10
 EXTRA_SONG_DETAILS_PAGE_WAIT_TIME = 15
+LYRICS_RETRIEVAL_IN_PAGE = "in_page"
+LYRICS_RETRIEVAL_NAVIGATE = "navigate"
+LYRICS_RETRIEVAL_MODE = LYRICS_RETRIEVAL_IN_PAGE
+LYRICS_FETCH_TIMEOUT = 20
+SONG_PAGE_DATA_PATTERN = r'self\.__next_f\.push\(\[1,\s*("(?:[^"\\]|\\.)*")\]\)'
+SONG_PAGE_LYRICS_PATTERN = r'"prompt":\s*("(?:[^"\\]|\\.)*")'
 MAX_SONG_DOWNLOAD_WAIT_TIME = 50
+POST_GENERATION_MAX_WORKERS = 3
 SONG_DOWNLOAD_STEP_WAIT_TIME = 5
+DOWNLOAD_EVENT_POLL_INTERVAL = 0.25
+DOWNLOAD_EVENTS_GRACE_TIME = 10
+# inotify events that end a download in the polled downloads dir: a file closed after writing, or renamed into the dir (Chrome's .crdownload)
+INOTIFY_DOWNLOAD_EVENTS = 0x00000008 | 0x00000080
+INOTIFY_READ_SIZE = 4096
 MAX_CREDITS_NUMBER = 50000
 MIN_LYRICS_LENGTH = 30
 MIN_SONG_LENGTH = 14
@@ -123,6 +269,150 @@ FORBIDDEN_WORDS = [
 
 # Proxy Params
 IP_CHECKER_URL = "http://ipecho.net/plain"
+PROXY_MODE_EXTENSION = "extension"
+PROXY_MODE_FORWARDING = "forwarding"
+PROXY_MODE = PROXY_MODE_EXTENSION
+FORWARDING_PROXY_HOST = "127.0.0.1"
+FORWARDING_PROXY_POOL_SIZE = 4
+FORWARDING_PROXY_POOL_MAX_IDLE = 30
+FORWARDING_PROXY_CONNECT_TIMEOUT = 15
+FORWARDING_PROXY_IDLE_TIMEOUT = 120
+FORWARDING_PROXY_BUFFER_SIZE = 65536
 VALID_IPS = [
     "proxyiphere"
-]
\ No newline at end of file
+]
+# Request Blocking Params
+# Requests matching these patterns never reach the proxy. Song audio (mp3/m4a) is never blocked.
+# Chrome matches them against the whole URL, so every extension also gets a pattern for URLs with a query string (e.g. image.png?w=256).
+# SVGs stay allowed: they are the icons of the Create page buttons and menus, and they are small.
+REQUEST_BLOCKING_EXTENSIONS = ["png", "jpg", "jpeg", "gif", "webp", "avif", "ico", "woff", "woff2", "ttf", "otf", "mp4", "webm"]
+REQUEST_BLOCKING_PATTERNS = [pattern for extension in REQUEST_BLOCKING_EXTENSIONS for pattern in (f"*.{extension}", f"*.{extension}?*")] + [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*connect.facebook.com*",
+    "*analytics.tiktok.com*",
+    "*segment.io*",
+    "*cdn.segment.com*",
+    "*clarity.ms*",
+    "*hotjar.com*",
+    "*intercom.io*",
+    "*intercomcdn.com*"
+]
+# Seconds between reads of Chrome's performance log on page loads and element lookups (the song and download waits read it on every step)
+PERFORMANCE_LOG_POLL_INTERVAL = 10
+# Patterns that stay allowed on pages starting with the given URL (e.g. the captcha of the sign in page needs its images)
+REQUEST_BLOCKING_PAGE_ALLOWLISTS = {
+    SIGN_IN_URL: [pattern for extension in ["png", "jpg", "jpeg", "gif", "webp"] for pattern in (f"*.{extension}", f"*.{extension}?*")]
+}
+# Resource types assumed from the URL path of requests Chrome didn't type, and their estimated size in bytes when none was loaded this run
+REQUEST_BLOCKING_TYPE_PATTERNS = {
+    "Image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico"],
+    "Font": ["*.woff", "*.woff2", "*.ttf", "*.otf"],
+    "Media": ["*.mp4", "*.webm"]
+}
+REQUEST_BLOCKING_ESTIMATED_SIZES = {
+    "Image": 60 * 1024,
+    "Font": 40 * 1024,
+    "Media": 1024 * 1024,
+    "Script": 30 * 1024,
+    "Other": 5 * 1024
+}
+
+# Song Feed Params
+# Suno API responses that carry song (clip) data, read from the network traffic of the Create page
+SONG_FEED_URL_PATTERNS = [
+    "*suno*/api/feed*",
+    "*suno*/api/clip*",
+    "*suno*/api/generate/v2*"
+]
+SONG_FEED_COMPLETE_STATUS = "complete"
+SONG_FEED_ERROR_STATUS = "error"
+# Chrome only keeps response bodies until its network buffers fill up, and the feed reads them when the performance log is drained
+SONG_FEED_RESOURCE_BUFFER_SIZE = 5 * 1024 * 1024
+SONG_FEED_TOTAL_BUFFER_SIZE = 50 * 1024 * 1024
+
+# Chrome Resource Params
+CHROME_LAUNCH_PROFILE_DEFAULT = "default"
+CHROME_LAUNCH_PROFILE_LEAN = "lean"
+CHROME_LAUNCH_PROFILE = CHROME_LAUNCH_PROFILE_LEAN
+CHROME_LAUNCH_PROFILES = {
+    CHROME_LAUNCH_PROFILE_DEFAULT: [
+        '--enable-logging',
+        '--v=1',
+        '--log-level=0'
+    ],
+    CHROME_LAUNCH_PROFILE_LEAN: [
+        '--log-level=3',
+        '--renderer-process-limit=2',
+        '--disable-background-networking',
+        '--disable-component-update',
+        '--disable-default-apps',
+        '--disable-sync',
+        '--disable-domain-reliability',
+        '--disable-client-side-phishing-detection',
+        '--disable-breakpad',
+        '--metrics-recording-only',
+        '--no-pings',
+        '--mute-audio',
+        '--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication',
+        '--js-flags=--max-old-space-size=512'
+    ]
+}
+CHROME_DISABLE_FEATURES_SWITCH = "--disable-features="
+CHROME_MONITOR_INTERVAL = 5
+CHROME_MAX_RSS_MB = 1500
+CHROME_OVER_LIMIT_SAMPLES = 3
+CHROME_MAX_RECYCLES = 1
+CHROME_LAUNCH_BACKEND_UNDETECTED = "undetected"
+CHROME_LAUNCH_BACKEND_HEADLESS_SHELL = "headless_shell"
+CHROME_LAUNCH_BACKEND = CHROME_LAUNCH_BACKEND_UNDETECTED
+CHROME_HEADLESS_SHELL_PATH = "/opt/chrome-headless-shell/chrome-headless-shell"
+WEBDRIVER_PROFILING = False
+WEBDRIVER_PROFILE_DIR_PATH = "./driver/webdriver_profiles"
+# Profiles are uploaded to the AWS bucket under <prefix>/<version>/, since the container disk is gone after the run
+WEBDRIVER_PROFILE_S3_PREFIX = "webdriver_profiles"
+WEBDRIVER_PROFILE_TOP_CALL_SITES = 20
+WEBDRIVER_PROFILE_PRINTED_CALL_SITES = 5
+WEBDRIVER_PROFILE_TOP_LOCATORS = 5
+WEBDRIVER_PROFILE_LOCATOR_LENGTH = 120
+
+# Storage Placement Params
+STORAGE_PLACEMENT_DISK = "disk"
+STORAGE_PLACEMENT_TMPFS = "tmpfs"
+STORAGE_PLACEMENT = STORAGE_PLACEMENT_DISK
+TMPFS_DIR_PATH = "/dev/shm/suno_scraper"
+TMPFS_MIN_FREE_BYTES = 64 * 1024 * 1024
+CHROME_PROFILE_TMPFS_RESERVE = 768 * 1024 * 1024
+DOWNLOADS_TMPFS_RESERVE = 64 * 1024 * 1024
+EXTENSION_TMPFS_RESERVE = 1024 * 1024
+
+# Account Maintenance Params
+SUNO_API_BASE_URL = "https://studio-api.prod.suno.com"
+SUNO_LIBRARY_API_PATH = "/api/feed/v2?page={page}"
+SUNO_TRASH_API_PATH = "/api/gen/trash"
+SUNO_API_TIMEOUT = 30
+LIBRARY_MAX_PAGES = 50
+LIBRARY_CLEANUP_BATCH_SIZE = 50
+# Songs younger than this are never cleaned up, in case a job is still waiting for them
+LIBRARY_CLEANUP_MIN_AGE = 3600
+# Delete the unfinished songs of the Create page before every generation. Turn off when account_maintenance.py runs regularly.
+INLINE_SONG_CLEANUP = True
+
+# Audio Processing Params
+AUDIO_PROCESSING_ENABLED = True
+AUDIO_PROCESSING_MAX_WORKERS = 1
+AUDIO_PROCESSING_TIMEOUT = 120
+AUDIO_HEADER_SCAN_BYTES = 256 * 1024
+AUDIO_WAVEFORM_POINTS = 100
+AUDIO_WAVEFORM_SAMPLE_RATE = 8000
+# Comma separated names of AUDIO_FORMATS written next to the original song and uploaded with it (needs ffmpeg)
+AUDIO_TARGET_FORMATS = ""
+AUDIO_FORMATS = {
+    "opus_preview": {"suffix": ".preview.opus", "ffmpeg_args": ["-c:a", "libopus", "-b:a", "48k", "-t", "30"]},
+    "opus": {"suffix": ".opus", "ffmpeg_args": ["-c:a", "libopus", "-b:a", "96k"]},
+    "mp3": {"suffix": ".normalized.mp3", "ffmpeg_args": ["-c:a", "libmp3lame", "-q:a", "2"]}
+}
+AUDIO_NORMALIZE_LOUDNESS = False
+AUDIO_LOUDNESS_FILTER = "loudnorm=I=-14:TP=-1.5:LRA=11"
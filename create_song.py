@@ -6,12 +6,16 @@ import constants as CONSTANTS
 from dotenv import load_dotenv
 import proxy_profiles as PROXIES
 from db.supabase import Supabase
+from db.write_behind import flush_write_behind_buffer
+from metrics.metrics import get_metrics
 from sign_in.sign_in import SignIn
 import driver.driver as SELENIUM_DRIVER
 import login_profiles as LOGIN_PROFILES
 from selenium.webdriver.common.by import By
 from scrape_song.scrape_song import ScrapeSong
 from error_logging.error_logging import ErrorLogging
+from generation_index.generation_index import get_generation_index
+from structured_logging.structured_logging import setup_logging
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException
 
@@ -22,8 +26,11 @@ def navigate_with_refresh(driver, url, max_attempts=CONSTANTS.MAX_PAGE_RELOAD_TR
     for attempt in range(max_attempts):
         try:
             print(f"CREATE_SONG: Attempting to navigate to {url} (Attempt #{attempt + 1})")
+            if driver.request_blocker:
+                driver.request_blocker.apply_for_url(url)
             driver.get(url)
             WebDriverWait(driver, timeout).until(page_has_loaded)
+            driver.performance_log.poll_if_due()
             print("CREATE_SONG: Page loaded successfully.")
             return True
         except TimeoutException:
@@ -127,15 +134,16 @@ def check_ip(driver):
     print("CREATE_SONG: The IP used by this scraper is invalid.")
     return False
 
-def make_supabase_checks():
-    """Performs Supabase-related checks."""
-    supabase = Supabase()
-
-    if not supabase.is_valid_song_generation():
+def check_supabase_generation():
+    """Checks that the generation exists on Supabase, is valid and has no song yet. Returns None if it couldn't be checked."""
+    is_valid = Supabase().is_valid_song_generation()
+    if not is_valid:
         print("CREATE_SONG: The generation ID doesn't exist on Supabase, the generation data is invalid or there's an existing song file associated with the generation.")
-        return False
+    return is_valid
 
-    if not supabase.scraper_can_create_song():
+def check_supabase_scraper():
+    """Checks that the scraper's account can create a song."""
+    if not Supabase().scraper_can_create_song():
         print("CREATE_SONG: The scraper cannot create a song with the provided phone number.")
         return False
 
@@ -147,9 +155,18 @@ def get_song_creation_data():
 
 def log_into_account(driver):
     """Log into a Suno account using provided WebDriver and credentials."""
+    # Suno redirected us to the sign in page, so apply its allowlist before the captcha loads
+    if driver.request_blocker:
+        driver.request_blocker.apply_for_url(driver.current_url)
+
     sign_in = SignIn(driver)
     phone_number = os.getenv('PHONE_NUMBER')
-    if not sign_in.sign_in(LOGIN_PROFILES.login_profiles[phone_number]):
+    signed_in = sign_in.sign_in(LOGIN_PROFILES.login_profiles[phone_number])
+
+    if driver.request_blocker:
+        driver.request_blocker.apply_for_url(CONSTANTS.BASE_URL)
+
+    if not signed_in:
         print("CREATE_SONG: Failed to sign in with a phone number.")
         return False
     return True
@@ -159,74 +176,258 @@ def scrape_song(driver, start_time, song_prompt, downloads_dir):
     scrape_song = ScrapeSong(driver)
     return scrape_song.scrape_song(start_time, song_prompt, downloads_dir)
 
-def main(start_time):
-    """Main execution routine."""
+def close_driver(driver):
+    """Report the browser stats of the run and quit the driver."""
+    if driver.request_blocker:
+        driver.performance_log.poll()
+        driver.request_blocker.report()
+    if driver.forwarding_proxy:
+        driver.forwarding_proxy.report()
+    if driver.resource_monitor:
+        driver.resource_monitor.stop()
+        driver.resource_monitor.report()
+    if driver.webdriver_profiler:
+        driver.webdriver_profiler.report()
+
+    print("CREATE_SONG: Closing the driver...")
+    driver.quit()
+
+def save_chrome_profile(aws, chrome_profiles_dir, phone_number):
+    """Upload the Chrome profile to S3 so the next run starts logged in, then delete it locally."""
+    print("CREATE_SONG: Saving the Chrome profile to s3...")
+    profile_dir = f"{chrome_profiles_dir}/{phone_number}_chrome_profile"
+    zip_dir = f"{chrome_profiles_dir}/{phone_number}_chrome_profile"
+
+    if aws.compress_chrome_profile(profile_dir, zip_dir):
+        aws.save_profile_in_bucket(zip_dir + ".zip", phone_number)
+        
+    utils.delete_file(zip_dir + ".zip")
+    utils.delete_directory(chrome_profiles_dir)
+
+class BrowserSession:
+    """
+    Keeps the browser of a worker open between its jobs, so the Create page state (mode toggles, model, dismissed onboarding) carries over.
+    A job that fails closes the browser, so the next job starts from a fresh page.
+    """
+
+    def __init__(self):
+        self.driver = None
+        self.aws = None
+        self.chrome_profiles_dir = None
+        self.phone_number = None
+        self.jobs = 0
+        self.toggles = 0
+        self.toggle_seconds = 0.0
+
+    def get_driver(self, downloads_dir):
+        """The driver of the session with its downloads going to the dir of the current job. Returns (driver, reused)."""
+        phone_number = os.getenv('PHONE_NUMBER')
+        if self.driver and self.phone_number != phone_number:
+            print(f"CREATE_SONG: The next job runs on another account. Closing the browser of {self.phone_number}...")
+            self.close()
+
+        if self.driver:
+            if SELENIUM_DRIVER.set_downloads_dir(self.driver, downloads_dir):
+                self.jobs += 1
+                print(f"CREATE_SONG: Reusing the browser for job #{self.jobs} of this session.")
+                return self.driver, True
+            self.close()
+
+        self.aws = AWS()
+        self.chrome_profiles_dir = utils.place_working_directory(CONSTANTS.CHROME_PROFILES_DIR_PATH, CONSTANTS.CHROME_PROFILE_TMPFS_RESERVE)
+        self.phone_number = phone_number
+        self.driver = SELENIUM_DRIVER.setup_chrome_driver(self.aws, self.chrome_profiles_dir, downloads_dir)
+        self.jobs = 1 if self.driver else 0
+        return self.driver, False
+
+    def get_toggle_stats(self):
+        """The number of mode toggles clicked in the browsers of the session and the seconds they took."""
+        page_state = getattr(self.driver, "create_page_state", None)
+        if not page_state:
+            return self.toggles, self.toggle_seconds
+        return self.toggles + page_state.toggles, self.toggle_seconds + page_state.toggle_seconds
+
+    def close(self):
+        """Close the browser and save its Chrome profile."""
+        if not self.driver:
+            return
+
+        self.toggles, self.toggle_seconds = self.get_toggle_stats()
+        close_driver(self.driver)
+        save_chrome_profile(self.aws, self.chrome_profiles_dir, self.phone_number)
+        self.driver = None
+        self.jobs = 0
+
+def open_create_page(driver):
+    """Check the IP, go to the Create page and log in if needed. Returns an error message or None."""
+    if not check_ip(driver):
+        return "This scraper tried to use an invalid IP."
+
+    print("CREATE_SONG: Navigating to Suno's website...")
+    if navigate_with_refresh(driver, CONSTANTS.BASE_URL):
+        utils.random_long_sleep()
+    else:
+        return "Could not navigate to Suno even after several retries."
+
+    if driver.current_url.startswith(CONSTANTS.SIGN_IN_URL):
+        print("CREATE_SONG: Logging into Suno...")
+        if not log_into_account(driver):
+            print("CREATE_SONG: Could not log into Suno.")
+            return "Could not log into Suno."
+    elif driver.current_url.startswith(CONSTANTS.BASE_URL):
+        print("CREATE_SONG: Skipped the login flow because I'm already on the Create page.")
+    else:
+        print("CREATE_SONG: Could not get into the Suno dashboard.")
+        return "Could not get into the Suno dashboard."
+
+    return None
+
+def return_to_create_page(driver):
+    """Bring a browser kept open since the previous job back to the Create page. Returns an error message or None."""
+    if driver.current_url.startswith(CONSTANTS.BASE_URL):
+        print("CREATE_SONG: The browser is still on the Create page from the previous job.")
+        return None
+
+    print("CREATE_SONG: Navigating back to the Create page...")
+    if not navigate_with_refresh(driver, CONSTANTS.BASE_URL):
+        return "Could not navigate back to Suno even after several retries."
+
+    # The page was loaded again, so nothing read on the previous one still holds
+    if hasattr(driver, "create_page_state"):
+        driver.create_page_state.reset()
+    if driver.current_url.startswith(CONSTANTS.SIGN_IN_URL):
+        print("CREATE_SONG: Logging into Suno again...")
+        if not log_into_account(driver):
+            return "Could not log into Suno."
+
+    return None
+
+def claim_generation(generation_index):
+    """Claims the generation in the generation index so duplicates and retries of finished generations never launch a browser."""
+    generation_id = os.getenv('GENERATION_ID')
+    claimed, state, result = generation_index.claim(generation_id)
+    if claimed:
+        return True, state
+
+    if state == CONSTANTS.GENERATION_STATE_COMPLETED:
+        print(f"CREATE_SONG: The generation {generation_id} was already completed. Stored result: {result}")
+    elif state == CONSTANTS.GENERATION_STATE_FAILED:
+        print(f"CREATE_SONG: The generation {generation_id} already failed in a previous run.")
+    elif state == CONSTANTS.GENERATION_STATE_IN_FLIGHT:
+        print(f"CREATE_SONG: The generation {generation_id} is already being scraped by another run.")
+    else:
+        print(f"CREATE_SONG: Could not claim the generation {generation_id} in the generation index.")
+
+    return False, state
+
+def main(start_time, browser_session=None):
+    """
+    Main execution routine. Returns a dict with the saved song output (or None), whether the generation
+    failed for a transient reason and can be retried, and whether its status updates (credits, errors) were saved.
+    Workers pass their browser session to run the job on the browser of the previous one.
+    """
+    generation_id = os.getenv('GENERATION_ID')
+    if not generation_id:
+        print("CREATE_SONG: Invalid generation ID.")
+        return {"song_output": None, "retryable": False, "status_saved": True}
+
+    generation_index = get_generation_index()
+    claimed, claimed_state = claim_generation(generation_index)
+    if not claimed:
+        generation_index.close()
+        # A claim left by a killed run expires, so the job queue can try the generation again later
+        return {"song_output": None, "retryable": claimed_state in (CONSTANTS.GENERATION_STATE_IN_FLIGHT, None), "status_saved": True}
+
+    song_output, permanent_failure = None, False
+    try:
+        song_output, permanent_failure = scrape_generation(start_time, browser_session)
+    finally:
+        if song_output:
+            generation_index.mark_completed(generation_id, song_output)
+        elif permanent_failure:
+            generation_index.mark_failed(generation_id, permanent_failure)
+        else:
+            # Let a retry claim the generation again instead of remembering a transient failure forever
+            generation_index.release(generation_id)
+        generation_index.close()
+
+        if song_output:
+            get_metrics().increment("SongsCompleted")
+        else:
+            get_metrics().increment("SongsFailed", Reason=get_metrics().failure_reason or "UNKNOWN")
+        get_metrics().flush()
+
+        # The credits and errors of this generation must be saved before the job is acknowledged
+        status_saved = flush_write_behind_buffer()
+        if not status_saved:
+            print("CREATE_SONG: Some status updates could not be saved yet. They will be retried in the background.")
+
+    return {"song_output": song_output, "retryable": not song_output and not permanent_failure, "status_saved": status_saved}
+
+def scrape_generation(start_time, browser_session=None):
+    """
+    Runs the checks and the scraping job for the current generation, on the browser of the session if one is given.
+    Returns the saved song output (or None) and the reason of a permanent failure (or None), e.g. a generation Supabase rejects.
+    """
+    # The last flag marks the checks whose explicit failure means retrying the generation is pointless
     checks = [
-        ("OS params", check_os_params),
-        ("Suno credential", check_suno_creds),
-        ("general vars", check_general_vars),
-        ("Supabase", make_supabase_checks)
+        ("OS params", check_os_params, False),
+        ("Suno credential", check_suno_creds, False),
+        ("general vars", check_general_vars, False),
+        ("Supabase generation", check_supabase_generation, True),
+        ("Supabase scraper", check_supabase_scraper, False)
     ]
 
-    for check_name, check_func in checks:
+    for check_name, check_func, is_permanent in checks:
         print(f"CREATE_SONG: Checking {check_name}...")
-        if not check_func():
+        check_result = check_func()
+        if not check_result:
             ErrorLogging().save_error_and_send_email("SCRAPER - CREATE_SONG: Could not pass initial checks before scraping.")
-            return
+            return None, f"Failed the {check_name} checks." if is_permanent and check_result is False else None
         print(f"CREATE_SONG: Passed {check_name} checks.")
 
     song_creation_data = get_song_creation_data()
     if not song_creation_data:
         print("CREATE_SONG: Invalid song creation data fetched from Supabase.")
         ErrorLogging().save_error_and_send_email("SCRAPER - CREATE_SONG: Invalid song creation data fetched from Supabase.")
-        return
+        return None, None
     
     print("CREATE_SONG: Fetched the song creation data from Supabase.")
 
-    print("CREATE_SONG: Setting up AWS utils...")
-    aws = AWS()
-    chrome_profiles_dir = os.path.abspath(CONSTANTS.CHROME_PROFILES_DIR_PATH)
-    downloads_dir = os.path.abspath(CONSTANTS.DOWNLOADS_DIR_PATH)
+    # Each job downloads into its own dir so that jobs sharing the downloads dir can't pick up each other's songs
+    downloads_dir = os.path.join(utils.place_working_directory(CONSTANTS.DOWNLOADS_DIR_PATH, CONSTANTS.DOWNLOADS_TMPFS_RESERVE), os.getenv('GENERATION_ID'))
     phone_number = os.getenv('PHONE_NUMBER')
 
     print("CREATE_SONG: Setting up the Chrome driver...")
 
-    driver = SELENIUM_DRIVER.setup_chrome_driver(aws, chrome_profiles_dir, downloads_dir)
+    driver_reused = False
+    if browser_session:
+        driver, driver_reused = browser_session.get_driver(downloads_dir)
+    else:
+        print("CREATE_SONG: Setting up AWS utils...")
+        aws = AWS()
+        chrome_profiles_dir = utils.place_working_directory(CONSTANTS.CHROME_PROFILES_DIR_PATH, CONSTANTS.CHROME_PROFILE_TMPFS_RESERVE)
+        driver = SELENIUM_DRIVER.setup_chrome_driver(aws, chrome_profiles_dir, downloads_dir)
+    song_output = None
 
     try:
         if not driver:
             print("CREATE_SONG: Could not instantiate the Selenium driver.")
             ErrorLogging().save_error_and_send_email("SCRAPER - CREATE_SONG: Could not instantiate the Selenium driver.")
-            return
+            return None, None
 
-        driver.set_page_load_timeout(CONSTANTS.PAGE_LOAD_TIMEOUT)
-        driver.maximize_window()
-
-        if not check_ip(driver):
-            ErrorLogging().save_error_and_send_email("SCRAPER - CREATE_SONG: This scraper tried to use an invalid IP.")
-            return
-
-        print("CREATE_SONG: Navigating to Suno's website...")
-        if navigate_with_refresh(driver, CONSTANTS.BASE_URL):
-            utils.random_long_sleep()
+        if driver_reused:
+            open_create_page_error = return_to_create_page(driver)
         else:
-            ErrorLogging().save_error_and_send_email("SCRAPER - CREATE_SONG: Could not navigate to Suno even after several retries.")
-            return
-
-        if driver.current_url.startswith(CONSTANTS.SIGN_IN_URL):
-            print("CREATE_SONG: Logging into Suno...")
-            if not log_into_account(driver):
-                print("CREATE_SONG: Could not log into Suno.")
-                ErrorLogging().save_error_and_send_email("SCRAPER - CREATE_SONG: Could not log into Suno.")
-                return
-        elif driver.current_url.startswith(CONSTANTS.BASE_URL):
-            print("CREATE_SONG: Skipped the login flow because I'm already on the Create page.")
-        else:
-            print("CREATE_SONG: Could not get into the Suno dashboard.")
-            ErrorLogging().save_error_and_send_email("SCRAPER - CREATE_SONG: Could not get into the Suno dashboard.")
-            return
-
-        if not scrape_song(driver, start_time, song_creation_data, downloads_dir):
+            driver.set_page_load_timeout(CONSTANTS.PAGE_LOAD_TIMEOUT)
+            driver.maximize_window()
+            open_create_page_error = open_create_page(driver)
+        if open_create_page_error:
+            ErrorLogging().save_error_and_send_email(f"SCRAPER - CREATE_SONG: {open_create_page_error}")
+            return None, None
+
+        song_output = scrape_song(driver, start_time, song_creation_data, downloads_dir)
+        if not song_output:
             print("CREATE_SONG: Could not create and download the song.")
         else:
             print("CREATE_SONG: Finished downloading and saving the song.")
@@ -235,28 +436,28 @@ def main(start_time):
         ErrorLogging().save_error_and_send_email(f"SCRAPER - CREATE_SONG: An unexpected error occurred: {e}.")
     finally:
         print("CREATE_SONG: Finished the scraping job.")
-        if driver:
-            print("CREATE_SONG: Closing the driver...")
-            driver.quit()
+        if browser_session:
+            # The page a failed job left behind can't be trusted by the next job
+            if not song_output:
+                browser_session.close()
+        elif driver:
+            close_driver(driver)
 
         utils.delete_directory(downloads_dir)
 
         if driver:
-            print("CREATE_SONG: Saving the Chrome profile to s3...")
-            profile_dir = f"{chrome_profiles_dir}/{phone_number}_chrome_profile"
-            zip_dir = f"{chrome_profiles_dir}/{phone_number}_chrome_profile"
-
-            if aws.compress_chrome_profile(profile_dir, zip_dir):
-                aws.save_profile_in_bucket(zip_dir + ".zip", phone_number)
-                
-            utils.delete_file(zip_dir + ".zip")
-            utils.delete_directory(chrome_profiles_dir)
+            # A session saves the Chrome profile when its browser closes
+            if not browser_session:
+                save_chrome_profile(aws, chrome_profiles_dir, phone_number)
 
             end_timestamp = int(time.time())
             print(f"CREATE_SONG: End timestamp is {end_timestamp}")
             print(f"CREATE_SONG: Spent {end_timestamp - start_time} seconds on scraping the song.")
 
+    return song_output or None, None
+
 if __name__ == '__main__':
+    setup_logging()
     start_time = int(time.time())
     print(f"CREATE_SONG: Start timestamp is {start_time}")
     load_dotenv()
@@ -0,0 +1,50 @@
+-- Applies the status updates buffered by the write-behind buffer (db/write_behind.py)
+-- in one round trip and one transaction. p_updates is an array of
+-- {table, key_column, key_value, values, only_if_null}: the columns of values are
+-- always written, the ones of only_if_null only while they are still null.
+-- Only the status tables written by the scraper can be updated.
+
+create or replace function backpack_bots.apply_status_updates(
+    p_updates jsonb
+) returns integer
+language plpgsql
+as $$
+declare
+    status_update jsonb;
+    set_clauses text[];
+    status_column text;
+    updated_rows integer := 0;
+    statement_rows integer;
+begin
+    for status_update in select * from jsonb_array_elements(p_updates) loop
+        if (status_update->>'table', status_update->>'key_column') not in (('scraper_status', 'phone_number'), ('discord_song_generations', 'generation_id')) then
+            raise exception 'Status updates of %.% are not allowed.', status_update->>'table', status_update->>'key_column';
+        end if;
+
+        set_clauses := array[]::text[];
+        for status_column in select jsonb_object_keys(coalesce(status_update->'values', '{}'::jsonb)) loop
+            set_clauses := set_clauses || format('%1$I = new_values.%1$I', status_column);
+        end loop;
+        for status_column in select jsonb_object_keys(coalesce(status_update->'only_if_null', '{}'::jsonb)) loop
+            set_clauses := set_clauses || format('%1$I = coalesce(target.%1$I, new_values.%1$I)', status_column);
+        end loop;
+
+        if cardinality(set_clauses) = 0 then
+            continue;
+        end if;
+
+        -- jsonb_populate_record casts every value to the type of its column
+        execute format(
+            'update backpack_bots.%1$I target set %2$s
+             from jsonb_populate_record(null::backpack_bots.%1$I, $1) new_values
+             where target.%3$I = $2',
+            status_update->>'table', array_to_string(set_clauses, ', '), status_update->>'key_column'
+        ) using coalesce(status_update->'only_if_null', '{}'::jsonb) || coalesce(status_update->'values', '{}'::jsonb), status_update->>'key_value';
+
+        get diagnostics statement_rows = row_count;
+        updated_rows := updated_rows + statement_rows;
+    end loop;
+
+    return updated_rows;
+end;
+$$;
@@ -0,0 +1,75 @@
+-- Commits a finished song in one round trip: checks that the generation still
+-- waits for its output and that the songs were uploaded for it, then writes the
+-- song output and the remaining credits of the account in the same transaction.
+-- Committing the same output again (a retry after a lost response) returns it
+-- instead of failing. A generation whose previous run failed after identifying
+-- its songs (a resumable scrape_checkpoint of the same account) can still be
+-- committed, and its error message is cleared.
+
+create or replace function backpack_bots.commit_song_output(
+    p_generation_id text,
+    p_phone_number text,
+    p_output_song jsonb,
+    p_song_title text,
+    p_song_genre text,
+    p_song_lyrics text,
+    p_remaining_credits integer,
+    p_max_credits integer
+) returns jsonb
+language plpgsql
+as $$
+declare
+    generation backpack_bots.discord_song_generations%rowtype;
+begin
+    select * into generation
+    from backpack_bots.discord_song_generations
+    where generation_id = p_generation_id
+    for update;
+
+    if not found then
+        raise exception 'Generation % does not exist.', p_generation_id;
+    end if;
+
+    if generation.output_song is not null then
+        if generation.output_song->>'song' = p_output_song->>'song' then
+            return generation.output_song;
+        end if;
+        raise exception 'Generation % already has another song output.', p_generation_id;
+    end if;
+
+    if generation.user_id is null or generation.output_reply_id is null then
+        raise exception 'Generation % cannot receive a song output.', p_generation_id;
+    end if;
+
+    if generation.error_message is not null and not (
+        generation.scrape_checkpoint->>'phase' in ('songs_identified', 'downloaded', 'uploaded')
+        and generation.scrape_checkpoint->>'phone_number' = p_phone_number
+        and jsonb_array_length(coalesce(generation.scrape_checkpoint->'song_ids', '[]'::jsonb)) > 0
+    ) then
+        raise exception 'Generation % cannot receive a song output.', p_generation_id;
+    end if;
+
+    if not exists (
+        select 1 from backpack_bots.song_output_audio
+        where generation_id = p_generation_id and bucket_path = p_output_song->>'song'
+    ) then
+        raise exception 'The song % was not uploaded for generation %.', p_output_song->>'song', p_generation_id;
+    end if;
+
+    update backpack_bots.discord_song_generations
+    set output_song = p_output_song,
+        song_output_title = p_song_title,
+        song_output_genre = p_song_genre,
+        song_output_lyrics = p_song_lyrics,
+        error_message = null
+    where generation_id = p_generation_id;
+
+    if p_remaining_credits is not null and p_remaining_credits between 0 and p_max_credits then
+        update backpack_bots.scraper_status
+        set remaining_credits = p_remaining_credits
+        where phone_number = p_phone_number;
+    end if;
+
+    return p_output_song;
+end;
+$$;
@@ -0,0 +1,53 @@
+-- Index of the generations that are in flight, completed or failed, shared by
+-- every task so that a duplicate or a retry of a finished generation never
+-- launches a browser. An in flight claim expires after the runtime of the run
+-- that took it, in case its task was killed.
+
+create table if not exists backpack_bots.generation_index (
+    generation_id text primary key,
+    state text not null,
+    result jsonb,
+    expires_at timestamptz,
+    updated_at timestamptz not null default now()
+);
+
+create or replace function backpack_bots.claim_generation_index(
+    p_generation_id text,
+    p_lease_seconds integer
+) returns table (claimed boolean, state text, result jsonb)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+    -- The unique key makes the insert and the takeover of an expired claim atomic
+    return query
+    insert into backpack_bots.generation_index as entries (generation_id, state, expires_at)
+    values (p_generation_id, 'in_flight', now() + make_interval(secs => p_lease_seconds))
+    on conflict (generation_id) do update
+    set state = 'in_flight', result = null, expires_at = excluded.expires_at, updated_at = now()
+    where entries.state = 'in_flight' and entries.expires_at < now()
+    returning true, entries.state, entries.result;
+
+    if not found then
+        return query
+        select false, entries.state, entries.result
+        from backpack_bots.generation_index entries
+        where entries.generation_id = p_generation_id;
+    end if;
+end;
+$$;
+
+create or replace function backpack_bots.set_generation_index_state(
+    p_generation_id text,
+    p_state text,
+    p_result jsonb
+) returns boolean
+language sql
+as $$
+    insert into backpack_bots.generation_index as entries (generation_id, state, result)
+    values (p_generation_id, p_state, p_result)
+    on conflict (generation_id) do update
+    set state = excluded.state, result = excluded.result, expires_at = null, updated_at = now();
+
+    select true;
+$$;
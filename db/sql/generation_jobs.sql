@@ -0,0 +1,145 @@
+-- Job queue for song generations. Workers lease jobs with FOR UPDATE SKIP LOCKED,
+-- keep them alive with heartbeats and expired leases go back to the queue.
+
+create table if not exists backpack_bots.generation_jobs (
+    generation_id text primary key references backpack_bots.discord_song_generations (generation_id),
+    phone_number text,
+    max_runtime integer not null,
+    status text not null default 'pending',
+    worker_id text,
+    lease_expires_at timestamptz,
+    attempts integer not null default 0,
+    last_error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists generation_jobs_pending_idx
+    on backpack_bots.generation_jobs (created_at)
+    where status = 'pending';
+
+create index if not exists generation_jobs_leased_idx
+    on backpack_bots.generation_jobs (lease_expires_at)
+    where status = 'leased';
+
+create or replace function backpack_bots.enqueue_generation_job(
+    p_generation_id text,
+    p_phone_number text,
+    p_max_runtime integer
+) returns boolean
+language sql
+as $$
+    with inserted as (
+        insert into backpack_bots.generation_jobs (generation_id, phone_number, max_runtime)
+        values (p_generation_id, p_phone_number, p_max_runtime)
+        on conflict (generation_id) do nothing
+        returning 1
+    )
+    select exists (select 1 from inserted);
+$$;
+
+create or replace function backpack_bots.requeue_expired_generation_jobs(
+    p_max_attempts integer
+) returns integer
+language plpgsql
+as $$
+declare
+    requeued integer;
+begin
+    update backpack_bots.generation_jobs
+    set status = 'failed', last_error = 'Lease expired too many times.', worker_id = null, lease_expires_at = null, updated_at = now()
+    where status = 'leased' and lease_expires_at < now() and attempts >= p_max_attempts;
+
+    update backpack_bots.generation_jobs
+    set status = 'pending', worker_id = null, lease_expires_at = null, updated_at = now()
+    where status = 'leased' and lease_expires_at < now();
+
+    get diagnostics requeued = row_count;
+    return requeued;
+end;
+$$;
+
+create or replace function backpack_bots.claim_generation_job(
+    p_worker_id text,
+    p_phone_number text,
+    p_generation_id text,
+    p_lease_seconds integer,
+    p_max_attempts integer
+) returns setof backpack_bots.generation_jobs
+language plpgsql
+as $$
+begin
+    perform backpack_bots.requeue_expired_generation_jobs(p_max_attempts);
+
+    return query
+    update backpack_bots.generation_jobs jobs
+    set status = 'leased',
+        worker_id = p_worker_id,
+        phone_number = coalesce(jobs.phone_number, p_phone_number),
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+        attempts = jobs.attempts + 1,
+        updated_at = now()
+    where jobs.generation_id = (
+        select candidate.generation_id
+        from backpack_bots.generation_jobs candidate
+        where candidate.status = 'pending'
+          and (candidate.phone_number is null or candidate.phone_number = p_phone_number)
+          and (p_generation_id is null or candidate.generation_id = p_generation_id)
+        order by candidate.created_at
+        limit 1
+        for update skip locked
+    )
+    returning jobs.*;
+end;
+$$;
+
+create or replace function backpack_bots.heartbeat_generation_job(
+    p_generation_id text,
+    p_worker_id text,
+    p_lease_seconds integer
+) returns boolean
+language sql
+as $$
+    with updated as (
+        update backpack_bots.generation_jobs
+        set lease_expires_at = now() + make_interval(secs => p_lease_seconds), updated_at = now()
+        where generation_id = p_generation_id and worker_id = p_worker_id and status = 'leased'
+        returning 1
+    )
+    select exists (select 1 from updated);
+$$;
+
+create or replace function backpack_bots.finish_generation_job(
+    p_generation_id text,
+    p_worker_id text,
+    p_status text,
+    p_error text
+) returns boolean
+language sql
+as $$
+    with updated as (
+        update backpack_bots.generation_jobs
+        set status = p_status, last_error = p_error, lease_expires_at = null, updated_at = now()
+        where generation_id = p_generation_id and worker_id = p_worker_id and status = 'leased'
+        returning 1
+    )
+    select exists (select 1 from updated);
+$$;
+
+create or replace function backpack_bots.retry_generation_job(
+    p_generation_id text,
+    p_worker_id text,
+    p_error text,
+    p_max_attempts integer
+) returns boolean
+language sql
+as $$
+    with updated as (
+        update backpack_bots.generation_jobs
+        set status = case when attempts < p_max_attempts then 'pending' else 'failed' end,
+            worker_id = null, last_error = p_error, lease_expires_at = null, updated_at = now()
+        where generation_id = p_generation_id and worker_id = p_worker_id and status = 'leased'
+        returning 1
+    )
+    select exists (select 1 from updated);
+$$;
@@ -0,0 +1,44 @@
+-- Lookup timings of every locator strategy and the strategy that last found each element,
+-- shared by all the Fargate tasks so that a fresh container starts with the winners of the fleet.
+
+create table if not exists backpack_bots.locator_strategies (
+    locator_name text not null,
+    strategy text not null,
+    lookups bigint not null default 0,
+    total_seconds double precision not null default 0,
+    -- When the strategy last found the element, or null if it never did or missed since
+    won_at timestamptz,
+    primary key (locator_name, strategy)
+);
+
+-- Adds the lookups of a job to the totals, so that concurrent tasks don't overwrite each other.
+-- p_lookups is an array of {locator_name, strategy, lookups, total_seconds, won}, where won is
+-- true for a new winner, false for an evicted one and null when the strategy didn't change.
+create or replace function backpack_bots.record_locator_lookups(
+    p_lookups jsonb
+) returns void
+language plpgsql
+as $$
+declare
+    lookup jsonb;
+begin
+    for lookup in select * from jsonb_array_elements(p_lookups) loop
+        insert into backpack_bots.locator_strategies as strategies (locator_name, strategy, lookups, total_seconds, won_at)
+        values (
+            lookup->>'locator_name',
+            lookup->>'strategy',
+            coalesce((lookup->>'lookups')::bigint, 0),
+            coalesce((lookup->>'total_seconds')::double precision, 0),
+            case when (lookup->>'won')::boolean then now() end
+        )
+        on conflict (locator_name, strategy) do update set
+            lookups = strategies.lookups + excluded.lookups,
+            total_seconds = strategies.total_seconds + excluded.total_seconds,
+            won_at = case (lookup->>'won')::boolean
+                when true then now()
+                when false then null
+                else strategies.won_at
+            end;
+    end loop;
+end;
+$$;
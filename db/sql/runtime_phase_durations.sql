@@ -0,0 +1,31 @@
+-- Phase durations of every scraping job, shared by all the Fargate tasks so that
+-- the runtime budget of a fresh container plans with the history of the fleet.
+-- Phases that timed out or failed are recorded too, with their outcome.
+
+create table if not exists backpack_bots.runtime_phase_durations (
+    id bigint generated always as identity primary key,
+    phase text not null,
+    duration real not null,
+    outcome text not null default 'completed',
+    generation_id text,
+    recorded_at timestamptz not null default now()
+);
+
+create index if not exists runtime_phase_durations_phase_idx
+    on backpack_bots.runtime_phase_durations (phase, recorded_at desc);
+
+create or replace function backpack_bots.recent_runtime_phase_durations(
+    p_max_samples integer
+) returns table (phase text, duration real)
+language sql
+stable
+as $$
+    select recent.phase, recent.duration
+    from (
+        select durations.phase, durations.duration, durations.recorded_at,
+               row_number() over (partition by durations.phase order by durations.recorded_at desc) as sample_number
+        from backpack_bots.runtime_phase_durations durations
+    ) recent
+    where recent.sample_number <= p_max_samples
+    order by recent.phase, recent.recorded_at;
+$$;
@@ -0,0 +1,5 @@
+-- Per-generation scrape checkpoint used to resume a generation after the task
+-- that clicked Create was killed (phase, Suno account, song IDs, uploaded songs).
+
+alter table backpack_bots.discord_song_generations
+    add column if not exists scrape_checkpoint jsonb;
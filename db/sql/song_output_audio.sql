@@ -0,0 +1,16 @@
+-- Content-addressed song audio. Songs are stored in the song-output-audio bucket
+-- under the SHA-256 of their bytes and every upload is mapped to its generation,
+-- so retries never upload the same bytes twice and "does this generation already
+-- have a song" is an indexed lookup instead of a bucket listing.
+
+create table if not exists backpack_bots.song_output_audio (
+    generation_id text not null references backpack_bots.discord_song_generations (generation_id),
+    sha256 text not null,
+    bucket_path text not null,
+    size_bytes bigint,
+    created_at timestamptz not null default now(),
+    primary key (generation_id, sha256)
+);
+
+create index if not exists song_output_audio_sha256_idx
+    on backpack_bots.song_output_audio (sha256);
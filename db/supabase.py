@@ -3,7 +3,11 @@ import re
 import jwt
 import time
 import json
+import utils.utils as utils
 import constants as CONSTANTS
+from metrics.metrics import instrument_supabase_client
+from checkpoint.checkpoint import is_resumable_checkpoint
+from db.write_behind import get_write_behind_buffer
 from dotenv import load_dotenv
 from unidecode import unidecode
 from supabase import create_client, Client, ClientOptions
@@ -32,16 +36,16 @@ class Supabase:
         return jwt.encode(payload, os.getenv("SUPABASE_JWT_SECRET"), algorithm='HS256')
 
     def get_supabase_client(self, token):
-        """Create and return a Supabase client."""
+        """Create and return a Supabase client whose requests are counted in the metrics."""
         options = ClientOptions(
             schema=CONSTANTS.SUPABASE_SCHEMA,
             headers={"Authorization": f"Bearer {token}"}
         )
-        return create_client(
+        return instrument_supabase_client(create_client(
             os.getenv("SUPABASE_URL"),
             os.getenv("SUPABASE_ANON_KEY"),
             options
-        )
+        ))
     
     def is_valid_song_generation(self):
         """Check if the Supabase song generation entry is valid."""
@@ -66,7 +70,8 @@ class Supabase:
                 "song_output_genre, "
                 "song_output_title, "
                 "song_output_lyrics, "
-                "song_output_cover"
+                "song_output_cover, "
+                "scrape_checkpoint"
             ).eq("generation_id", generation_id).execute()
             
             if not generation_response.data:
@@ -75,10 +80,13 @@ class Supabase:
             
             generation_data = generation_response.data[0]
 
-            # Check for various error conditions
+            # Check for various error conditions. A failed run that identified its songs can still be resumed by a retry
+            scrape_checkpoint = generation_data["scrape_checkpoint"] or {}
             if generation_data["error_message"] is not None:
-                print("SUPABASE: The song generation encountered an error before the scrape process started.")
-                return False
+                if not is_resumable_checkpoint(scrape_checkpoint, os.getenv('PHONE_NUMBER')):
+                    print("SUPABASE: The song generation encountered an error before the scrape process started.")
+                    return False
+                print("SUPABASE: The song generation encountered an error, but a previous run identified its songs so it can be resumed.")
             
             if generation_data["output_reply_id"] is None:
                 print("SUPABASE: There's no output reply ID saved for this song generation.")
@@ -152,11 +160,12 @@ class Supabase:
                 print("SUPABASE: Could not find the user associated with this generation or user has no platform specific ID.")
                 return False
             
-            # Check if song already exists in the output audio bucket
-            platform_user_id = user_response.data[0]["platform_user_id"]
-            audio_bucket_song_path = f"user-id:{platform_user_id}/guild-id:{generation_data['replies_guild']}/output-reply-id:{generation_data['output_reply_id']}/"
-            bucket_query_response = client.storage.from_(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_BUCKET).list(path=audio_bucket_song_path)
-            if bucket_query_response:
+            # Check if a song was already uploaded for this generation (an indexed row lookup instead of listing the bucket).
+            # A run killed between the background upload and the uploaded checkpoint leaves the row behind, and its retry
+            # uploads the same bytes again, which only relinks the stored song.
+            audio_response = client.table(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_TABLE).select("sha256").eq("generation_id", generation_id).limit(1).execute()
+            resumable_upload = scrape_checkpoint.get("phase") == CONSTANTS.CHECKPOINT_UPLOADED or is_resumable_checkpoint(scrape_checkpoint, os.getenv('PHONE_NUMBER'))
+            if audio_response.data and not resumable_upload:
                 print("SUPABASE: There's a song already saved in the output audio bucket and linked to this generation.")
                 return False
 
@@ -208,6 +217,29 @@ class Supabase:
             print(f"SUPABASE: Error trying to fetch the song generation modes: {e}")
             return None, None
 
+    def get_creation_modes_for_generations(self, generation_ids):
+        """Fetch the creation modes of several generations at once. Returns {generation_id: (use_instrumental, use_custom_mode)}."""
+        if not generation_ids:
+            return {}
+
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+
+        try:
+            generation_response = client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).select(
+                "generation_id, "
+                "use_custom_mode, "
+                "use_instrumental_only"
+            ).in_("generation_id", generation_ids).execute()
+
+            return {
+                generation_data["generation_id"]: (generation_data["use_instrumental_only"], generation_data["use_custom_mode"])
+                for generation_data in generation_response.data
+            }
+        except Exception as e:
+            print(f"SUPABASE: Error trying to fetch the creation modes of several generations: {e}")
+            return {}
+
     def scraper_can_create_song(self):
         """Check if the scraper can create a song (no errors and enough credits)."""
         bearer_token = self.generate_scraper_jwt()
@@ -241,9 +273,13 @@ class Supabase:
             print("SUPABASE: Invalid new Suno credits number.")
             return False
 
+        phone_number = os.getenv('PHONE_NUMBER')
+        if self.is_write_behind_enabled():
+            get_write_behind_buffer(self).set(CONSTANTS.SUPABASE_SCRAPER_STATUS_TABLE, "phone_number", phone_number, {"remaining_credits": int(credits)})
+            return True
+
         bearer_token = self.generate_scraper_jwt()
         client: Client = self.get_supabase_client(bearer_token)
-        phone_number = os.getenv('PHONE_NUMBER')
 
         try:
             client.table(CONSTANTS.SUPABASE_SCRAPER_STATUS_TABLE).update({"remaining_credits": int(credits)}).eq("phone_number", phone_number).execute()
@@ -253,107 +289,326 @@ class Supabase:
             return False
         
     def update_scraper_latest_error(self, errorDetails):
-        """Update the latest error for the current PHONE_NUMBER."""
+        """Update the latest error for the current PHONE_NUMBER, unless it already has one."""
         error = self.stringify_if_json(errorDetails)
 
         if not error:
             print("SUPABASE: Invalid error message.")
             return False
 
+        phone_number = os.getenv('PHONE_NUMBER')
+        if self.is_write_behind_enabled():
+            get_write_behind_buffer(self).set(CONSTANTS.SUPABASE_SCRAPER_STATUS_TABLE, "phone_number", phone_number, {"latest_error": error}, only_if_null=True)
+            return True
+
         bearer_token = self.generate_scraper_jwt()
         client: Client = self.get_supabase_client(bearer_token)
-        phone_number = os.getenv('PHONE_NUMBER')
 
         try:
-            scraper_status = client.table(CONSTANTS.SUPABASE_SCRAPER_STATUS_TABLE).select("latest_error").eq("phone_number", phone_number).execute()
-            if scraper_status.data and scraper_status.data[0] and scraper_status.data[0]["latest_error"] is not None:
-                return True
-
-            client.table(CONSTANTS.SUPABASE_SCRAPER_STATUS_TABLE).update({"latest_error": error}).eq("phone_number", phone_number).execute()
+            client.table(CONSTANTS.SUPABASE_SCRAPER_STATUS_TABLE).update({"latest_error": error}).eq("phone_number", phone_number).is_("latest_error", "null").execute()
             return True
         except Exception as e:
             print(f"SUPABASE: Got an error trying to update the latest error for {phone_number}. Details: {e}")
             return False
         
     def update_generation_error_message(self, errorDetails):
-        """Update the error message for the current GENERATION_ID."""
+        """Update the error message for the current GENERATION_ID, unless it already has one."""
         error = self.stringify_if_json(errorDetails)
 
         if not error:
             print("SUPABASE: Invalid error message.")
             return False
 
+        generation_id = os.getenv('GENERATION_ID')
+        if self.is_write_behind_enabled():
+            get_write_behind_buffer(self).set(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE, "generation_id", generation_id, {"error_message": error}, only_if_null=True)
+            return True
+
         bearer_token = self.generate_scraper_jwt()
         client: Client = self.get_supabase_client(bearer_token)
-        generation_id = os.getenv('GENERATION_ID')
 
         try:
-            song_generation = client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).select("*").eq("generation_id", generation_id).execute()
-            if song_generation.data and song_generation.data[0] and song_generation.data[0]["error_message"] is not None:
-                return True
-
-            client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).update({"error_message": error}).eq("generation_id", generation_id).execute()
+            client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).update({"error_message": error}).eq("generation_id", generation_id).is_("error_message", "null").execute()
             return True
         except Exception as e:
             print(f"SUPABASE: Got an error trying to update the error message for the generation with ID {generation_id}. Details: {e}")
             return False
+
+    def is_write_behind_enabled(self):
+        """Whether status updates go through the write-behind buffer instead of blocking the caller."""
+        return os.getenv("WRITE_BEHIND_ENABLED", str(CONSTANTS.WRITE_BEHIND_ENABLED)).lower() == "true"
         
+    def get_scrape_checkpoint(self):
+        """Fetch the scrape checkpoint of the current GENERATION_ID."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+        generation_id = os.getenv('GENERATION_ID')
+
+        try:
+            response = client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).select("scrape_checkpoint").eq("generation_id", generation_id).execute()
+            if not response.data:
+                return None
+
+            return response.data[0]["scrape_checkpoint"]
+        except Exception as e:
+            print(f"SUPABASE: Got an error trying to fetch the scrape checkpoint for the generation with ID {generation_id}. Details: {e}")
+            return None
+
+    def get_runtime_phase_durations(self, max_samples):
+        """Fetch the latest durations of every phase, recorded by all the scrapers. Returns None if they can't be read."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+
+        try:
+            rows = client.rpc("recent_runtime_phase_durations", {"p_max_samples": max_samples}).execute().data
+            history = {}
+            for row in rows or []:
+                history.setdefault(row["phase"], []).append(float(row["duration"]))
+            return history
+        except Exception as e:
+            print(f"SUPABASE: Got an error trying to fetch the runtime phase durations. Details: {e}")
+            return None
+
+    def save_runtime_phase_durations(self, durations):
+        """Save the phase durations of this job, as (phase, duration, outcome) tuples."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+        generation_id = os.getenv('GENERATION_ID')
+
+        try:
+            client.table(CONSTANTS.SUPABASE_RUNTIME_PHASE_DURATIONS_TABLE).insert([
+                {"phase": phase, "duration": duration, "outcome": outcome, "generation_id": generation_id}
+                for phase, duration, outcome in durations
+            ]).execute()
+            return True
+        except Exception as e:
+            print(f"SUPABASE: Got an error trying to save the runtime phase durations. Details: {e}")
+            return False
+
+    def get_locator_winners(self):
+        """Fetch the strategy that last found each locator, recorded by all the scrapers. Returns None if they can't be read."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+
+        try:
+            rows = client.table(CONSTANTS.SUPABASE_LOCATOR_STRATEGIES_TABLE).select("locator_name, strategy, won_at").execute().data
+            winners, won_at = {}, {}
+            for row in rows or []:
+                if row["won_at"] and row["won_at"] > won_at.get(row["locator_name"], ""):
+                    winners[row["locator_name"]], won_at[row["locator_name"]] = row["strategy"], row["won_at"]
+            return winners
+        except Exception as e:
+            print(f"SUPABASE: Got an error trying to fetch the locator strategies. Details: {e}")
+            return None
+
+    def save_locator_lookups(self, lookups):
+        """Add the lookups of this job to the locator strategies, as {locator_name, strategy, lookups, total_seconds, won} dicts."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+
+        try:
+            client.rpc("record_locator_lookups", {"p_lookups": lookups}).execute()
+            return True
+        except Exception as e:
+            print(f"SUPABASE: Got an error trying to save the locator lookups. Details: {e}")
+            return False
+
+    def get_pending_scrape_checkpoints(self, phone_number):
+        """Fetch the scrape checkpoints of an account whose songs aren't saved yet."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+
+        try:
+            response = client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).select("scrape_checkpoint") \
+                .eq("scrape_checkpoint->>phone_number", phone_number) \
+                .neq("scrape_checkpoint->>phase", CONSTANTS.CHECKPOINT_SAVED).execute()
+            return [row["scrape_checkpoint"] for row in response.data]
+        except Exception as e:
+            print(f"SUPABASE: Got an error trying to fetch the pending scrape checkpoints of {phone_number}. Details: {e}")
+            return None
+
+    def update_scrape_checkpoint(self, checkpoint):
+        """Save the scrape checkpoint of the current GENERATION_ID."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+        generation_id = os.getenv('GENERATION_ID')
+
+        try:
+            client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).update({"scrape_checkpoint": checkpoint}).eq("generation_id", generation_id).execute()
+            return True
+        except Exception as e:
+            print(f"SUPABASE: Got an error trying to save the scrape checkpoint for the generation with ID {generation_id}. Details: {e}")
+            return False
+
     def save_song_data(self, song_title, song_genre, song_lyrics, downloaded_song_path):
-        """Save the song data on Supabase."""
+        """Save the song data on Supabase. Returns the bucket path of the uploaded song."""
         if not all([song_title, song_genre, song_lyrics, downloaded_song_path]):
             print("SUPABASE: Invalid input for saving the song data.")
             return False
 
+        audio_bucket_song_path = self.upload_song_audio(downloaded_song_path)
+        if not audio_bucket_song_path:
+            return False
+
+        output_song = self.save_song_output(song_title, song_genre, song_lyrics, audio_bucket_song_path)
+        return output_song["song"] if output_song else False
+
+    def upload_song_audio(self, downloaded_song_path):
+        """Upload a downloaded song to the output audio bucket under the SHA-256 of its bytes. Returns the bucket path of the song."""
+        if not downloaded_song_path:
+            print("SUPABASE: Invalid song path for the upload.")
+            return False
+
+        if not os.path.exists(downloaded_song_path):
+            print(f"SUPABASE: Song not found at {downloaded_song_path}.")
+            return False
+
+        song_sha256 = utils.get_file_sha256(downloaded_song_path)
+        if not song_sha256:
+            print("SUPABASE: Could not hash the song before the upload.")
+            return False
+
         bearer_token = self.generate_scraper_jwt()
         client: Client = self.get_supabase_client(bearer_token)
         generation_id = os.getenv('GENERATION_ID')
 
+        song_file_extension = os.path.splitext(unidecode(os.path.basename(downloaded_song_path)))[1].lower()
+        audio_bucket_song_path = f"{CONSTANTS.SUPABASE_CONTENT_ADDRESSED_AUDIO_PREFIX}/{song_sha256[:2]}/{song_sha256}{song_file_extension}"
+
         try:
-            if not os.path.exists(downloaded_song_path):
-                print(f"SUPABASE: Song not found at {downloaded_song_path}.")
-                return False
-            
-            generation_response = client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).select("user_id, replies_guild, output_reply_id").eq("generation_id", generation_id).execute()
+            # The same bytes are already in the bucket when a retry uploads a song again
+            existing_response = client.table(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_TABLE).select("bucket_path").eq("sha256", song_sha256).eq("bucket_path", audio_bucket_song_path).limit(1).execute()
 
-            if not generation_response.data:
-                print("SUPABASE: Could not find the generation ID info while saving song data.")
-                return False
-            
-            generation_data = generation_response.data[0]
-            if not all([generation_data["user_id"], generation_data["replies_guild"], generation_data["output_reply_id"]]):
-                print("SUPABASE: Got an invalid user ID, replies guild ID or initial reply ID while saving the song data.")
-                return False
+            if existing_response.data:
+                print(f"SUPABASE: The song is already stored at {audio_bucket_song_path}. Skipping the upload.")
+            else:
+                print(f"SUPABASE: Saving the song file in the bucket called {CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_BUCKET} at {audio_bucket_song_path}")
+                if not self.upload_audio_object(client, downloaded_song_path, audio_bucket_song_path):
+                    return False
 
-            user_response = client.table(CONSTANTS.SUPABASE_USERS_TABLE).select("platform_user_id").eq("user_id", generation_data["user_id"]).execute()
-            if not user_response.data or not user_response.data[0]["platform_user_id"]:
-                print("SUPABASE: Could not find the user associated with this generation or user has no platform specific ID.")
-                return False
-            
-            platform_user_id = user_response.data[0]["platform_user_id"]
-            song_file_name = unidecode(os.path.basename(downloaded_song_path))
-            audio_bucket_song_path = f"user-id:{platform_user_id}/guild-id:{generation_data['replies_guild']}/output-reply-id:{generation_data['output_reply_id']}/{song_file_name}"
+            client.table(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_TABLE).upsert({
+                "generation_id": generation_id,
+                "sha256": song_sha256,
+                "bucket_path": audio_bucket_song_path,
+                "size_bytes": os.path.getsize(downloaded_song_path)
+            }, on_conflict="generation_id, sha256").execute()
+
+            return audio_bucket_song_path
+        except Exception as e:
+            print(f"SUPABASE: Error uploading the song to Supabase. Details: {e}")
+            return False
+
+    def delete_song_audio(self, audio_bucket_song_path):
+        """Unlink an uploaded song from the current generation and delete the object unless another generation stored the same bytes."""
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+        generation_id = os.getenv('GENERATION_ID')
 
-            print(f"SUPABASE: Saving the song file in the bucket called {CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_BUCKET} at {audio_bucket_song_path}")
+        try:
+            client.table(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_TABLE).delete().eq("generation_id", generation_id).eq("bucket_path", audio_bucket_song_path).execute()
+
+            other_links_response = client.table(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_TABLE).select("generation_id").eq("bucket_path", audio_bucket_song_path).limit(1).execute()
+            if not other_links_response.data:
+                client.storage.from_(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_BUCKET).remove([audio_bucket_song_path])
 
-            with open(downloaded_song_path, 'rb') as audio_file:
-                song_upload_response = client.storage.from_(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_BUCKET).upload(
-                    path=audio_bucket_song_path,
+            print(f"SUPABASE: Deleted the song stored at {audio_bucket_song_path}.")
+            return True
+        except Exception as e:
+            print(f"SUPABASE: Could not delete the song stored at {audio_bucket_song_path}. Details: {e}")
+            return False
+
+    def upload_audio_object(self, client, file_path, bucket_path):
+        """Stream a file to the output audio bucket. An object that already exists at bucket_path counts as uploaded, since its key is the hash of its bytes."""
+        try:
+            with open(file_path, 'rb') as audio_file:
+                upload_response = client.storage.from_(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_BUCKET).upload(
+                    path=bucket_path,
                     file=audio_file,
-                    file_options={"content-type": f"audio/{song_file_name.split('.')[-1]}"}
+                    file_options={"content-type": f"audio/{bucket_path.split('.')[-1]}"}
                 )
+        except Exception as e:
+            if "Duplicate" in str(e) or "409" in str(e):
+                print(f"SUPABASE: An upload of a previous attempt already stored the song at {bucket_path}.")
+                return True
+            print(f"SUPABASE: Error uploading {file_path} to Supabase. Details: {e}")
+            return False
 
-            if not song_upload_response.status_code or song_upload_response.status_code != 200:
-                print("SUPABASE: Failed to upload the song to the Supabase bucket.")
-                return False
-            
+        if not upload_response.status_code or upload_response.status_code != 200:
+            print("SUPABASE: Failed to upload the song to the Supabase bucket.")
+            return False
+
+        return True
+
+    def build_output_song(self, audio_bucket_song_path, extra_songs=None, audio_details=None):
+        """The output_song saved on the generation: the main song, its audio details and the extra songs."""
+        # Duration, waveform and previews are only there when the audio post-processing ran
+        output_song = {"song": audio_bucket_song_path, **(audio_details or {})}
+        if extra_songs:
+            output_song["extra_songs"] = [{
+                "song": extra_song["song"],
+                "title": unidecode(extra_song["title"]),
+                "genre": extra_song["genre"],
+                "lyrics": extra_song["lyrics"],
+                **{key: extra_song[key] for key in ("duration", "waveform", "previews") if key in extra_song}
+            } for extra_song in extra_songs]
+        return output_song
+
+    def commit_song_output(self, song_title, song_genre, song_lyrics, audio_bucket_song_path, extra_songs=None, audio_details=None, remaining_credits=None):
+        """Save the song output and the remaining credits in a single transaction through the commit_song_output function. Returns the saved output_song."""
+        if not all([song_title, song_genre, song_lyrics, audio_bucket_song_path]):
+            print("SUPABASE: Invalid input for committing the song output.")
+            return False
+
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+        generation_id = os.getenv('GENERATION_ID')
+        output_song = self.build_output_song(audio_bucket_song_path, extra_songs, audio_details)
+
+        try:
+            return client.rpc("commit_song_output", {
+                "p_generation_id": generation_id,
+                "p_phone_number": os.getenv('PHONE_NUMBER'),
+                "p_output_song": output_song,
+                "p_song_title": unidecode(song_title),
+                "p_song_genre": song_genre,
+                "p_song_lyrics": song_lyrics,
+                "p_remaining_credits": int(remaining_credits) if remaining_credits else None,
+                "p_max_credits": CONSTANTS.MAX_CREDITS_NUMBER
+            }).execute().data or False
+        except Exception as e:
+            # Databases without the function (db/sql/commit_song_output.sql) keep the separate updates
+            if CONSTANTS.POSTGREST_MISSING_FUNCTION_CODE in str(e):
+                print("SUPABASE: The commit_song_output function doesn't exist. Saving the song output and the credits separately.")
+                output_song = self.save_song_output(song_title, song_genre, song_lyrics, audio_bucket_song_path, extra_songs, audio_details)
+                if output_song and remaining_credits:
+                    self.update_credit_number(remaining_credits)
+                return output_song
+
+            print(f"SUPABASE: Error committing the song output on Supabase. Details: {e}")
+            return False
+
+    def save_song_output(self, song_title, song_genre, song_lyrics, audio_bucket_song_path, extra_songs=None, audio_details=None):
+        """Link an uploaded song, any extra songs from the same generation and their metadata to the current GENERATION_ID. Returns the saved output_song."""
+        if not all([song_title, song_genre, song_lyrics, audio_bucket_song_path]):
+            print("SUPABASE: Invalid input for saving the song output.")
+            return False
+
+        bearer_token = self.generate_scraper_jwt()
+        client: Client = self.get_supabase_client(bearer_token)
+        generation_id = os.getenv('GENERATION_ID')
+        output_song = self.build_output_song(audio_bucket_song_path, extra_songs, audio_details)
+
+        try:
             client.table(CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE).update({
-                "output_song": {"song": audio_bucket_song_path},
+                "output_song": output_song,
                 "song_output_genre": song_genre,
                 "song_output_title": unidecode(song_title),
-                "song_output_lyrics": song_lyrics
+                "song_output_lyrics": song_lyrics,
+                # A resumed generation keeps the error of the run that failed until its songs are saved
+                "error_message": None
             }).eq("generation_id", generation_id).execute()
 
-            return True
+            return output_song
         except Exception as e:
             print(f"SUPABASE: Error saving the song data on Supabase. Details: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,133 @@
+import atexit
+import threading
+import constants as CONSTANTS
+
+class WriteBehindBuffer:
+    """
+    Buffers status updates (credits, latest errors, generation errors) and writes them in the background.
+    Repeated writes to the same row are coalesced into one update, and "only if null" columns become conditional updates instead of a select and an update.
+    A flush sends every pending row in one apply_status_updates call (db/sql/apply_status_updates.sql), applied in one transaction.
+    """
+
+    def __init__(self, supabase, flush_interval=CONSTANTS.WRITE_BEHIND_FLUSH_INTERVAL):
+        self.supabase = supabase
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.writes = 0
+        self.updates = 0
+        self.requests = 0
+        self.bulk_updates = True
+        self.thread = threading.Thread(target=self.run, name="write_behind", daemon=True)
+        self.thread.start()
+
+    def set(self, table, key_column, key_value, values, only_if_null=False):
+        """
+        Queue an update of a row. With only_if_null, each column is only written if it is still null in the database,
+        and the first value queued wins over later ones, like the first error of a job.
+        """
+        with self.lock:
+            row = self.pending.setdefault((table, key_column, key_value), {"values": {}, "only_if_null": {}})
+            for column, value in values.items():
+                if only_if_null:
+                    row["only_if_null"].setdefault(column, value)
+                else:
+                    row["values"][column] = value
+            self.writes += 1
+
+    def run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write every pending update. Failed updates are queued again. Returns False if any update failed."""
+        with self.flush_lock:
+            with self.lock:
+                rows, self.pending = self.pending, {}
+
+            if not rows:
+                return True
+
+            client = self.supabase.get_supabase_client(self.supabase.generate_scraper_jwt())
+            if not self.bulk_updates:
+                return self.flush_rows(client, rows)
+
+            try:
+                client.rpc("apply_status_updates", {"p_updates": [
+                    {"table": table, "key_column": key_column, "key_value": key_value, "values": row["values"], "only_if_null": row["only_if_null"]}
+                    for (table, key_column, key_value), row in rows.items()
+                ]}).execute()
+                self.updates += len(rows)
+                self.requests += 1
+                return True
+            except Exception as e:
+                # Databases without the function (db/sql/apply_status_updates.sql) get an update per row
+                if CONSTANTS.POSTGREST_MISSING_FUNCTION_CODE in str(e):
+                    print("WRITE_BEHIND: The apply_status_updates function doesn't exist. Updating the rows separately.")
+                    self.bulk_updates = False
+                    return self.flush_rows(client, rows)
+
+                print(f"WRITE_BEHIND: Could not apply {len(rows)} status updates. Details: {e}")
+                self.requeue(rows)
+                return False
+
+    def flush_rows(self, client, rows):
+        """Write the pending rows with separate updates. Failed updates are queued again. Returns False if any update failed."""
+        failed_rows = {}
+        for (table, key_column, key_value), row in rows.items():
+            try:
+                if row["values"]:
+                    client.table(table).update(row["values"]).eq(key_column, key_value).execute()
+                    self.requests += 1
+                    row["values"] = {}
+
+                for column, value in list(row["only_if_null"].items()):
+                    client.table(table).update({column: value}).eq(key_column, key_value).is_(column, "null").execute()
+                    self.requests += 1
+                    del row["only_if_null"][column]
+
+                self.updates += 1
+            except Exception as e:
+                print(f"WRITE_BEHIND: Could not update the row of {table} where {key_column} is {key_value}. Details: {e}")
+                failed_rows[(table, key_column, key_value)] = row
+
+        if failed_rows:
+            self.requeue(failed_rows)
+            return False
+
+        return True
+
+    def requeue(self, failed_rows):
+        """Put failed updates back without overwriting values queued while the flush ran."""
+        with self.lock:
+            for key, failed_row in failed_rows.items():
+                row = self.pending.setdefault(key, {"values": {}, "only_if_null": {}})
+                row["values"] = {**failed_row["values"], **row["values"]}
+                row["only_if_null"] = {**failed_row["only_if_null"], **row["only_if_null"]}
+
+    def close(self):
+        """Stop the background flushes and write what's left."""
+        self.stop_event.set()
+        flushed = self.flush()
+        print(f"WRITE_BEHIND: Coalesced {self.writes} writes into {self.updates} row updates, sent in {self.requests} requests.")
+        return flushed
+
+write_behind_buffer = None
+write_behind_buffer_lock = threading.Lock()
+
+def get_write_behind_buffer(supabase):
+    """Return the write-behind buffer of this process, starting it the first time. What's left in it is written when the process exits."""
+    global write_behind_buffer
+    with write_behind_buffer_lock:
+        if write_behind_buffer is None:
+            write_behind_buffer = WriteBehindBuffer(supabase)
+            atexit.register(write_behind_buffer.close)
+        return write_behind_buffer
+
+def flush_write_behind_buffer():
+    """Write the pending updates now, e.g. before a job is acknowledged. Returns False if any update failed."""
+    if write_behind_buffer is None:
+        return True
+    return write_behind_buffer.flush()
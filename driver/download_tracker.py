@@ -0,0 +1,151 @@
+import os
+import time
+import ctypes
+import select
+import ctypes.util
+import constants as CONSTANTS
+from structured_logging.structured_logging import get_logger
+
+logger = get_logger("DOWNLOAD_TRACKER")
+
+class DownloadTracker:
+    """Follows Chrome's download events so a download is picked up the moment it completes instead of polling the downloads dir."""
+
+    def __init__(self, driver, performance_log, download_dir):
+        self.driver = driver
+        self.download_dir = download_dir
+        self.downloads = {}
+        self.performance_log = performance_log
+
+        performance_log.add_listener(self.on_download_event, [
+            "Page.downloadWillBegin",
+            "Page.downloadProgress"
+        ])
+
+    def enable(self):
+        """Send downloads to the job's download dir and turn on the download events."""
+        try:
+            self.driver.execute_cdp_cmd("Browser.setDownloadBehavior", {
+                "behavior": "allow",
+                "downloadPath": self.download_dir,
+                "eventsEnabled": True
+            })
+            return True
+        except Exception as e:
+            logger.warning(f"Could not enable the download events. Details: {e}")
+            return False
+
+    def set_download_dir(self, download_dir):
+        """Send the downloads of a reused browser to the download dir of a new job."""
+        self.download_dir = download_dir
+        return self.enable()
+
+    def on_download_event(self, method, params):
+        guid = params.get("guid")
+        if not guid:
+            return
+
+        download = self.downloads.setdefault(guid, {"suggested_filename": None, "state": "inProgress", "received_bytes": 0})
+        if method == "Page.downloadWillBegin":
+            download["suggested_filename"] = params.get("suggestedFilename")
+        else:
+            download["state"] = params.get("state", download["state"])
+            download["received_bytes"] = params.get("receivedBytes", download["received_bytes"])
+
+    def started_downloads(self):
+        """Snapshot of the downloads seen so far, used to tell a new download apart from older ones."""
+        self.performance_log.poll()
+        return set(self.downloads)
+
+    def wait_for_download(self, known_downloads, known_files, deadline):
+        """
+        Wait for a download that isn't in known_downloads to complete and return its path.
+        Returns None if it failed or didn't complete before the deadline, or False if Chrome sent no download event at all.
+        """
+        started_at = time.time()
+        while time.time() < deadline:
+            self.performance_log.poll()
+
+            new_downloads = [guid for guid in self.downloads if guid not in known_downloads]
+            if new_downloads:
+                download = self.downloads[new_downloads[0]]
+                if download["state"] == "completed":
+                    logger.info(f"Download of {download['suggested_filename']} completed ({download['received_bytes']} bytes).")
+                    return self.find_downloaded_file(download, known_files)
+                elif download["state"] == "canceled":
+                    logger.warning(f"The download of {download['suggested_filename']} was canceled.")
+                    return None
+            elif time.time() - started_at > CONSTANTS.DOWNLOAD_EVENTS_GRACE_TIME:
+                logger.warning("Chrome did not report the download.")
+                return False
+
+            time.sleep(CONSTANTS.DOWNLOAD_EVENT_POLL_INTERVAL)
+
+        logger.warning("The download did not complete in time.")
+        return None
+
+    def find_downloaded_file(self, download, known_files):
+        """Chrome renamed the file to its final name before reporting completion, so the only new complete file is ours."""
+        if not os.path.isdir(self.download_dir):
+            logger.warning(f"The download dir {self.download_dir} does not exist.")
+            return None
+
+        new_files = [item for item in os.listdir(self.download_dir)
+                     if item not in known_files and not item.endswith(".crdownload") and os.path.isfile(os.path.join(self.download_dir, item))]
+
+        if download["suggested_filename"] in new_files:
+            file_name = download["suggested_filename"]
+        elif len(new_files) == 1:
+            file_name = new_files[0]
+        else:
+            logger.warning(f"Could not tell which of {new_files} is the completed download.")
+            return None
+
+        if os.path.splitext(file_name)[1].lower() not in CONSTANTS.ACCEPTED_SONG_FILE_TYPES:
+            logger.warning(f"The downloaded file {file_name} has an invalid extension.")
+            return None
+
+        return os.path.join(self.download_dir, file_name)
+
+class DownloadDirWatcher:
+    """
+    Wakes the downloads dir polling (used when Chrome sends no download events) as soon as a file lands in the dir, with Linux inotify.
+    Where inotify isn't available, wait only sleeps, like the polling did.
+    """
+
+    def __init__(self, download_dir):
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            if libc.inotify_add_watch(fd, os.fsencode(download_dir), CONSTANTS.INOTIFY_DOWNLOAD_EVENTS) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            self.fd = fd
+        except (OSError, AttributeError, TypeError) as e:
+            logger.info(f"Could not watch {download_dir} with inotify, polling it instead. Details: {e}")
+
+    def wait(self, timeout):
+        """Wait until a file is written or moved into the dir, or the timeout passes. Returns True if a file landed."""
+        if self.fd is None:
+            time.sleep(timeout)
+            return False
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+
+        # Drain the events, the caller looks at the dir itself
+        try:
+            while os.read(self.fd, CONSTANTS.INOTIFY_READ_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -2,12 +2,23 @@ import os
 import zipfile
 import platform
 import tempfile
+import utils.utils as utils
 import constants as CONSTANTS
 from dotenv import load_dotenv
 import proxy_profiles as PROXIES
 from proxy.extension import proxies
+from proxy.forwarding_proxy import get_forwarding_proxy
+from driver.performance_log import PerformanceLog
+from metrics.metrics import instrument_driver
+from aws.aws import AWS
+from driver.webdriver_profiler import WebDriverProfiler
+from driver.request_blocking import RequestBlocker
+from driver.download_tracker import DownloadTracker
+from driver.resource_manager import apply_launch_profile, ChromeResourceMonitor
 import undetected_chromedriver as uc
 from selenium_stealth import stealth
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 
 def setup_chrome_driver(aws, chrome_profiles_dir, downloads_dir):
@@ -33,6 +44,12 @@ def setup_chrome_driver(aws, chrome_profiles_dir, downloads_dir):
 
     load_dotenv()
 
+    launch_backend = os.getenv("CHROME_LAUNCH_BACKEND", CONSTANTS.CHROME_LAUNCH_BACKEND)
+    proxy_mode = os.getenv("PROXY_MODE", CONSTANTS.PROXY_MODE)
+    if launch_backend == CONSTANTS.CHROME_LAUNCH_BACKEND_HEADLESS_SHELL and proxy_mode != CONSTANTS.PROXY_MODE_FORWARDING:
+        print("DRIVER: chrome-headless-shell can't load the proxy extension. Set PROXY_MODE to forwarding to use it.")
+        return None
+
     try:
         os.makedirs(downloads_dir, exist_ok=True)
 
@@ -43,23 +60,123 @@ def setup_chrome_driver(aws, chrome_profiles_dir, downloads_dir):
 
         profile_dir = f"{chrome_profiles_dir}/{os.getenv('PHONE_NUMBER')}_chrome_profile"
         add_chrome_options(chrome_options, profile_dir, downloads_dir, user_agent, PROXIES.proxy_profiles[str(os.getenv('PHONE_NUMBER'))]["proxy_address"], operating_system)
-        config_proxy_result = configure_proxy(chrome_options)
+        forwarding_proxy = None
+        if proxy_mode == CONSTANTS.PROXY_MODE_FORWARDING:
+            forwarding_proxy = configure_forwarding_proxy(chrome_options)
+            config_proxy_result = bool(forwarding_proxy)
+        else:
+            config_proxy_result = configure_proxy(chrome_options)
         if not config_proxy_result:
             return None
     
         caps = DesiredCapabilities().CHROME
         caps["pageLoadStrategy"] = "none"
+        caps["goog:loggingPrefs"] = {"performance": "ALL"}
 
-        driver = uc.Chrome(version_main=int(uc.TARGET_VERSION.split(".")[0]), options=chrome_options, suppress_welcome=True, desired_capabilities=caps)
+        driver = instrument_driver(launch_chrome(launch_backend, chrome_options, caps))
+        driver.webdriver_profiler = setup_webdriver_profiler(driver)
 
         # Apply stealth settings
         apply_stealth_settings(driver, operating_system)
 
+        driver.forwarding_proxy = forwarding_proxy
+        driver.performance_log = PerformanceLog(driver)
+        driver.request_blocker = setup_request_blocking(driver)
+        driver.download_tracker = setup_download_tracking(driver, downloads_dir)
+        driver.resource_monitor = setup_resource_monitor(driver)
+
         return driver
     except Exception as e:
         print(f"DRIVER: Got an error trying to instantiate the Selenium driver. Details: {e}")
         return None
 
+def launch_chrome(launch_backend, chrome_options, caps):
+    """
+    Starts the browser with the given launch backend.
+    """
+    if launch_backend == CONSTANTS.CHROME_LAUNCH_BACKEND_HEADLESS_SHELL:
+        print("DRIVER: Launching chrome-headless-shell...")
+        chrome_options.binary_location = os.getenv("CHROME_HEADLESS_SHELL_PATH") or CONSTANTS.CHROME_HEADLESS_SHELL_PATH
+        for capability_name, capability_value in caps.items():
+            if capability_name != "browserName":
+                chrome_options.set_capability(capability_name, capability_value)
+
+        chromedriver_path = os.getenv("CHROMEDRIVER_PATH")
+        service = Service(executable_path=chromedriver_path) if chromedriver_path else Service()
+        return webdriver.Chrome(service=service, options=chrome_options)
+
+    return uc.Chrome(version_main=int(uc.TARGET_VERSION.split(".")[0]), options=chrome_options, suppress_welcome=True, desired_capabilities=caps)
+
+def setup_request_blocking(driver):
+    """
+    Blocks non-essential requests so they don't go through the proxy. Returns None when blocking is disabled.
+    """
+    load_dotenv()
+
+    if os.getenv("REQUEST_BLOCKING_ENABLED", "true").lower() != "true":
+        print("DRIVER: Request blocking is disabled.")
+        return None
+
+    request_blocker = RequestBlocker(driver, driver.performance_log)
+    if not request_blocker.enable():
+        print("DRIVER: Could not enable request blocking. Loading every resource instead.")
+        return None
+
+    print("DRIVER: Request blocking enabled.")
+    return request_blocker
+
+def setup_download_tracking(driver, downloads_dir):
+    """
+    Tracks downloads through Chrome's download events. Returns None if they can't be enabled, in which case the downloads dir is polled.
+    """
+    download_tracker = DownloadTracker(driver, driver.performance_log, downloads_dir)
+    if not download_tracker.enable():
+        print("DRIVER: Could not enable download tracking. Falling back to polling the downloads dir.")
+        return None
+
+    print("DRIVER: Download tracking enabled.")
+    return download_tracker
+
+def set_downloads_dir(driver, downloads_dir):
+    """
+    Sends the downloads of a browser kept open between jobs to the downloads dir of the new job.
+    """
+    try:
+        os.makedirs(downloads_dir, exist_ok=True)
+        if driver.download_tracker:
+            return driver.download_tracker.set_download_dir(downloads_dir)
+
+        driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": downloads_dir})
+        return True
+    except Exception as e:
+        print(f"DRIVER: Could not change the downloads dir to {downloads_dir}. Details: {e}")
+        return False
+
+def setup_resource_monitor(driver):
+    """
+    Starts sampling the memory and CPU of the browser. Returns None if the browser process can't be found.
+    """
+    # undetected_chromedriver starts the browser itself, otherwise it's a child of chromedriver
+    browser_pid = getattr(driver, "browser_pid", None) or getattr(getattr(getattr(driver, "service", None), "process", None), "pid", None)
+    if not browser_pid:
+        print("DRIVER: Could not find the browser process. Chrome's resources won't be monitored.")
+        return None
+
+    resource_monitor = ChromeResourceMonitor(browser_pid)
+    resource_monitor.start()
+    return resource_monitor
+
+def setup_webdriver_profiler(driver):
+    """
+    Starts recording every WebDriver command with its call site if WEBDRIVER_PROFILING is on. Returns None otherwise.
+    """
+    if os.getenv("WEBDRIVER_PROFILING", str(CONSTANTS.WEBDRIVER_PROFILING)).lower() != "true":
+        return None
+
+    output_dir = os.getenv("WEBDRIVER_PROFILE_DIR_PATH") or CONSTANTS.WEBDRIVER_PROFILE_DIR_PATH
+    print(f"DRIVER: Profiling the WebDriver commands. The profile will be saved in {output_dir} and uploaded to S3.")
+    return WebDriverProfiler(driver, output_dir, AWS())
+
 def add_chrome_options(chrome_options, profile_dir, downloads_dir, user_agent, proxy_host, operating_system):
     """
     Adds necessary Chrome options for the browser.
@@ -84,9 +201,7 @@ def add_chrome_options(chrome_options, profile_dir, downloads_dir, user_agent, p
     chrome_options.add_argument('--password-store=basic')
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_argument('--disable-features=PrivacySandboxSettings4')
-    chrome_options.add_argument('--enable-logging')
-    chrome_options.add_argument('--v=1')
-    chrome_options.add_argument('--log-level=0')
+    apply_launch_profile(chrome_options)
     chrome_options.add_argument("--user-agent=" + user_agent)
 
     if proxy_host and proxy_host != "":
@@ -115,7 +230,7 @@ def configure_proxy(chrome_options):
         proxy_extension = proxies(**proxy_details)
 
         # Create a temporary directory to extract the extension
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = tempfile.mkdtemp(dir=utils.get_tmpfs_dir(CONSTANTS.EXTENSION_TMPFS_RESERVE))
         with zipfile.ZipFile(proxy_extension, 'r') as zip_ref:
             zip_ref.extractall(temp_dir)
 
@@ -127,6 +242,29 @@ def configure_proxy(chrome_options):
         print("DRIVER: Incomplete proxy configuration. Check environment variables.")
         return False
 
+def configure_forwarding_proxy(chrome_options):
+    """
+    Points Chrome to the local forwarding proxy of the account instead of loading the proxy extension.
+    """
+    load_dotenv()
+
+    phone_number = str(os.getenv('PHONE_NUMBER'))
+    proxy_details = get_proxy_details(phone_number)
+    if None in proxy_details.values() or "" in proxy_details.values():
+        print("DRIVER: Incomplete proxy configuration. Check environment variables.")
+        return None
+
+    try:
+        forwarding_proxy = get_forwarding_proxy(phone_number, proxy_details['endpoint'], proxy_details['port'], proxy_details['username'], proxy_details['password'])
+    except Exception as e:
+        print(f"DRIVER: Could not start the forwarding proxy. Details: {e}")
+        return None
+
+    chrome_options.add_argument(f'--proxy-server=http://{forwarding_proxy.get_address()}')
+    print("DRIVER: Forwarding proxy setup complete.")
+
+    return forwarding_proxy
+
 def apply_stealth_settings(driver, operating_system):
     """
     Applies stealth settings to make the browser behave more like a regular user's.
@@ -0,0 +1,48 @@
+import json
+import time
+import constants as CONSTANTS
+from structured_logging.structured_logging import get_logger
+
+logger = get_logger("PERFORMANCE_LOG")
+
+class PerformanceLog:
+    """Drains Chrome's performance log (CDP Network/Page events) and hands each event to the listeners interested in it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.listeners = []
+        self.last_poll = 0
+
+    def add_listener(self, listener, methods):
+        """Call listener(method, params) for every event whose method is in methods."""
+        self.listeners.append((listener, set(methods)))
+
+    def poll_if_due(self):
+        """Poll if the log wasn't read for PERFORMANCE_LOG_POLL_INTERVAL seconds, so that Chrome's buffer stays small between the song waits."""
+        if time.time() - self.last_poll < CONSTANTS.PERFORMANCE_LOG_POLL_INTERVAL:
+            return 0
+        return self.poll()
+
+    def poll(self):
+        """Read the events logged since the last poll and dispatch them. Returns the number of events read."""
+        self.last_poll = time.time()
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception as e:
+            logger.warning(f"Could not read the performance log. Details: {e}")
+            return 0
+
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+
+            for listener, methods in self.listeners:
+                if message.get("method") in methods:
+                    try:
+                        listener(message["method"], message.get("params", {}))
+                    except Exception as e:
+                        logger.warning(f"A listener failed on {message['method']}. Details: {e}", extra={"sample_key": f"listener_failed_{message['method']}"})
+
+        return len(entries)
@@ -0,0 +1,96 @@
+import fnmatch
+from urllib.parse import urlparse
+import constants as CONSTANTS
+from metrics.metrics import get_metrics
+
+class RequestBlocker:
+    """Blocks non-essential requests (images, fonts, media, analytics) through CDP and reports the bandwidth it saved."""
+
+    def __init__(self, driver, performance_log):
+        self.driver = driver
+        self.request_types = {}
+        self.blocked_requests = {}
+        self.loaded_requests = {}
+        self.loaded_bytes = {}
+        self.blocked_patterns = []
+
+        performance_log.add_listener(self.on_network_event, [
+            "Network.requestWillBeSent",
+            "Network.loadingFinished",
+            "Network.loadingFailed"
+        ])
+
+    def enable(self):
+        """Start blocking requests on the current page."""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            return self.apply_for_url(None)
+        except Exception as e:
+            print(f"REQUEST_BLOCKING: Could not enable request blocking. Details: {e}")
+            return False
+
+    def apply_for_url(self, url):
+        """Block every pattern that isn't allowlisted for the page we're about to load."""
+        allowlist = []
+        for page_url, page_allowlist in CONSTANTS.REQUEST_BLOCKING_PAGE_ALLOWLISTS.items():
+            if url and url.startswith(page_url):
+                allowlist += page_allowlist
+
+        blocked_patterns = [pattern for pattern in CONSTANTS.REQUEST_BLOCKING_PATTERNS if pattern not in allowlist]
+        if blocked_patterns == self.blocked_patterns:
+            return True
+
+        try:
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_patterns})
+            self.blocked_patterns = blocked_patterns
+            return True
+        except Exception as e:
+            print(f"REQUEST_BLOCKING: Could not update the blocked URLs. Details: {e}")
+            return False
+
+    def on_network_event(self, method, params):
+        request_id = params.get("requestId")
+
+        if method == "Network.requestWillBeSent":
+            self.request_types[request_id] = params.get("type") or self.guess_request_type(params.get("request", {}).get("url", ""))
+        elif method == "Network.loadingFinished":
+            request_type = self.request_types.pop(request_id, "Other")
+            self.loaded_requests[request_type] = self.loaded_requests.get(request_type, 0) + 1
+            self.loaded_bytes[request_type] = self.loaded_bytes.get(request_type, 0) + int(params.get("encodedDataLength", 0))
+        elif method == "Network.loadingFailed":
+            request_type = self.request_types.pop(request_id, params.get("type", "Other"))
+            if params.get("blockedReason"):
+                self.blocked_requests[request_type] = self.blocked_requests.get(request_type, 0) + 1
+
+    def guess_request_type(self, url):
+        # Match the path so that query strings and fragments don't hide the extension
+        path = urlparse(url).path.lower()
+        for request_type, patterns in CONSTANTS.REQUEST_BLOCKING_TYPE_PATTERNS.items():
+            if any(fnmatch.fnmatch(path, pattern) for pattern in patterns):
+                return request_type
+        return "Other"
+
+    def estimate_saved_bytes(self):
+        """Estimate the bytes saved from the number of blocked requests and the average size of each request type."""
+        saved_bytes = 0
+        for request_type, blocked_count in self.blocked_requests.items():
+            if self.loaded_requests.get(request_type):
+                average_size = self.loaded_bytes[request_type] / self.loaded_requests[request_type]
+            else:
+                average_size = CONSTANTS.REQUEST_BLOCKING_ESTIMATED_SIZES.get(request_type, CONSTANTS.REQUEST_BLOCKING_ESTIMATED_SIZES["Other"])
+            saved_bytes += blocked_count * average_size
+        return int(saved_bytes)
+
+    def report(self):
+        """Print and return the bandwidth stats of this run."""
+        stats = {
+            "blocked_requests": sum(self.blocked_requests.values()),
+            "blocked_requests_by_type": dict(self.blocked_requests),
+            "transferred_bytes": sum(self.loaded_bytes.values()),
+            "estimated_saved_bytes": self.estimate_saved_bytes()
+        }
+        get_metrics().increment("ChromeTransferredBytes", stats["transferred_bytes"], unit="Bytes")
+        get_metrics().increment("BlockedRequests", stats["blocked_requests"])
+        print(f"REQUEST_BLOCKING: Blocked {stats['blocked_requests']} requests {stats['blocked_requests_by_type']}, "
+              f"transferred {stats['transferred_bytes'] / 1024 / 1024:.2f} MB and saved about {stats['estimated_saved_bytes'] / 1024 / 1024:.2f} MB.")
+        return stats
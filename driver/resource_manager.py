@@ -0,0 +1,131 @@
+import os
+import time
+import psutil
+import threading
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from metrics.metrics import get_metrics
+
+def apply_launch_profile(chrome_options):
+    """
+    Adds the flags of the launch profile picked with CHROME_LAUNCH_PROFILE.
+    """
+    load_dotenv()
+
+    profile_name = os.getenv("CHROME_LAUNCH_PROFILE", CONSTANTS.CHROME_LAUNCH_PROFILE)
+    if profile_name not in CONSTANTS.CHROME_LAUNCH_PROFILES:
+        print(f"RESOURCE_MANAGER: Unknown launch profile {profile_name}. Using {CONSTANTS.CHROME_LAUNCH_PROFILE} instead.")
+        profile_name = CONSTANTS.CHROME_LAUNCH_PROFILE
+
+    for argument in CONSTANTS.CHROME_LAUNCH_PROFILES[profile_name]:
+        chrome_options.add_argument(argument)
+    merge_disabled_features(chrome_options)
+
+    print(f"RESOURCE_MANAGER: Applied the {profile_name} launch profile.")
+    return profile_name
+
+def merge_disabled_features(chrome_options):
+    """Chrome only reads the last --disable-features switch, so the features disabled by several flags are combined into one."""
+    disable_features_arguments = [argument for argument in chrome_options.arguments if argument.startswith(CONSTANTS.CHROME_DISABLE_FEATURES_SWITCH)]
+    if len(disable_features_arguments) < 2:
+        return
+
+    disabled_features = []
+    for argument in disable_features_arguments:
+        chrome_options.arguments.remove(argument)
+        for feature in argument[len(CONSTANTS.CHROME_DISABLE_FEATURES_SWITCH):].split(","):
+            if feature and feature not in disabled_features:
+                disabled_features.append(feature)
+    chrome_options.add_argument(CONSTANTS.CHROME_DISABLE_FEATURES_SWITCH + ",".join(disabled_features))
+
+class ChromeResourceMonitor:
+    """Samples the RSS, CPU and process count of Chrome's process tree in the background and tells when the browser should be recycled."""
+
+    def __init__(self, browser_pid):
+        self.browser_pid = browser_pid
+        # cpu_percent() measures since the previous call on the same Process object, so the objects are kept between samples
+        self.processes = {}
+        self.samples = 0
+        self.last_sample = None
+        self.peak_rss = 0
+        self.peak_processes = 0
+        self.over_limit_samples = 0
+        self.recycles = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # The first reading of every process is 0.0 and only primes it
+        self.sample()
+        self.thread = threading.Thread(target=self.run, name="chrome_resource_monitor", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=CONSTANTS.CHROME_MONITOR_INTERVAL)
+
+    def run(self):
+        while not self.stop_event.wait(CONSTANTS.CHROME_MONITOR_INTERVAL):
+            sample = self.sample()
+            if not sample:
+                continue
+
+            self.samples += 1
+            self.last_sample = sample
+            self.peak_rss = max(self.peak_rss, sample["rss"])
+            self.peak_processes = max(self.peak_processes, sample["processes"])
+            get_metrics().observe("ChromeRss", sample["rss"] / 1024 / 1024, unit="Megabytes")
+            get_metrics().observe("ChromeCpu", sample["cpu_percent"], unit="Percent")
+
+            if sample["rss"] > CONSTANTS.CHROME_MAX_RSS_MB * 1024 * 1024:
+                self.over_limit_samples += 1
+            else:
+                self.over_limit_samples = 0
+
+    def sample(self):
+        """Total RSS, CPU and process count of the browser and its children."""
+        try:
+            browser = self.get_process(psutil.Process(self.browser_pid))
+            processes = [browser] + [self.get_process(child) for child in browser.children(recursive=True)]
+        except psutil.Error:
+            return None
+
+        # Forget the processes that exited since the last sample
+        self.processes = {process.pid: process for process in processes}
+
+        rss, cpu_percent = 0, 0.0
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+                cpu_percent += process.cpu_percent(interval=None)
+            except psutil.Error:
+                continue
+
+        return {"rss": rss, "cpu_percent": cpu_percent, "processes": len(processes), "sampled_at": time.time()}
+
+    def get_process(self, process):
+        """The Process object of an earlier sample for the same process, which remembers the CPU times of that sample."""
+        cached_process = self.processes.get(process.pid)
+        # Process objects compare their creation time too, so a reused pid gets a new object
+        return cached_process if cached_process == process else process
+
+    def needs_recycle(self):
+        """True once the browser stayed above the memory limit for a few samples in a row."""
+        return self.over_limit_samples >= CONSTANTS.CHROME_OVER_LIMIT_SAMPLES and self.recycles < CONSTANTS.CHROME_MAX_RECYCLES
+
+    def recycled(self):
+        self.recycles += 1
+        self.over_limit_samples = 0
+
+    def report(self):
+        """Print and return the resource usage of this run."""
+        stats = {
+            "samples": self.samples,
+            "peak_rss": self.peak_rss,
+            "peak_processes": self.peak_processes,
+            "recycles": self.recycles
+        }
+        print(f"RESOURCE_MANAGER: Chrome peaked at {self.peak_rss / 1024 / 1024:.0f} MB over {self.peak_processes} processes and was recycled {self.recycles} time(s).")
+        return stats
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import threading
+import constants as CONSTANTS
+from metrics.metrics import get_metrics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILER_FILES = {os.path.abspath(__file__), os.path.join(REPO_DIR, "metrics", "metrics.py")}
+
+class WebDriverProfiler:
+    """
+    Records every WebDriver command (one HTTP round trip to chromedriver) with its duration, the scraper code that sent it and the locator it used.
+    The summary ranks call sites by cumulative time and by count, keyed without line numbers so that the profiles of two releases can be diffed.
+    Commands are fed by the driver.execute wrapper of metrics.instrument_driver, so they're only timed once.
+    """
+
+    def __init__(self, driver, output_dir, aws=None):
+        self.driver = driver
+        self.output_dir = output_dir
+        self.aws = aws
+        self.lock = threading.Lock()
+        self.call_sites = {}
+        self.folded_stacks = {}
+        self.commands = 0
+        self.total_seconds = 0.0
+        self.started_at = time.time()
+
+    def record(self, command, params, elapsed, frame):
+        """Attribute a command to the scraper code of the given frame, the caller of driver.execute."""
+        stack = self.get_repo_stack(frame)
+        call_site = stack[-1] if stack else {"key": "<outside the scraper>", "line": None}
+        locator = self.get_locator(command, params)
+
+        with self.lock:
+            self.commands += 1
+            self.total_seconds += elapsed
+
+            stats = self.call_sites.setdefault(call_site["key"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "lines": set(), "commands": {}, "locators": {}})
+            stats["count"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if call_site["line"]:
+                stats["lines"].add(call_site["line"])
+            stats["commands"][command] = stats["commands"].get(command, 0) + 1
+            if locator:
+                stats["locators"][locator] = stats["locators"].get(locator, 0) + 1
+
+            folded_stack = ";".join([frame_info["name"] for frame_info in stack] + [command])
+            self.folded_stacks[folded_stack] = self.folded_stacks.get(folded_stack, 0) + elapsed
+
+    def get_repo_stack(self, frame):
+        """The frames of the scraper's own code that led to a command, outermost first."""
+        stack = []
+        while frame:
+            file_path = os.path.abspath(frame.f_code.co_filename)
+            if file_path.startswith(REPO_DIR) and file_path not in PROFILER_FILES and "site-packages" not in file_path:
+                code = frame.f_code
+                name = getattr(code, "co_qualname", code.co_name)
+                relative_path = os.path.relpath(file_path, REPO_DIR)
+                stack.append({"key": f"{relative_path}:{name}", "name": name, "line": frame.f_lineno})
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def get_locator(self, command, params):
+        if not params:
+            return None
+        if "using" in params and "value" in params:
+            return f"{params['using']}={params['value']}"[:CONSTANTS.WEBDRIVER_PROFILE_LOCATOR_LENGTH]
+        if "script" in params:
+            # css_text strategies pass their selector and text as script arguments
+            script_args = [arg for arg in params.get("args", []) if isinstance(arg, str)]
+            script = " ".join(params["script"].split())
+            return " | ".join([script] + script_args)[:CONSTANTS.WEBDRIVER_PROFILE_LOCATOR_LENGTH]
+        return None
+
+    def summarize(self):
+        with self.lock:
+            call_sites = {
+                key: {
+                    "count": stats["count"],
+                    "total_seconds": round(stats["total_seconds"], 4),
+                    "mean_seconds": round(stats["total_seconds"] / stats["count"], 4),
+                    "max_seconds": round(stats["max_seconds"], 4),
+                    "lines": sorted(stats["lines"]),
+                    "commands": dict(sorted(stats["commands"].items(), key=lambda item: -item[1])),
+                    "locators": dict(sorted(stats["locators"].items(), key=lambda item: -item[1])[:CONSTANTS.WEBDRIVER_PROFILE_TOP_LOCATORS])
+                }
+                for key, stats in self.call_sites.items()
+            }
+            commands, total_seconds = self.commands, self.total_seconds
+
+        return {
+            "generation_id": os.getenv("GENERATION_ID"),
+            "started_at": int(self.started_at),
+            "wall_seconds": round(time.time() - self.started_at, 2),
+            "commands": commands,
+            "webdriver_seconds": round(total_seconds, 2),
+            "top_by_time": sorted(call_sites, key=lambda key: -call_sites[key]["total_seconds"])[:CONSTANTS.WEBDRIVER_PROFILE_TOP_CALL_SITES],
+            "top_by_count": sorted(call_sites, key=lambda key: -call_sites[key]["count"])[:CONSTANTS.WEBDRIVER_PROFILE_TOP_CALL_SITES],
+            "call_sites": dict(sorted(call_sites.items()))
+        }
+
+    def report(self):
+        """
+        Print the top call sites and a one line JSON summary to the log stream, write the JSON summary and the folded stacks
+        (for flamegraph.pl or speedscope) and upload them to S3. Returns the summary.
+        """
+        summary = self.summarize()
+        print(f"WEBDRIVER_PROFILER: {summary['commands']} commands took {summary['webdriver_seconds']} seconds out of {summary['wall_seconds']}.")
+        for key in summary["top_by_time"][:CONSTANTS.WEBDRIVER_PROFILE_PRINTED_CALL_SITES]:
+            call_site = summary["call_sites"][key]
+            print(f"WEBDRIVER_PROFILER: {call_site['total_seconds']:.2f}s over {call_site['count']} commands in {key}.")
+        print(f"WEBDRIVER_PROFILER: Summary {json.dumps(self.get_log_summary(summary), separators=(',', ':'))}")
+
+        file_name = f"{os.getenv('GENERATION_ID') or 'run'}_{int(self.started_at)}"
+        file_paths = [os.path.join(self.output_dir, file_name + ".json"), os.path.join(self.output_dir, file_name + ".folded")]
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(file_paths[0], 'w') as summary_file:
+                json.dump(summary, summary_file, indent=4)
+            with self.lock:
+                folded_lines = [f"{stack} {int(seconds * 1000000)}" for stack, seconds in sorted(self.folded_stacks.items())]
+            with open(file_paths[1], 'w') as folded_file:
+                folded_file.write("\n".join(folded_lines) + "\n")
+            print(f"WEBDRIVER_PROFILER: Saved the profile in {self.output_dir} as {file_name}.")
+        except Exception as e:
+            print(f"WEBDRIVER_PROFILER: Could not save the profile. Details: {e}")
+            return summary
+
+        if self.aws:
+            s3_prefix = f"{CONSTANTS.WEBDRIVER_PROFILE_S3_PREFIX}/{get_metrics().get_version()}"
+            for file_path in file_paths:
+                self.aws.save_file_in_bucket(file_path, f"{s3_prefix}/{os.path.basename(file_path)}")
+
+        return summary
+
+    def get_log_summary(self, summary):
+        """The top call sites by time, small enough for a single log event."""
+        return {
+            "generation_id": summary["generation_id"],
+            "commands": summary["commands"],
+            "webdriver_seconds": summary["webdriver_seconds"],
+            "wall_seconds": summary["wall_seconds"],
+            "top_by_time": [
+                {"call_site": key, "count": summary["call_sites"][key]["count"], "total_seconds": summary["call_sites"][key]["total_seconds"]}
+                for key in summary["top_by_time"]
+            ]
+        }
+
+def compare_profiles(old_summary, new_summary):
+    """Changes in time and count per call site between two summaries, biggest time change first."""
+    changes = []
+    for key in set(old_summary["call_sites"]) | set(new_summary["call_sites"]):
+        old_call_site = old_summary["call_sites"].get(key, {"count": 0, "total_seconds": 0.0})
+        new_call_site = new_summary["call_sites"].get(key, {"count": 0, "total_seconds": 0.0})
+        changes.append({
+            "call_site": key,
+            "seconds_change": round(new_call_site["total_seconds"] - old_call_site["total_seconds"], 4),
+            "count_change": new_call_site["count"] - old_call_site["count"]
+        })
+    return sorted(changes, key=lambda change: -abs(change["seconds_change"]))
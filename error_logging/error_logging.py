@@ -1,8 +1,10 @@
 import os
+import re
 import sendgrid
 import constants as CONSTANTS
 from dotenv import load_dotenv
 from db.supabase import Supabase
+from metrics.metrics import get_metrics
 from sendgrid.helpers.mail import Mail, Email, To, Content
 
 class ErrorLogging():
@@ -11,14 +13,21 @@ class ErrorLogging():
         self.supabase = Supabase()
 
     def save_error_and_send_email(self, message):
+        self.record_error_metric(message)
         self.supabase.update_scraper_latest_error(message)
         self.supabase.update_generation_error_message(message)
         self.send_email(message)
 
     def save_generation_error_and_send_email(self, message):
+        self.record_error_metric(message)
         self.supabase.update_generation_error_message(message)
         self.send_email(message)
 
+    def record_error_metric(self, message):
+        """Count the error by the module that reported it, e.g. SCRAPE_SONG for "SCRAPER - SCRAPE_SONG: ..."."""
+        source = re.match(r"^SCRAPER - ([A-Z_]+):", str(message))
+        get_metrics().record_error(source.group(1) if source else "UNKNOWN")
+
     def send_email(self, message):
         if not message:
             print("EMAIL_LOGGING: Cannot email a null message.")
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from db.supabase import Supabase
+
+class SqliteGenerationIndex:
+    """Index of generation IDs that are in flight, completed or failed, backed by a SQLite file (long-lived containers and tests)."""
+
+    def __init__(self, index_path=None):
+        load_dotenv()
+        self.index_path = index_path or os.getenv("GENERATION_INDEX_PATH") or CONSTANTS.GENERATION_INDEX_PATH
+        self.lock = threading.Lock()
+
+        # Completed and failed are terminal states, so they can be answered from memory
+        self.completed_generations = {}
+        self.failed_generations = set()
+        self.in_flight_generations = set()
+
+        if self.index_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+
+        self.connection = sqlite3.connect(self.index_path, timeout=CONSTANTS.GENERATION_INDEX_LOCK_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS generation_index (
+                generation_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                result TEXT,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        self.load_terminal_states()
+
+    def load_terminal_states(self):
+        """Load the completed and failed generations in memory."""
+        rows = self.connection.execute(
+            "SELECT generation_id, state, result FROM generation_index WHERE state IN (?, ?)",
+            (CONSTANTS.GENERATION_STATE_COMPLETED, CONSTANTS.GENERATION_STATE_FAILED)
+        ).fetchall()
+
+        for generation_id, state, result in rows:
+            if state == CONSTANTS.GENERATION_STATE_COMPLETED:
+                self.completed_generations[generation_id] = json.loads(result) if result else None
+            else:
+                self.failed_generations.add(generation_id)
+
+    def lookup(self, generation_id):
+        """Return the (state, result) pair stored for a generation, or (None, None) if it's unknown."""
+        if generation_id in self.completed_generations:
+            return CONSTANTS.GENERATION_STATE_COMPLETED, self.completed_generations[generation_id]
+
+        if generation_id in self.failed_generations:
+            return CONSTANTS.GENERATION_STATE_FAILED, None
+
+        row = self.connection.execute(
+            "SELECT state, result, updated_at FROM generation_index WHERE generation_id = ?",
+            (generation_id,)
+        ).fetchone()
+        if not row:
+            return None, None
+
+        state, result, updated_at = row
+        if state == CONSTANTS.GENERATION_STATE_IN_FLIGHT and self.is_stale(updated_at):
+            return None, None
+
+        return state, json.loads(result) if result else None
+
+    def claim(self, generation_id):
+        """Mark a generation as in flight. Returns (claimed, state, result) where state and result describe the existing entry when the claim fails."""
+        if not generation_id:
+            print("GENERATION_INDEX: Cannot claim a null generation ID.")
+            return False, None, None
+
+        state, result = self.lookup(generation_id)
+        if state in (CONSTANTS.GENERATION_STATE_COMPLETED, CONSTANTS.GENERATION_STATE_FAILED):
+            return False, state, result
+
+        with self.lock:
+            try:
+                self.connection.execute("BEGIN IMMEDIATE")
+                row = self.connection.execute(
+                    "SELECT state, result, updated_at FROM generation_index WHERE generation_id = ?",
+                    (generation_id,)
+                ).fetchone()
+
+                if row and not (row[0] == CONSTANTS.GENERATION_STATE_IN_FLIGHT and self.is_stale(row[2])):
+                    self.connection.execute("ROLLBACK")
+                    return False, row[0], json.loads(row[1]) if row[1] else None
+
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO generation_index (generation_id, state, result, updated_at) VALUES (?, ?, NULL, ?)",
+                    (generation_id, CONSTANTS.GENERATION_STATE_IN_FLIGHT, int(time.time()))
+                )
+                self.connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                print(f"GENERATION_INDEX: Could not claim the generation {generation_id}. Details: {e}")
+                if self.connection.in_transaction:
+                    self.connection.execute("ROLLBACK")
+                return False, None, None
+
+            self.in_flight_generations.add(generation_id)
+            return True, CONSTANTS.GENERATION_STATE_IN_FLIGHT, None
+
+    def mark_completed(self, generation_id, result=None):
+        """Mark a generation as completed and store its result so duplicates can be answered directly."""
+        if not self.set_state(generation_id, CONSTANTS.GENERATION_STATE_COMPLETED, result):
+            return False
+
+        self.completed_generations[generation_id] = result
+        self.in_flight_generations.discard(generation_id)
+        return True
+
+    def mark_failed(self, generation_id, reason=None):
+        """Mark a generation as failed for good, e.g. when Supabase rejects it. Transient failures release it instead."""
+        if not self.set_state(generation_id, CONSTANTS.GENERATION_STATE_FAILED, {"reason": reason} if reason else None):
+            return False
+
+        self.failed_generations.add(generation_id)
+        self.in_flight_generations.discard(generation_id)
+        return True
+
+    def release(self, generation_id):
+        """Drop the in flight entry of a generation that failed for a transient reason, so that a retry can claim it again."""
+        if not generation_id:
+            print("GENERATION_INDEX: Cannot release a null generation ID.")
+            return False
+
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "DELETE FROM generation_index WHERE generation_id = ? AND state = ?",
+                    (generation_id, CONSTANTS.GENERATION_STATE_IN_FLIGHT)
+                )
+            except sqlite3.Error as e:
+                print(f"GENERATION_INDEX: Could not release the generation {generation_id}. Details: {e}")
+                return False
+
+            self.in_flight_generations.discard(generation_id)
+            return True
+
+    def set_state(self, generation_id, state, result):
+        """Persist the state of a generation."""
+        if not generation_id:
+            print("GENERATION_INDEX: Cannot update a null generation ID.")
+            return False
+
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO generation_index (generation_id, state, result, updated_at) VALUES (?, ?, ?, ?)",
+                    (generation_id, state, json.dumps(result) if result is not None else None, int(time.time()))
+                )
+                return True
+            except sqlite3.Error as e:
+                print(f"GENERATION_INDEX: Could not mark the generation {generation_id} as {state}. Details: {e}")
+                return False
+
+    def is_stale(self, updated_at):
+        """Check if an in flight entry outlived the longest possible run (e.g. the task was killed)."""
+        return int(time.time()) - int(updated_at) > CONSTANTS.MAX_RUNTIME
+
+    def close(self):
+        """Close the underlying SQLite connection."""
+        self.connection.close()
+
+class SupabaseGenerationIndex:
+    """
+    Index of generation IDs shared by every task, backed by Postgres functions (see db/sql/generation_index.sql) that claim through the unique key.
+    An in flight claim expires after the runtime of the run that took it, in case its task was killed.
+    """
+
+    def __init__(self):
+        load_dotenv()
+        self.supabase = Supabase()
+        self.in_flight_generations = set()
+
+    def call(self, function_name, params):
+        """Call an index function through PostgREST."""
+        client = self.supabase.get_supabase_client(self.supabase.generate_scraper_jwt())
+        return client.rpc(function_name, params).execute().data
+
+    def claim(self, generation_id):
+        """Mark a generation as in flight. Returns (claimed, state, result) where state and result describe the existing entry when the claim fails."""
+        if not generation_id:
+            print("GENERATION_INDEX: Cannot claim a null generation ID.")
+            return False, None, None
+
+        try:
+            rows = self.call("claim_generation_index", {
+                "p_generation_id": generation_id,
+                "p_lease_seconds": int(os.getenv('MAX_RUNTIME', CONSTANTS.MAX_RUNTIME))
+            })
+        except Exception as e:
+            print(f"GENERATION_INDEX: Could not claim the generation {generation_id}. Details: {e}")
+            return False, None, None
+
+        if not rows:
+            print(f"GENERATION_INDEX: The claim of the generation {generation_id} returned nothing.")
+            return False, None, None
+
+        row = rows[0]
+        if row["claimed"]:
+            self.in_flight_generations.add(generation_id)
+        return bool(row["claimed"]), row["state"], row["result"]
+
+    def mark_completed(self, generation_id, result=None):
+        """Mark a generation as completed and store its result so duplicates can be answered directly."""
+        return self.set_state(generation_id, CONSTANTS.GENERATION_STATE_COMPLETED, result)
+
+    def mark_failed(self, generation_id, reason=None):
+        """Mark a generation as failed for good, e.g. when Supabase rejects it. Transient failures release it instead."""
+        return self.set_state(generation_id, CONSTANTS.GENERATION_STATE_FAILED, {"reason": reason} if reason else None)
+
+    def release(self, generation_id):
+        """Drop the in flight entry of a generation that failed for a transient reason, so that a retry can claim it again."""
+        if not generation_id:
+            print("GENERATION_INDEX: Cannot release a null generation ID.")
+            return False
+
+        try:
+            client = self.supabase.get_supabase_client(self.supabase.generate_scraper_jwt())
+            client.table(CONSTANTS.SUPABASE_GENERATION_INDEX_TABLE).delete() \
+                .eq("generation_id", generation_id) \
+                .eq("state", CONSTANTS.GENERATION_STATE_IN_FLIGHT).execute()
+        except Exception as e:
+            print(f"GENERATION_INDEX: Could not release the generation {generation_id}. Details: {e}")
+            return False
+
+        self.in_flight_generations.discard(generation_id)
+        return True
+
+    def set_state(self, generation_id, state, result):
+        """Persist the state of a generation."""
+        if not generation_id:
+            print("GENERATION_INDEX: Cannot update a null generation ID.")
+            return False
+
+        try:
+            self.call("set_generation_index_state", {"p_generation_id": generation_id, "p_state": state, "p_result": result})
+        except Exception as e:
+            print(f"GENERATION_INDEX: Could not mark the generation {generation_id} as {state}. Details: {e}")
+            return False
+
+        self.in_flight_generations.discard(generation_id)
+        return True
+
+    def close(self):
+        """Nothing to close, every call opens its own client."""
+        return None
+
+def get_generation_index():
+    """Return the generation index selected through GENERATION_INDEX_BACKEND."""
+    load_dotenv()
+    backend = os.getenv("GENERATION_INDEX_BACKEND", CONSTANTS.GENERATION_INDEX_BACKEND_SUPABASE)
+
+    if backend == CONSTANTS.GENERATION_INDEX_BACKEND_SQLITE:
+        return SqliteGenerationIndex()
+
+    return SupabaseGenerationIndex()
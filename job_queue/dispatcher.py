@@ -0,0 +1,112 @@
+import os
+import time
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from db.supabase import Supabase
+
+class GroupingDispatcher:
+    """
+    Claims jobs for a worker so that consecutive generations share the same creation mode, saving the mode toggles on the Create page.
+    Jobs are only grouped when the worker keeps its browser open between them, since a fresh browser starts from the default mode anyway.
+    The oldest pending job is only passed over while it has waited less than the fairness window.
+    """
+
+    def __init__(self, job_queue, browser_reused, fairness_window=None):
+        load_dotenv()
+        self.job_queue = job_queue
+        self.browser_reused = browser_reused
+        self.supabase = Supabase()
+        self.fairness_window = float(os.getenv("DISPATCHER_FAIRNESS_WINDOW", CONSTANTS.DISPATCHER_FAIRNESS_WINDOW) if fairness_window is None else fairness_window)
+        self.current_mode = None
+        self.creation_modes = {}
+        self.claims = 0
+        self.reordered_claims = 0
+        self.toggles_saved = 0
+        self.extra_wait = 0.0
+
+    def claim(self, worker_id, phone_number=None):
+        """Lease the next job, preferring the current creation mode. Returns the job or None."""
+        reordering = self.pick_generation(phone_number)
+
+        job = self.job_queue.claim(worker_id, phone_number, reordering["generation_id"]) if reordering else None
+        if job:
+            # Only a job that was actually run out of order saves toggles
+            self.reordered_claims += 1
+            self.toggles_saved += reordering["toggles"]
+            self.extra_wait += reordering["oldest_wait"]
+            print(f"DISPATCHER: Running {job['generation_id']} before {reordering['oldest_generation_id']} to keep the same creation mode.")
+        else:
+            # Another worker took the job we picked, or grouping is off
+            job = self.job_queue.claim(worker_id, phone_number)
+        if not job:
+            return None
+
+        self.claims += 1
+        job_mode = self.get_creation_modes([job["generation_id"]]).get(job["generation_id"])
+        if job_mode:
+            self.current_mode = job_mode
+        return job
+
+    def pick_generation(self, phone_number):
+        """The generation to claim out of order with the toggles it saves, or None to claim the oldest one."""
+        if not self.browser_reused or self.fairness_window <= 0 or self.current_mode is None:
+            return None
+
+        pending_jobs = self.job_queue.list_pending(phone_number)
+        if len(pending_jobs) < 2:
+            return None
+
+        oldest_job = pending_jobs[0]
+        oldest_wait = time.time() - oldest_job["created_at"]
+        if oldest_wait >= self.fairness_window:
+            return None
+
+        creation_modes = self.get_creation_modes([job["generation_id"] for job in pending_jobs])
+        oldest_mode = creation_modes.get(oldest_job["generation_id"])
+        if oldest_mode is None or oldest_mode == self.current_mode:
+            return None
+
+        for job in pending_jobs[1:]:
+            if creation_modes.get(job["generation_id"]) == self.current_mode:
+                return {
+                    "generation_id": job["generation_id"],
+                    "oldest_generation_id": oldest_job["generation_id"],
+                    "oldest_wait": oldest_wait,
+                    "toggles": self.count_toggles(self.current_mode, oldest_mode)
+                }
+
+        return None
+
+    def get_creation_modes(self, generation_ids):
+        missing_ids = [generation_id for generation_id in generation_ids if generation_id not in self.creation_modes]
+        if missing_ids:
+            self.creation_modes.update(self.supabase.get_creation_modes_for_generations(missing_ids))
+        return {generation_id: self.creation_modes.get(generation_id) for generation_id in generation_ids}
+
+    def count_toggles(self, first_mode, second_mode):
+        return sum(1 for first, second in zip(first_mode, second_mode) if first != second)
+
+    def forget_mode(self):
+        """The browser was closed, so the next job starts from the default mode of a fresh Create page."""
+        self.current_mode = None
+
+    def report(self, toggles=0, toggle_seconds=0.0):
+        """Print and return what the reordering saved, priced at the mean duration of the toggles the worker actually clicked."""
+        mean_toggle_seconds = toggle_seconds / toggles if toggles else None
+        stats = {
+            "claims": self.claims,
+            "reordered_claims": self.reordered_claims,
+            "toggles_saved": self.toggles_saved,
+            "toggles_clicked": toggles,
+            "mean_toggle_seconds": round(mean_toggle_seconds, 2) if mean_toggle_seconds is not None else None,
+            "seconds_saved": round(self.toggles_saved * mean_toggle_seconds, 1) if mean_toggle_seconds is not None else None,
+            "passed_over_wait_seconds": round(self.extra_wait, 1)
+        }
+        print(f"DISPATCHER: Reordered {stats['reordered_claims']} of {stats['claims']} claims, saving {stats['toggles_saved']} mode toggles. "
+              f"The passed over jobs had waited {stats['passed_over_wait_seconds']} seconds.")
+        if mean_toggle_seconds is None:
+            print("DISPATCHER: No mode toggle was clicked, so the time saved could not be measured.")
+        else:
+            print(f"DISPATCHER: The {toggles} toggles clicked took {stats['mean_toggle_seconds']} seconds on average, "
+                  f"so the reordering saved about {stats['seconds_saved']} seconds.")
+        return stats
@@ -0,0 +1,328 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+import constants as CONSTANTS
+from datetime import datetime
+from dotenv import load_dotenv
+from db.supabase import Supabase
+
+TIMESTAMP_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}(?::?\d{2})?)?$")
+
+class SqliteJobQueue:
+    """Generation job queue with lease and heartbeat semantics, backed by a SQLite file (local runs and tests)."""
+
+    def __init__(self, queue_path=None, lease_seconds=CONSTANTS.JOB_LEASE_SECONDS):
+        load_dotenv()
+        self.queue_path = queue_path or os.getenv("JOB_QUEUE_SQLITE_PATH", CONSTANTS.JOB_QUEUE_SQLITE_PATH)
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+
+        if self.queue_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.queue_path)), exist_ok=True)
+
+        self.connection = sqlite3.connect(self.queue_path, timeout=CONSTANTS.JOB_QUEUE_LOCK_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} (
+                generation_id TEXT PRIMARY KEY,
+                phone_number TEXT,
+                max_runtime INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def enqueue(self, generation_id, phone_number=None, max_runtime=CONSTANTS.MAX_RUNTIME):
+        """Add a generation to the queue. Returns False if it's already queued."""
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                f"INSERT OR IGNORE INTO {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} "
+                "(generation_id, phone_number, max_runtime, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (generation_id, phone_number, int(max_runtime), CONSTANTS.JOB_STATUS_PENDING, now, now)
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, worker_id, phone_number=None, generation_id=None):
+        """Lease the oldest pending job (or a specific one) for this worker. Returns the job or None."""
+        now = time.time()
+        with self.lock:
+            try:
+                self.connection.execute("BEGIN IMMEDIATE")
+                self._requeue_expired(now)
+
+                query = f"SELECT * FROM {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} WHERE status = ? AND (phone_number IS NULL OR phone_number = ?)"
+                params = [CONSTANTS.JOB_STATUS_PENDING, phone_number]
+                if generation_id:
+                    query += " AND generation_id = ?"
+                    params.append(generation_id)
+                row = self.connection.execute(query + " ORDER BY created_at LIMIT 1", params).fetchone()
+
+                if not row:
+                    self.connection.execute("COMMIT")
+                    return None
+
+                self.connection.execute(
+                    f"UPDATE {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} SET status = ?, worker_id = ?, phone_number = COALESCE(phone_number, ?), "
+                    "lease_expires_at = ?, attempts = attempts + 1, updated_at = ? WHERE generation_id = ?",
+                    (CONSTANTS.JOB_STATUS_LEASED, worker_id, phone_number, now + self.lease_seconds, now, row["generation_id"])
+                )
+                self.connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                print(f"JOB_QUEUE: Could not claim a job for the worker {worker_id}. Details: {e}")
+                if self.connection.in_transaction:
+                    self.connection.execute("ROLLBACK")
+                return None
+
+        return {
+            "generation_id": row["generation_id"],
+            "phone_number": row["phone_number"] or phone_number,
+            "max_runtime": row["max_runtime"],
+            "attempts": row["attempts"] + 1
+        }
+
+    def list_pending(self, phone_number=None, limit=CONSTANTS.DISPATCHER_LOOKAHEAD):
+        """The oldest pending jobs this worker could claim, oldest first."""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT generation_id, created_at FROM {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} "
+                "WHERE status = ? AND (phone_number IS NULL OR phone_number = ?) ORDER BY created_at LIMIT ?",
+                (CONSTANTS.JOB_STATUS_PENDING, phone_number, limit)
+            ).fetchall()
+        return [{"generation_id": row["generation_id"], "created_at": row["created_at"]} for row in rows]
+
+    def heartbeat(self, generation_id, worker_id):
+        """Extend the lease of a job. Returns False if the worker lost the lease."""
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                f"UPDATE {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} SET lease_expires_at = ?, updated_at = ? "
+                "WHERE generation_id = ? AND worker_id = ? AND status = ?",
+                (now + self.lease_seconds, now, generation_id, worker_id, CONSTANTS.JOB_STATUS_LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, generation_id, worker_id):
+        """Mark a leased job as done."""
+        return self._finish(generation_id, worker_id, CONSTANTS.JOB_STATUS_DONE, None)
+
+    def fail(self, generation_id, worker_id, error=None):
+        """Mark a leased job as failed for good."""
+        return self._finish(generation_id, worker_id, CONSTANTS.JOB_STATUS_FAILED, error)
+
+    def retry(self, generation_id, worker_id, error=None, max_attempts=CONSTANTS.MAX_JOB_ATTEMPTS):
+        """Put a leased job that failed for a transient reason back in the queue, or fail it once it used all its attempts."""
+        with self.lock:
+            cursor = self.connection.execute(
+                f"UPDATE {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+                "worker_id = NULL, last_error = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE generation_id = ? AND worker_id = ? AND status = ?",
+                (max_attempts, CONSTANTS.JOB_STATUS_PENDING, CONSTANTS.JOB_STATUS_FAILED, error, time.time(), generation_id, worker_id, CONSTANTS.JOB_STATUS_LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def requeue_expired(self):
+        """Put jobs whose lease expired back in the queue. Returns the number of requeued jobs."""
+        with self.lock:
+            return self._requeue_expired(time.time())
+
+    def _finish(self, generation_id, worker_id, status, error):
+        with self.lock:
+            cursor = self.connection.execute(
+                f"UPDATE {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} SET status = ?, last_error = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE generation_id = ? AND worker_id = ? AND status = ?",
+                (status, error, time.time(), generation_id, worker_id, CONSTANTS.JOB_STATUS_LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def _requeue_expired(self, now):
+        # Jobs that already used all their attempts are failed instead of requeued
+        self.connection.execute(
+            f"UPDATE {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} SET status = ?, last_error = ?, worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+            (CONSTANTS.JOB_STATUS_FAILED, "Lease expired too many times.", now, CONSTANTS.JOB_STATUS_LEASED, now, CONSTANTS.MAX_JOB_ATTEMPTS)
+        )
+        cursor = self.connection.execute(
+            f"UPDATE {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} SET status = ?, worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE status = ? AND lease_expires_at < ?",
+            (CONSTANTS.JOB_STATUS_PENDING, now, CONSTANTS.JOB_STATUS_LEASED, now)
+        )
+        return cursor.rowcount
+
+class SupabaseJobQueue:
+    """Generation job queue backed by Postgres functions (see db/sql/generation_jobs.sql) that lease with FOR UPDATE SKIP LOCKED."""
+
+    def __init__(self, lease_seconds=CONSTANTS.JOB_LEASE_SECONDS):
+        load_dotenv()
+        self.supabase = Supabase()
+        self.lease_seconds = lease_seconds
+
+    def call(self, function_name, params):
+        """Call a queue function through PostgREST."""
+        client = self.supabase.get_supabase_client(self.supabase.generate_scraper_jwt())
+        return client.rpc(function_name, params).execute().data
+
+    def enqueue(self, generation_id, phone_number=None, max_runtime=CONSTANTS.MAX_RUNTIME):
+        """Add a generation to the queue. Returns False if it's already queued."""
+        try:
+            return bool(self.call("enqueue_generation_job", {
+                "p_generation_id": generation_id,
+                "p_phone_number": phone_number,
+                "p_max_runtime": int(max_runtime)
+            }))
+        except Exception as e:
+            print(f"JOB_QUEUE: Could not enqueue the generation {generation_id}. Details: {e}")
+            return False
+
+    def claim(self, worker_id, phone_number=None, generation_id=None):
+        """Lease the oldest pending job (or a specific one) for this worker. Returns the job or None."""
+        try:
+            rows = self.call("claim_generation_job", {
+                "p_worker_id": worker_id,
+                "p_phone_number": phone_number,
+                "p_generation_id": generation_id,
+                "p_lease_seconds": self.lease_seconds,
+                "p_max_attempts": CONSTANTS.MAX_JOB_ATTEMPTS
+            })
+        except Exception as e:
+            print(f"JOB_QUEUE: Could not claim a job for the worker {worker_id}. Details: {e}")
+            return None
+
+        if not rows:
+            return None
+
+        row = rows[0]
+        return {
+            "generation_id": row["generation_id"],
+            "phone_number": row["phone_number"],
+            "max_runtime": row["max_runtime"],
+            "attempts": row["attempts"]
+        }
+
+    def list_pending(self, phone_number=None, limit=CONSTANTS.DISPATCHER_LOOKAHEAD):
+        """The oldest pending jobs this worker could claim, oldest first."""
+        try:
+            client = self.supabase.get_supabase_client(self.supabase.generate_scraper_jwt())
+            query = client.table(CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE).select("generation_id, created_at").eq("status", CONSTANTS.JOB_STATUS_PENDING)
+            if phone_number:
+                query = query.or_(f"phone_number.is.null,phone_number.eq.{phone_number}")
+            else:
+                query = query.is_("phone_number", "null")
+            rows = query.order("created_at").limit(limit).execute().data
+            return [{"generation_id": row["generation_id"], "created_at": parse_timestamp(row["created_at"])} for row in rows]
+        except Exception as e:
+            print(f"JOB_QUEUE: Could not list the pending jobs. Details: {e}")
+            return []
+
+    def heartbeat(self, generation_id, worker_id):
+        """Extend the lease of a job. Returns False if the worker lost the lease."""
+        try:
+            return bool(self.call("heartbeat_generation_job", {
+                "p_generation_id": generation_id,
+                "p_worker_id": worker_id,
+                "p_lease_seconds": self.lease_seconds
+            }))
+        except Exception as e:
+            print(f"JOB_QUEUE: Could not send a heartbeat for the generation {generation_id}. Details: {e}")
+            return False
+
+    def complete(self, generation_id, worker_id):
+        """Mark a leased job as done."""
+        return self._finish(generation_id, worker_id, CONSTANTS.JOB_STATUS_DONE, None)
+
+    def fail(self, generation_id, worker_id, error=None):
+        """Mark a leased job as failed for good."""
+        return self._finish(generation_id, worker_id, CONSTANTS.JOB_STATUS_FAILED, error)
+
+    def retry(self, generation_id, worker_id, error=None, max_attempts=CONSTANTS.MAX_JOB_ATTEMPTS):
+        """Put a leased job that failed for a transient reason back in the queue, or fail it once it used all its attempts."""
+        try:
+            return bool(self.call("retry_generation_job", {
+                "p_generation_id": generation_id,
+                "p_worker_id": worker_id,
+                "p_error": error,
+                "p_max_attempts": max_attempts
+            }))
+        except Exception as e:
+            print(f"JOB_QUEUE: Could not put the generation {generation_id} back in the queue. Details: {e}")
+            return False
+
+    def requeue_expired(self):
+        """Put jobs whose lease expired back in the queue. Returns the number of requeued jobs."""
+        try:
+            return int(self.call("requeue_expired_generation_jobs", {"p_max_attempts": CONSTANTS.MAX_JOB_ATTEMPTS}) or 0)
+        except Exception as e:
+            print(f"JOB_QUEUE: Could not requeue expired jobs. Details: {e}")
+            return 0
+
+    def _finish(self, generation_id, worker_id, status, error):
+        try:
+            return bool(self.call("finish_generation_job", {
+                "p_generation_id": generation_id,
+                "p_worker_id": worker_id,
+                "p_status": status,
+                "p_error": error
+            }))
+        except Exception as e:
+            print(f"JOB_QUEUE: Could not mark the generation {generation_id} as {status}. Details: {e}")
+            return False
+
+class JobHeartbeat:
+    """Background thread that keeps the lease of a job alive while it's being scraped."""
+
+    def __init__(self, job_queue, generation_id, worker_id, interval=CONSTANTS.JOB_HEARTBEAT_INTERVAL):
+        self.job_queue = job_queue
+        self.generation_id = generation_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.lost_lease = False
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            if not self.job_queue.heartbeat(self.generation_id, self.worker_id):
+                print(f"JOB_QUEUE: Lost the lease on the generation {self.generation_id}.")
+                self.lost_lease = True
+                return
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+def parse_timestamp(value):
+    """
+    The epoch seconds of a Postgres timestamptz, e.g. 2024-05-01T10:00:00.12+00:00.
+    Postgres drops trailing zeros of the fraction, which datetime.fromisoformat only accepts from Python 3.11 on.
+    """
+    match = TIMESTAMP_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid timestamp {value}")
+
+    date_time, fraction, offset = match.groups()
+    offset = "+00:00" if offset in (None, "Z") else offset
+    if len(offset) == 3:
+        offset += ":00"
+    elif len(offset) == 5:
+        offset = f"{offset[:3]}:{offset[3:]}"
+    return datetime.fromisoformat(f"{date_time}.{(fraction or '0')[:6].ljust(6, '0')}{offset}").timestamp()
+
+def get_job_queue():
+    """Return the job queue selected through JOB_QUEUE_BACKEND."""
+    load_dotenv()
+    backend = os.getenv("JOB_QUEUE_BACKEND", CONSTANTS.JOB_QUEUE_BACKEND_SUPABASE)
+
+    if backend == CONSTANTS.JOB_QUEUE_BACKEND_SQLITE:
+        return SqliteJobQueue()
+
+    return SupabaseJobQueue()
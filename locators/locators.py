@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import tempfile
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from db.supabase import Supabase
+from selenium.webdriver.common.by import By
+
+class LocatorRegistry:
+    """
+    Finds the elements of LOCATOR_STRATEGIES with a chain of strategies: fast CSS paths first, the original XPath last.
+    The strategy that last found an element is tried first. It is persisted across runs along with the lookup timings,
+    in Supabase by default since each Fargate task starts with an empty disk.
+    """
+
+    def __init__(self, driver, cache_path=None, supabase=None):
+        load_dotenv()
+        self.driver = driver
+        self.cache_path = cache_path or os.getenv("LOCATOR_CACHE_PATH") or CONSTANTS.LOCATOR_CACHE_PATH
+        self.supabase = None
+        if os.getenv("LOCATOR_CACHE_BACKEND", CONSTANTS.LOCATOR_CACHE_BACKEND_SUPABASE) == CONSTANTS.LOCATOR_CACHE_BACKEND_SUPABASE:
+            self.supabase = supabase or Supabase()
+        self.names_by_xpath = {getattr(CONSTANTS, name): name for name in CONSTANTS.LOCATOR_STRATEGIES}
+        cache = self.load_cache()
+        self.winners = cache.get("winners", {})
+        self.timings = cache.get("timings", {})
+        # What changed since the last save, added to the shared totals by the next save
+        self.new_timings = {}
+        self.winner_changes = {}
+
+    def load_cache(self):
+        """Load the winning strategies from Supabase, or from the cache file if it's kept locally or Supabase can't be read."""
+        if self.supabase:
+            winners = self.supabase.get_locator_winners()
+            if winners is not None:
+                return {"winners": winners}
+
+        try:
+            with open(self.cache_path, 'r') as cache_file:
+                return json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"LOCATORS: Could not read the locator cache. Details: {e}")
+            return {}
+
+    def save(self):
+        """Persist the winning strategies and the lookup timings."""
+        if not self.new_timings and not self.winner_changes:
+            return True
+
+        if self.supabase and self.supabase.save_locator_lookups(self.get_lookups()):
+            self.new_timings, self.winner_changes = {}, {}
+            return True
+
+        return self.save_locally()
+
+    def get_lookups(self):
+        lookups = []
+        for name, strategy_timings in self.new_timings.items():
+            for key, timing in strategy_timings.items():
+                lookups.append({"locator_name": name, "strategy": key, **timing, "won": self.winner_changes.get(name, {}).get(key)})
+        for name, changes in self.winner_changes.items():
+            for key, won in changes.items():
+                if key not in self.new_timings.get(name, {}):
+                    lookups.append({"locator_name": name, "strategy": key, "lookups": 0, "total_seconds": 0.0, "won": won})
+        return lookups
+
+    def save_locally(self):
+        try:
+            cache_dir = os.path.dirname(os.path.abspath(self.cache_path))
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=cache_dir, delete=False) as temp_file:
+                json.dump({"winners": self.winners, "timings": self.timings}, temp_file)
+            os.replace(temp_file.name, self.cache_path)
+            self.new_timings, self.winner_changes = {}, {}
+            return True
+        except Exception as e:
+            print(f"LOCATORS: Could not save the locator cache. Details: {e}")
+            return False
+
+    def get_name(self, xpath):
+        """The name of the locator whose fallback is the given XPath, if it has faster strategies."""
+        return self.names_by_xpath.get(xpath)
+
+    def get_key(self, strategy):
+        return ":".join(str(part) for part in strategy)
+
+    def get_strategies(self, name):
+        """The strategies of a locator, the last winning one first and the original XPath last."""
+        strategies = [tuple(strategy) for strategy in CONSTANTS.LOCATOR_STRATEGIES[name]] + [("xpath", getattr(CONSTANTS, name))]
+        winner = next((strategy for strategy in strategies if self.get_key(strategy) == self.winners.get(name)), None)
+        if winner:
+            strategies.remove(winner)
+            strategies.insert(0, winner)
+        return strategies
+
+    def find(self, name, single, within=None):
+        """
+        Find the elements of a locator in the page, or within an element. Returns a single element, a list or None.
+        Every strategy is tried before giving up, so an element the fast paths no longer match (e.g. after a UI change)
+        is still found by the XPath. A winning strategy that misses is evicted, so the next lookup doesn't start with it.
+        """
+        for strategy in self.get_strategies(name):
+            key = self.get_key(strategy)
+            started_at = time.time()
+            try:
+                elements = self.run_strategy(strategy, within)
+            except Exception as e:
+                print(f"LOCATORS: The {strategy[0]} strategy of {name} failed. Details: {e}")
+                elements = []
+            self.record_timing(name, key, time.time() - started_at)
+
+            if (single and len(elements) == 1) or (not single and len(elements) > 0):
+                if self.winners.get(name) != key:
+                    self.set_winner(name, key)
+                return elements[0] if single else elements
+
+            if self.winners.get(name) == key:
+                self.set_winner(name, None)
+
+        return None
+
+    def set_winner(self, name, key):
+        """Make a strategy the winner of a locator, or evict the current winner if key is None."""
+        changes = self.winner_changes.setdefault(name, {})
+        if self.winners.get(name):
+            changes[self.winners[name]] = False
+        if key:
+            self.winners[name] = key
+            changes[key] = True
+        else:
+            del self.winners[name]
+
+    def run_strategy(self, strategy, within):
+        kind = strategy[0]
+        # Like the ".//" of a scoped XPath, :scope keeps the whole selector inside the element instead of matching its ancestors
+        selector = f":scope {strategy[1]}" if within and kind != "xpath" else strategy[1]
+        if kind == "css":
+            return (within or self.driver).find_elements(By.CSS_SELECTOR, selector)
+        elif kind == "css_text":
+            # A single round trip for a text match that would otherwise need a translate() XPath
+            return self.driver.execute_script("""
+                const root = arguments[0] || document;
+                const [text, match] = [arguments[2], arguments[3]];
+                const textNodes = element => Array.from(element.childNodes).filter(node => node.nodeType === Node.TEXT_NODE);
+                return Array.from(root.querySelectorAll(arguments[1])).filter(element => {
+                    if (match === "own_text_equals") return textNodes(element).some(node => node.nodeValue === text);
+                    if (match === "first_text_contains") return textNodes(element).slice(0, 1).some(node => node.nodeValue.toLowerCase().includes(text));
+                    return element.textContent.toLowerCase().includes(text);
+                });
+            """, within, selector, strategy[2], strategy[3]) or []
+        elif kind == "css_maxlength":
+            return self.driver.execute_script("""
+                const root = arguments[0] || document;
+                return Array.from(root.querySelectorAll(arguments[1])).filter(element => {
+                    const maxlength = Number(element.getAttribute("maxlength"));
+                    return maxlength > arguments[2] && (arguments[3] === null || maxlength < arguments[3]);
+                });
+            """, within, selector, strategy[2], strategy[3]) or []
+        elif kind == "xpath":
+            if within:
+                return within.find_elements(By.XPATH, "." + strategy[1])
+            return self.driver.find_elements(By.XPATH, strategy[1])
+
+        raise ValueError(f"Unknown locator strategy {kind}")
+
+    def record_timing(self, name, key, elapsed):
+        for timings in (self.timings, self.new_timings):
+            strategy_timings = timings.setdefault(name, {}).setdefault(key, {"lookups": 0, "total_seconds": 0.0})
+            strategy_timings["lookups"] += 1
+            strategy_timings["total_seconds"] += elapsed
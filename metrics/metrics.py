@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import threading
+import constants as CONSTANTS
+from dotenv import load_dotenv
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+class MetricsCollector:
+    """
+    Counters and histograms of a job, kept in memory and written as CloudWatch Embedded Metric Format lines when the job ends.
+    In worker mode they can also be served to Prometheus, where they keep adding up across jobs.
+    """
+
+    def __init__(self, namespace=CONSTANTS.METRICS_NAMESPACE, version=None):
+        self.namespace = namespace
+        self.version = version
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.units = {}
+        self.failure_reason = None
+        self.prometheus_metrics = {}
+        self.prometheus_port = None
+
+    def increment(self, name, value=1, unit="Count", **dimensions):
+        key = (name, tuple(sorted(dimensions.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.units[name] = unit
+        self.export_to_prometheus("counter", name, value, dimensions)
+
+    def observe(self, name, value, unit="Seconds", **dimensions):
+        key = (name, tuple(sorted(dimensions.items())))
+        with self.lock:
+            self.histograms.setdefault(key, []).append(value)
+            self.units[name] = unit
+        self.export_to_prometheus("histogram", name, value, dimensions)
+
+    def record_error(self, source):
+        """Count an error reported by a module. The last one is the reason of the job failure."""
+        self.failure_reason = source
+        self.increment("ScraperErrors", Source=source)
+
+    def get_counter(self, name, **dimensions):
+        return self.counters.get((name, tuple(sorted(dimensions.items()))), 0)
+
+    def get_observations(self, name, **dimensions):
+        return list(self.histograms.get((name, tuple(sorted(dimensions.items()))), []))
+
+    def snapshot(self):
+        """Everything collected since the last flush, e.g. to check the metrics of a job in a test."""
+        with self.lock:
+            return {
+                "counters": {self.format_key(key): value for key, value in self.counters.items()},
+                "histograms": {self.format_key(key): list(values) for key, values in self.histograms.items()}
+            }
+
+    def format_key(self, key):
+        name, dimensions = key
+        return name + "".join(f"|{dimension}={value}" for dimension, value in dimensions)
+
+    def flush(self, stream=None):
+        """Write the metrics of the job as EMF lines and start over. Returns the number of lines written."""
+        with self.lock:
+            counters, self.counters = self.counters, {}
+            histograms, self.histograms = self.histograms, {}
+            self.failure_reason = None
+
+        # Straight to the real stdout, since CloudWatch only extracts EMF lines that aren't wrapped in a log record
+        stream = stream or sys.__stdout__
+        lines = 0
+        for (name, dimensions), value in counters.items():
+            stream.write(self.to_emf(name, dict(dimensions), value) + "\n")
+            lines += 1
+        for (name, dimensions), values in histograms.items():
+            # An EMF metric holds at most 100 values
+            for index in range(0, len(values), CONSTANTS.EMF_MAX_VALUES):
+                stream.write(self.to_emf(name, dict(dimensions), values[index:index + CONSTANTS.EMF_MAX_VALUES]) + "\n")
+                lines += 1
+        stream.flush()
+        return lines
+
+    def get_version(self):
+        """The release every metric is tagged with, read when the metrics are written since .env is loaded after this module."""
+        return self.version or os.getenv("SCRAPER_VERSION") or CONSTANTS.SCRAPER_VERSION
+
+    def to_emf(self, name, dimensions, value):
+        dimensions = {**dimensions, "Version": self.get_version()}
+        return json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [{"Name": name, "Unit": self.units.get(name, "None")}]
+                }]
+            },
+            **{dimension: str(dimension_value) for dimension, dimension_value in dimensions.items()},
+            name: value
+        })
+
+    def start_prometheus(self, port):
+        """Serve the metrics to Prometheus on a port. Returns False if prometheus_client isn't installed."""
+        if not prometheus_client:
+            print("METRICS: Install prometheus_client to serve the metrics to Prometheus.")
+            return False
+
+        if self.prometheus_port is None:
+            prometheus_client.start_http_server(int(port))
+            self.prometheus_port = int(port)
+            print(f"METRICS: Serving Prometheus metrics on port {port}.")
+        return True
+
+    def export_to_prometheus(self, kind, name, value, dimensions):
+        if self.prometheus_port is None:
+            return
+
+        try:
+            label_names = tuple(sorted(dimensions))
+            metric_key = (name, label_names)
+            with self.lock:
+                if metric_key not in self.prometheus_metrics:
+                    # Prometheus needs one set of labels per metric name, e.g. suno_scraper_phase_duration_by_phase
+                    metric_name = "suno_scraper" + "".join(f"_{char.lower()}" if char.isupper() else char for char in name)
+                    if label_names:
+                        metric_name += "_by_" + "_".join(label.lower() for label in label_names)
+                    metric_class = prometheus_client.Counter if kind == "counter" else prometheus_client.Histogram
+                    self.prometheus_metrics[metric_key] = metric_class(metric_name, f"{name} ({self.units.get(name)})", label_names)
+                metric = self.prometheus_metrics[metric_key]
+
+            labelled_metric = metric.labels(**{label: str(dimensions[label]) for label in label_names}) if label_names else metric
+            if kind == "counter":
+                labelled_metric.inc(value)
+            else:
+                labelled_metric.observe(value)
+        except Exception as e:
+            print(f"METRICS: Could not export {name} to Prometheus. Details: {e}")
+
+metrics = MetricsCollector()
+
+def get_metrics():
+    """The metrics collector of this process."""
+    return metrics
+
+def start_prometheus_exporter():
+    """Serve the metrics to Prometheus if METRICS_PROMETHEUS_PORT is set."""
+    load_dotenv()
+    port = os.getenv("METRICS_PROMETHEUS_PORT")
+    return metrics.start_prometheus(port) if port else False
+
+def instrument_driver(driver):
+    """
+    Count and time every WebDriver command, which is one HTTP round trip to chromedriver.
+    The same timing feeds the WebDriver profiler once one is attached as driver.webdriver_profiler.
+    """
+    execute = driver.execute
+    driver.webdriver_profiler = None
+
+    def timed_execute(driver_command, params=None):
+        started_at = time.perf_counter()
+        try:
+            return execute(driver_command, params)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            metrics.observe("WebDriverCallLatency", elapsed, Command=driver_command)
+            if driver.webdriver_profiler:
+                driver.webdriver_profiler.record(driver_command, params, elapsed, sys._getframe(1))
+
+    driver.execute = timed_execute
+    return driver
+
+def instrument_supabase_client(client):
+    """
+    Count and time every HTTP request of a Supabase client: table queries, RPCs and storage calls are one round trip each.
+    The hooks sit on the httpx sessions the query builders and the storage buckets send their requests through.
+    """
+    def on_request(request):
+        request.extensions["metrics_started_at"] = time.perf_counter()
+
+    def on_response(response):
+        service = "storage" if "/storage/" in response.request.url.path else "rest"
+        metrics.increment("SupabaseRequests", Service=service)
+        if "metrics_started_at" in response.request.extensions:
+            metrics.observe("SupabaseRequestLatency", time.perf_counter() - response.request.extensions["metrics_started_at"], Service=service)
+
+    for session in (client.postgrest.session, client.storage.session):
+        session.event_hooks["request"].append(on_request)
+        session.event_hooks["response"].append(on_response)
+    return client
+
+def instrument_s3_client(s3_client):
+    """Count and time every S3 API call of a boto3 client."""
+    def before_call(context, **kwargs):
+        context["metrics_started_at"] = time.time()
+
+    def after_call(model, context, **kwargs):
+        if "metrics_started_at" in context:
+            metrics.observe("S3CallLatency", time.time() - context["metrics_started_at"], Operation=model.name)
+
+    s3_client.meta.events.register("before-call.s3", before_call)
+    s3_client.meta.events.register("after-call.s3", after_call)
+    return s3_client
@@ -0,0 +1,216 @@
+import time
+import base64
+import socket
+import select
+import threading
+import socketserver
+import constants as CONSTANTS
+from metrics.metrics import get_metrics
+
+class ForwardingProxy:
+    """
+    Local HTTP proxy that forwards everything to the residential proxy of one account.
+    It authenticates every request itself, pre-connects TCP sockets to the upstream proxy and meters bytes and latency.
+    A pre-connected socket only saves the TCP handshake of one request: it's used once, since the upstream proxy ties it to the first target.
+    Upstream connections are never kept alive between requests, as almost all of Chrome's traffic is CONNECT tunnels bound to one host.
+    """
+
+    def __init__(self, account, upstream_host, upstream_port, username, password):
+        self.account = account
+        self.upstream_address = (upstream_host, int(upstream_port))
+        self.auth_header = "Proxy-Authorization: Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.pool = []
+        self.pool_lock = threading.Lock()
+        self.pool_condition = threading.Condition(self.pool_lock)
+        self.stopping = False
+        self.stats_lock = threading.Lock()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connect_latencies = []
+        self.failed_connects = 0
+        self.reported_bytes = {"sent": 0, "received": 0}
+        self.server = None
+
+    def start(self):
+        """Start serving on a free local port in a background thread."""
+        proxy = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                proxy.handle_client(self.request)
+
+        self.server = socketserver.ThreadingTCPServer((CONSTANTS.FORWARDING_PROXY_HOST, 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name=f"forwarding_proxy_{self.account}", daemon=True).start()
+        threading.Thread(target=self.fill_pool, name=f"forwarding_proxy_pool_{self.account}", daemon=True).start()
+
+        print(f"FORWARDING_PROXY: Serving the proxy of {self.account} on {self.get_address()}.")
+        return True
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        with self.pool_condition:
+            self.stopping = True
+            for upstream, _ in self.pool:
+                upstream.close()
+            self.pool = []
+            self.pool_condition.notify_all()
+
+    def get_address(self):
+        host, port = self.server.server_address
+        return f"{host}:{port}"
+
+    def fill_pool(self):
+        """
+        Keep FORWARDING_PROXY_POOL_SIZE pre-connected sockets ready so that Chrome doesn't wait for the TCP handshake.
+        This single thread sleeps until a socket is taken from the pool, so the pool never grows past its size.
+        """
+        while True:
+            with self.pool_condition:
+                while not self.stopping and len(self.pool) >= CONSTANTS.FORWARDING_PROXY_POOL_SIZE:
+                    self.pool_condition.wait()
+                if self.stopping:
+                    return
+
+            try:
+                upstream = socket.create_connection(self.upstream_address, timeout=CONSTANTS.FORWARDING_PROXY_CONNECT_TIMEOUT)
+            except OSError as e:
+                print(f"FORWARDING_PROXY: Could not pre-connect to the upstream proxy. Details: {e}")
+                with self.pool_condition:
+                    self.pool_condition.wait(CONSTANTS.FORWARDING_PROXY_CONNECT_TIMEOUT)
+                continue
+
+            with self.pool_condition:
+                if self.stopping:
+                    upstream.close()
+                    return
+                self.pool.append((upstream, time.time()))
+
+    def get_upstream_connection(self):
+        """Take a pre-connected socket from the pool, or connect now if none is fresh enough."""
+        upstream = None
+        with self.pool_condition:
+            while self.pool and not upstream:
+                pooled_upstream, opened_at = self.pool.pop()
+                # A connection the upstream proxy closed shows up as readable
+                if time.time() - opened_at < CONSTANTS.FORWARDING_PROXY_POOL_MAX_IDLE and not select.select([pooled_upstream], [], [], 0)[0]:
+                    upstream = pooled_upstream
+                else:
+                    pooled_upstream.close()
+            self.pool_condition.notify()
+
+        return upstream or socket.create_connection(self.upstream_address, timeout=CONSTANTS.FORWARDING_PROXY_CONNECT_TIMEOUT)
+
+    def handle_client(self, client):
+        upstream = None
+        try:
+            request_head, request_body = self.read_head(client)
+            if not request_head:
+                return
+
+            request_line, *header_lines = request_head.split("\r\n")
+            method = request_line.split(" ")[0].upper()
+
+            # Only the upstream proxy authenticates us, and plain HTTP connections aren't reused since the auth goes in every request
+            header_lines = [line for line in header_lines if line and not line.lower().startswith(("proxy-authorization:", "proxy-connection:", "connection:"))]
+            header_lines.append(self.auth_header)
+            if method != "CONNECT":
+                header_lines.append("Connection: close")
+
+            connect_started_at = time.time()
+            upstream = self.get_upstream_connection()
+            upstream.sendall(("\r\n".join([request_line] + header_lines) + "\r\n\r\n").encode("latin-1") + request_body)
+
+            if method == "CONNECT":
+                response_head, response_body = self.read_head(upstream)
+                if not response_head or " 200" not in response_head.split("\r\n")[0]:
+                    with self.stats_lock:
+                        self.failed_connects += 1
+                    client.sendall(b"HTTP/1.1 502 Bad Gateway\r\n\r\n")
+                    return
+
+                with self.stats_lock:
+                    self.connect_latencies.append(time.time() - connect_started_at)
+                client.sendall(b"HTTP/1.1 200 Connection Established\r\n\r\n" + response_body)
+
+            self.tunnel(client, upstream)
+        except Exception as e:
+            print(f"FORWARDING_PROXY: Got an error forwarding a request. Details: {e}")
+        finally:
+            if upstream:
+                upstream.close()
+            client.close()
+
+    def read_head(self, connection):
+        """Read an HTTP head. Returns the head and whatever was read after it."""
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = connection.recv(CONSTANTS.FORWARDING_PROXY_BUFFER_SIZE)
+            if not chunk:
+                return (None, b"")
+            data += chunk
+        head, rest = data.split(b"\r\n\r\n", 1)
+        return (head.decode("latin-1"), rest)
+
+    def tunnel(self, client, upstream):
+        """Copy bytes both ways until one side closes."""
+        client.settimeout(None)
+        upstream.settimeout(None)
+        connections = [client, upstream]
+        while True:
+            readable, _, errored = select.select(connections, [], connections, CONSTANTS.FORWARDING_PROXY_IDLE_TIMEOUT)
+            if errored or not readable:
+                return
+
+            for connection in readable:
+                data = connection.recv(CONSTANTS.FORWARDING_PROXY_BUFFER_SIZE)
+                if not data:
+                    return
+
+                if connection is client:
+                    upstream.sendall(data)
+                    with self.stats_lock:
+                        self.bytes_sent += len(data)
+                else:
+                    client.sendall(data)
+                    with self.stats_lock:
+                        self.bytes_received += len(data)
+
+    def report(self):
+        """Print and return the traffic and latency of this account."""
+        with self.stats_lock:
+            latencies = sorted(self.connect_latencies)
+            stats = {
+                "account": self.account,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "tunnels": len(latencies),
+                "failed_connects": self.failed_connects,
+                "median_connect_latency": latencies[len(latencies) // 2] if latencies else None
+            }
+            # The proxy outlives the jobs of a worker, so only the bytes since the last report belong to this job
+            new_bytes = {"sent": self.bytes_sent - self.reported_bytes["sent"], "received": self.bytes_received - self.reported_bytes["received"]}
+            self.reported_bytes = {"sent": self.bytes_sent, "received": self.bytes_received}
+
+        for direction, byte_count in new_bytes.items():
+            get_metrics().increment("ProxyBytes", byte_count, unit="Bytes", Direction=direction)
+
+        print(f"FORWARDING_PROXY: {self.account} sent {stats['bytes_sent'] / 1024 / 1024:.2f} MB and received {stats['bytes_received'] / 1024 / 1024:.2f} MB "
+              f"over {stats['tunnels']} tunnels ({stats['failed_connects']} failed), median connect latency {stats['median_connect_latency']}.")
+        return stats
+
+forwarding_proxies = {}
+forwarding_proxies_lock = threading.Lock()
+
+def get_forwarding_proxy(account, upstream_host, upstream_port, username, password):
+    """Return the forwarding proxy of an account, starting it the first time. It stays up for the next jobs of this process."""
+    with forwarding_proxies_lock:
+        if account not in forwarding_proxies:
+            forwarding_proxy = ForwardingProxy(account, upstream_host, upstream_port, username, password)
+            forwarding_proxy.start()
+            forwarding_proxies[account] = forwarding_proxy
+        return forwarding_proxies[account]
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import tempfile
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from db.supabase import Supabase
+from metrics.metrics import get_metrics
+
+class RuntimeBudget:
+    """Plans the remaining runtime of a scraping job using historical per-phase durations."""
+
+    def __init__(self, start_time, max_runtime=None, stats_path=None, supabase=None):
+        load_dotenv()
+        self.start_time = start_time
+        self.max_runtime = int(max_runtime if max_runtime is not None else os.getenv('MAX_RUNTIME', CONSTANTS.RUNTIME_ERROR_MARGIN))
+        self.stats_path = stats_path or os.getenv("RUNTIME_STATS_PATH") or CONSTANTS.RUNTIME_STATS_PATH
+        # Each Fargate task starts with an empty disk, so by default the history is shared through Supabase
+        self.supabase = None
+        if os.getenv("RUNTIME_STATS_BACKEND", CONSTANTS.RUNTIME_STATS_BACKEND_SUPABASE) == CONSTANTS.RUNTIME_STATS_BACKEND_SUPABASE:
+            self.supabase = supabase or Supabase()
+        self.history = self.load_history()
+        self.phase_start_times = {}
+        self.recorded_durations = []
+
+    def load_history(self):
+        """Load the historical phase durations from Supabase, or from the stats file if they're kept locally or Supabase can't be read."""
+        if self.supabase:
+            history = self.supabase.get_runtime_phase_durations(CONSTANTS.RUNTIME_STATS_MAX_SAMPLES)
+            if history is not None:
+                return history
+
+        try:
+            with open(self.stats_path, 'r') as stats_file:
+                history = json.load(stats_file)
+            return {phase: [float(d) for d in durations] for phase, durations in history.items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"RUNTIME_BUDGET: Could not read the runtime stats at {self.stats_path}. Details: {e}")
+            return {}
+
+    def save(self):
+        """
+        Save the durations recorded in this run, including the phases that were still running when the job stopped
+        (timed out or failed), since leaving them out would make the budget plan for the runs that went well only.
+        """
+        for phase in list(self.phase_start_times):
+            self.end_phase(phase, CONSTANTS.PHASE_OUTCOME_UNFINISHED)
+
+        if not self.recorded_durations:
+            return True
+
+        if self.supabase and self.supabase.save_runtime_phase_durations(self.recorded_durations):
+            self.recorded_durations = []
+            return True
+
+        return self.save_locally()
+
+    def save_locally(self):
+        """Merge the durations recorded in this run into the stats file."""
+        try:
+            # Read the file again so that runs sharing it don't drop each other's samples
+            try:
+                with open(self.stats_path, 'r') as stats_file:
+                    history = json.load(stats_file)
+            except FileNotFoundError:
+                history = {}
+
+            for phase, duration, _ in self.recorded_durations:
+                history[phase] = (history.get(phase, []) + [duration])[-CONSTANTS.RUNTIME_STATS_MAX_SAMPLES:]
+
+            stats_dir = os.path.dirname(os.path.abspath(self.stats_path))
+            os.makedirs(stats_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=stats_dir, delete=False) as temp_file:
+                json.dump(history, temp_file)
+            os.replace(temp_file.name, self.stats_path)
+
+            self.recorded_durations = []
+            return True
+        except Exception as e:
+            print(f"RUNTIME_BUDGET: Could not save the runtime stats at {self.stats_path}. Details: {e}")
+            return False
+
+    def start_phase(self, phase):
+        """Start timing a phase."""
+        self.phase_start_times[phase] = time.time()
+
+    def end_phase(self, phase, outcome=CONSTANTS.PHASE_OUTCOME_COMPLETED):
+        """Stop timing a phase and record its duration. Returns the duration in seconds."""
+        phase_start_time = self.phase_start_times.pop(phase, None)
+        if phase_start_time is None:
+            return None
+
+        duration = time.time() - phase_start_time
+        self.recorded_durations.append((phase, round(duration, 2), outcome))
+        print(f"RUNTIME_BUDGET: The {phase} phase took {duration:.1f} seconds ({outcome}).")
+        get_metrics().observe("PhaseDuration", duration, Phase=phase, Outcome=outcome)
+        return duration
+
+    def predict(self, phases):
+        """Predict how many seconds the given phases will take."""
+        return sum(self.predict_phase(phase) for phase in phases)
+
+    def predict_phase(self, phase):
+        """Predict the duration of a phase from a high percentile of its history, or its default if there's not enough history."""
+        durations = self.history.get(phase, [])
+        if len(durations) < CONSTANTS.RUNTIME_STATS_MIN_SAMPLES:
+            return CONSTANTS.DEFAULT_PHASE_DURATIONS[phase]
+
+        durations = sorted(durations)
+        index = min(len(durations) - 1, int(len(durations) * CONSTANTS.RUNTIME_STATS_PERCENTILE))
+        return durations[index]
+
+    def end_time(self):
+        """Return the timestamp after which the job has to stop working."""
+        return self.start_time + self.max_runtime - CONSTANTS.RUNTIME_ERROR_MARGIN
+
+    def remaining(self):
+        """Return the number of seconds left in the budget."""
+        return self.end_time() - time.time()
+
+    def can_afford(self, phases):
+        """Check if the given phases are expected to fit in the remaining time."""
+        predicted = self.predict(phases)
+        remaining = self.remaining()
+        if predicted > remaining:
+            print(f"RUNTIME_BUDGET: The phases {', '.join(phases)} should take {predicted:.0f} seconds but only {remaining:.0f} seconds are left.")
+            return False
+        return True
+
+    def deadline_for(self, max_wait_time, reserved_phases=()):
+        """Return the latest timestamp a wait can run until while leaving time for the reserved phases that come after it."""
+        return min(time.time() + max_wait_time, self.end_time() - self.predict(reserved_phases))
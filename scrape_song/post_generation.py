@@ -0,0 +1,151 @@
+import os
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from audio.audio_processing import AudioPostProcessor
+
+class PostGenerationStage:
+    """Runs the off-browser work that follows a song generation (Supabase updates, uploads) on background threads, and the audio processing in worker processes."""
+
+    def __init__(self, supabase, checkpoint):
+        load_dotenv()
+        self.supabase = supabase
+        self.checkpoint = checkpoint
+        self.executor = ThreadPoolExecutor(max_workers=CONSTANTS.POST_GENERATION_MAX_WORKERS, thread_name_prefix="post_generation")
+        self.pending_tasks = []
+        self.upload_futures = {}
+        self.processing_futures = {}
+        self.remaining_credits = None
+        self.credits_saved = False
+        self.output_saved = False
+        self.audio_processor = None
+        if os.getenv("AUDIO_PROCESSING_ENABLED", str(CONSTANTS.AUDIO_PROCESSING_ENABLED)).lower() == "true":
+            self.audio_processor = AudioPostProcessor()
+
+    def submit(self, task, *args):
+        """Run a task in the background. Its result is only checked when the stage shuts down."""
+        future = self.executor.submit(self.run_safely, task, *args)
+        self.pending_tasks.append(future)
+        return future
+
+    def set_remaining_credits(self, remaining_credits):
+        """Keep the credits of the account to save them with the song output, or when the stage shuts down if no song gets saved."""
+        self.remaining_credits = remaining_credits
+
+    def start_upload(self, downloaded_song_path):
+        """Start uploading the song to Supabase storage as soon as it landed on disk."""
+        print(f"POST_GENERATION: Uploading {downloaded_song_path} in the background...")
+        upload_future = self.executor.submit(self.run_safely, self.supabase.upload_song_audio, downloaded_song_path)
+        self.upload_futures[downloaded_song_path] = upload_future
+
+        if self.audio_processor:
+            processing_future = self.audio_processor.submit(downloaded_song_path)
+            self.processing_futures[downloaded_song_path] = self.executor.submit(self.run_safely, self.upload_processed_outputs, processing_future)
+
+        return upload_future
+
+    def upload_processed_outputs(self, processing_future):
+        """Wait for the audio processing of a song and upload the files it produced. Returns the processing result with bucket paths as outputs."""
+        processing_result = processing_future.result()
+        uploaded_outputs = {}
+        for target_format, output_path in processing_result["outputs"].items():
+            output_bucket_path = self.supabase.upload_song_audio(output_path)
+            if output_bucket_path:
+                uploaded_outputs[target_format] = output_bucket_path
+        return {**processing_result, "outputs": uploaded_outputs}
+
+    def discard_upload(self, downloaded_song_path):
+        """Delete the uploaded song and previews of a downloaded song that won't be saved, so that they aren't left orphaned in the bucket."""
+        upload_future = self.upload_futures.pop(downloaded_song_path, None)
+        processing_future = self.processing_futures.pop(downloaded_song_path, None)
+
+        bucket_paths = [upload_future.result()] if upload_future else []
+        processing_result = processing_future.result() if processing_future else None
+        if processing_result:
+            bucket_paths += list(processing_result["outputs"].values())
+
+        return all(self.supabase.delete_song_audio(bucket_path) for bucket_path in bucket_paths if bucket_path)
+
+    def get_audio_details(self, downloaded_song_path):
+        """The duration, waveform and uploaded previews of a song. Empty if the song wasn't processed, None if it isn't a valid song."""
+        processing_future = self.processing_futures.get(downloaded_song_path)
+        processing_result = processing_future.result() if processing_future else None
+        if not processing_result:
+            return {}
+        if not processing_result["valid"]:
+            return None
+        return {"duration": processing_result["duration"], "waveform": processing_result["waveform"], "previews": processing_result["outputs"]}
+
+    def finish(self, song_outputs):
+        """Wait for the uploads and link the songs and their metadata to the generation. The first song is the main output, the others are optional. Returns the saved output_song."""
+        if not song_outputs or any(song_output["downloaded_song_path"] not in self.upload_futures for song_output in song_outputs):
+            print("POST_GENERATION: Cannot save the song output before starting the upload.")
+            return False
+
+        main_song, extra_songs = song_outputs[0], []
+        main_audio_bucket_song_path = self.upload_futures[main_song["downloaded_song_path"]].result()
+        if not main_audio_bucket_song_path:
+            print("POST_GENERATION: The background upload of the song failed.")
+            return False
+
+        main_audio_details = self.get_audio_details(main_song["downloaded_song_path"])
+        if main_audio_details is None:
+            print("POST_GENERATION: The downloaded song is not a valid audio file.")
+            for song_output in song_outputs:
+                self.discard_upload(song_output["downloaded_song_path"])
+            return False
+
+        for extra_song in song_outputs[1:]:
+            extra_audio_bucket_song_path = self.upload_futures[extra_song["downloaded_song_path"]].result()
+            if not extra_audio_bucket_song_path:
+                print(f"POST_GENERATION: Dropping the extra song '{extra_song['title']}' because its upload failed.")
+                continue
+
+            extra_audio_details = self.get_audio_details(extra_song["downloaded_song_path"])
+            if extra_audio_details is None:
+                print(f"POST_GENERATION: Dropping the extra song '{extra_song['title']}' because it is not a valid audio file.")
+                self.discard_upload(extra_song["downloaded_song_path"])
+                continue
+            extra_songs.append({**extra_song, **extra_audio_details, "song": extra_audio_bucket_song_path})
+
+        self.checkpoint.record(CONSTANTS.CHECKPOINT_UPLOADED, songs=[
+            {"title": song["title"], "genre": song["genre"], "lyrics": song["lyrics"], "song": song["song"]}
+            for song in [{**main_song, "song": main_audio_bucket_song_path}] + extra_songs
+        ])
+
+        output_song = self.supabase.commit_song_output(main_song["title"], main_song["genre"], main_song["lyrics"], main_audio_bucket_song_path, extra_songs, main_audio_details, self.remaining_credits)
+        if output_song:
+            self.credits_saved = True
+            self.output_saved = True
+            self.checkpoint.record(CONSTANTS.CHECKPOINT_SAVED)
+
+        return output_song
+
+    def shutdown(self):
+        """
+        Wait for every background task so that no update is lost when the job ends, and delete the uploads of a job that failed before saving them.
+        Returns False if a background update was lost.
+        """
+        self.executor.shutdown(wait=True)
+        if self.audio_processor:
+            self.audio_processor.shutdown()
+
+        # A rerun saves the songs of an uploaded checkpoint, otherwise nothing will ever link these uploads to the generation
+        if not self.output_saved and not self.checkpoint.reached(CONSTANTS.CHECKPOINT_UPLOADED):
+            for downloaded_song_path in list(self.upload_futures):
+                print(f"POST_GENERATION: Deleting the upload of {downloaded_song_path} because the song output wasn't saved.")
+                if not self.run_safely(self.discard_upload, downloaded_song_path):
+                    print(f"POST_GENERATION: Could not delete the upload of {downloaded_song_path}.")
+
+        credits_result = True
+        if self.remaining_credits and not self.credits_saved:
+            credits_result = self.run_safely(self.supabase.update_credit_number, self.remaining_credits)
+
+        return credits_result is not False and all(future.result() is not False for future in self.pending_tasks)
+
+    def run_safely(self, task, *args):
+        try:
+            return task(*args)
+        except Exception as e:
+            print(f"POST_GENERATION: Got an error in a background task. Details: {e}")
+            return False
@@ -1,48 +1,82 @@
-import os, time, re
+import os, time, re, json
 import utils.utils as utils
 import constants as CONSTANTS
+from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from db.supabase import Supabase
+from locators.locators import LocatorRegistry
+from checkpoint.checkpoint import GenerationCheckpoint
+from runtime_budget.runtime_budget import RuntimeBudget
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from error_logging.error_logging import ErrorLogging
+from scrape_song.song_feed import SongFeed
+from driver.download_tracker import DownloadDirWatcher
+from scrape_song.ui_state import CreatePageState
+from scrape_song.post_generation import PostGenerationStage
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+from structured_logging.structured_logging import get_logger
+
+logger = get_logger("SCRAPE_SONG")
 
 class ScrapeSong:
     def __init__(self, driver):
         self.driver = driver
         self.supabase = Supabase()
+        self.budget = None
+        self.checkpoint = None
+        self.post_generation = None
+        self.post_creation_phases = []
+        self.page_recycled = False
+        self.locators = LocatorRegistry(driver)
+        # The song feed and the page state outlive a job when a worker keeps the browser open between jobs
+        if not hasattr(driver, "song_feed"):
+            driver.song_feed = SongFeed(driver, driver.performance_log)
+        self.song_feed = driver.song_feed
+        if not hasattr(driver, "create_page_state"):
+            driver.create_page_state = CreatePageState()
+        self.ui_state = driver.create_page_state
         load_dotenv()  # Load environment variables once during initialization
 
     def scrape_song(self, start_time, song_creation_data, downloads_dir):
-        """Main method to scrape a song."""
+        """Main method to scrape a song. Returns the saved song output or False."""
         if not song_creation_data or not downloads_dir:
-            print("SCRAPE_SONG: Invalid song creation data or downloads directory.")
+            logger.warning("Invalid song creation data or downloads directory.")
             ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Invalid song creation data or downloads directory.")
             return False
 
+        self.budget = RuntimeBudget(start_time)
+        self.budget.start_phase(CONSTANTS.PHASE_SETUP)
+
         try:
+            self.checkpoint = GenerationCheckpoint(self.supabase)
+            if self.checkpoint.reached(CONSTANTS.CHECKPOINT_UPLOADED):
+                logger.info("A previous run already uploaded the songs. Only saving their data...")
+                return self.save_checkpointed_songs()
+
             use_instrumental, use_custom_mode = self.supabase.get_creation_modes()
 
             if use_instrumental == None or use_custom_mode == None:
-                print("SCRAPE_SONG: Could not fetch the song creation modes.")
+                logger.warning("Could not fetch the song creation modes.")
                 ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not fetch the song creation modes.")
                 return False
 
+            self.post_creation_phases = self.get_post_creation_phases(use_instrumental, use_custom_mode)
+
             switch_to_correct_creation_mode = self.switch_to_correct_creation_mode(use_instrumental, use_custom_mode)
             if not switch_to_correct_creation_mode:
-                print("SCRAPE_SONG: Could not switch to the correct creation mode.")
+                logger.warning("Could not switch to the correct creation mode.")
                 ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not switch to the correct creation mode.")
                 return False
 
             create_song_elements = self.get_main_ui_elements(use_instrumental, use_custom_mode)
             if not create_song_elements:
-                print("SCRAPE_SONG: Could not find the main UI elements on the Create page.")
+                logger.warning("Could not find the main UI elements on the Create page.")
                 ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not find the main UI elements on the Create page.")
                 return False
             
-            print("SCRAPE_SONG: Found the main UI elements.")
+            logger.info("Found the main UI elements.")
             
             # Get rid of the intro tutorial on the Create page
             dismiss_tutorial_result = self.dismiss_intro_tutorial()
@@ -50,86 +84,113 @@ class ScrapeSong:
                 ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not dismiss the intro tutorial.")
                 return False
 
-            print("SCRAPE_SONG: Got rid of the Suno tutorial popup.")
+            logger.info("Got rid of the Suno tutorial popup.")
 
-            main_text_field = ""
-            if not use_custom_mode:
-                main_text_field = create_song_elements["song_description_field"]
-                create_song_elements["song_description_field"].click()
-            else:
-                if not use_instrumental: 
-                    main_text_field = create_song_elements["custom_lyrics_field"]
-                    create_song_elements["custom_lyrics_field"].click()
-                else: 
-                    main_text_field = create_song_elements["custom_genre_field"]
-                    create_song_elements["custom_genre_field"].click()
+            main_text_field = self.get_main_text_field(create_song_elements, use_instrumental, use_custom_mode)
+            main_text_field.click()
             utils.random_micro_sleep()
 
-            if not self.still_have_time(start_time):
+            if not self.budget.can_afford(self.post_creation_phases):
                 ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Did not have any more time after getting rid of the Suno tutorial popup.")
                 return False
             
-            if not self.delete_invalid_songs(main_text_field):
-                print("SCRAPE_SONG: Could not delete invalid and pending songs before creating a new one.")
+            # The pending songs of a resumed generation are the ones we're waiting for. Stale songs can also be left to account_maintenance.py.
+            inline_song_cleanup = os.getenv("INLINE_SONG_CLEANUP", str(CONSTANTS.INLINE_SONG_CLEANUP)).lower() == "true"
+            if inline_song_cleanup and not self.checkpoint.can_resume() and not self.delete_invalid_songs(main_text_field):
+                logger.warning("Could not delete invalid and pending songs before creating a new one.")
                 ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not delete invalid and pending songs before creating a new one.")
                 return False
             
-            print("SCRAPE_SONG: Deleted any invalid and pending songs.")
+            logger.info("Deleted any invalid and pending songs.")
             
-            if not self.still_have_time(start_time):
+            if not self.budget.can_afford(self.post_creation_phases):
                 ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Did not have any more time after deleting any invalid or pending songs prior to creating a song.")
                 return False
             
-            return self.fetch_song(start_time, create_song_elements, song_creation_data, downloads_dir, main_text_field, use_instrumental, use_custom_mode)
+            return self.fetch_song(create_song_elements, song_creation_data, downloads_dir, main_text_field, use_instrumental, use_custom_mode)
         except Exception as e:
-            print(f"SCRAPE_SONG: Unexpected error encountered while scraping the song. Details: {e}")
+            logger.warning(f"Unexpected error encountered while scraping the song. Details: {e}")
             return False
+        finally:
+            if self.post_generation:
+                if not self.post_generation.shutdown():
+                    # The song output may be saved already, so this doesn't touch the error message of the generation
+                    logger.warning("Some background updates (credits or song data) could not be saved.")
+                    error_message = "SCRAPER - SCRAPE_SONG: Some background updates (credits or song data) could not be saved."
+                    error_logging = ErrorLogging()
+                    error_logging.record_error_metric(error_message)
+                    error_logging.send_email(error_message)
+                self.post_generation = None
+            self.budget.save()
+            self.locators.save()
+
+    def get_post_creation_phases(self, use_instrumental, use_custom_mode):
+        """Get the phases that run after the Create button is clicked."""
+        phases = [CONSTANTS.PHASE_GENERATION, CONSTANTS.PHASE_METADATA, CONSTANTS.PHASE_DOWNLOAD]
+        if not use_instrumental and not use_custom_mode:
+            phases.append(CONSTANTS.PHASE_LYRICS)
+        phases.append(CONSTANTS.PHASE_UPLOAD)
+        return phases
+
+    def get_phases_after(self, phase):
+        """Get the post creation phases that still have to run after the given one."""
+        return self.post_creation_phases[self.post_creation_phases.index(phase) + 1:]
     
     def switch_to_correct_creation_mode(self, use_instrumental, use_custom_mode):
         """Switch to custom more or instrumental only, depending on the settings chosen by the user."""
-        print("SCRAPE_SONG: Getting the song creation settings...")
-        current_instrumental_setting = self.get_current_instrumental_setting()
-        current_mode_setting = self.get_current_custom_mode_setting()
+        logger.info("Getting the song creation settings...")
+        if self.ui_state.refresh(self.driver):
+            current_instrumental_setting, current_mode_setting = self.ui_state.instrumental, self.ui_state.custom_mode
+        else:
+            current_instrumental_setting = self.get_current_instrumental_setting()
+            current_mode_setting = self.get_current_custom_mode_setting()
 
         if current_instrumental_setting == None or current_mode_setting == None:
-            print("SCRAPE_SONG: Could not find the current instrumental or mode settings.")
+            logger.warning("Could not find the current instrumental or mode settings.")
             return False
         
-        print("SCRAPE_SONG: Start to switch to the correct settings...")
+        logger.info("Start to switch to the correct settings...")
         if current_instrumental_setting != use_instrumental:
+            toggle_start = time.time()
             instrumental_button = (CONSTANTS.SUNO_INSTRUMENTAL_ENABLED_BUTTON if 
                                    current_instrumental_setting == True else 
                                    CONSTANTS.SUNO_INSTRUMENTAL_DISABLED_BUTTON)
             
             clicked_button = self.click_button(instrumental_button)
             if not clicked_button: 
-                print("SCRAPE_SONG: Could not click the current instrumental mode button.")
+                logger.warning("Could not click the current instrumental mode button.")
                 return False
             
-            print("SCRAPE_SONG: Toggled instrumental on/off.")
+            self.ui_state.instrumental = use_instrumental
+            self.ui_state.record_toggle(time.time() - toggle_start)
+            logger.info("Toggled instrumental on/off.")
 
         if current_mode_setting != use_custom_mode:
+            toggle_start = time.time()
             mode_button = (CONSTANTS.SUNO_CUSTOM_SONG_ENABLED_BUTTON if 
                            current_mode_setting == True else 
                            CONSTANTS.SUNO_CUSTOM_SONG_DISABLED_BUTTON)
             
             clicked_button = self.click_button(mode_button)
             if not clicked_button: 
-                print("SCRAPE_SONG: Could not click the current song creation mode button.")
+                logger.warning("Could not click the current song creation mode button.")
                 return False
             
-            print("SCRAPE_SONG: Toggled custom mode on/off.")
+            self.ui_state.custom_mode = use_custom_mode
+            logger.info("Toggled custom mode on/off.")
 
             dismiss_custom_mode_intro_flow = self.dismiss_entire_custom_mode_intro_flow()
             if not dismiss_custom_mode_intro_flow:
-                print("SCRAPE_SONG: Could not dismiss the custom mode intro flow.")
+                logger.warning("Could not dismiss the custom mode intro flow.")
                 return False
+
+            self.ui_state.record_toggle(time.time() - toggle_start)
             
         return True
 
     def get_current_instrumental_setting(self):
         """Get the current instrumental setting from the UI."""
-        print("SCRAPE_SONG: Getting the current instrumental setting...")
+        logger.info("Getting the current instrumental setting...")
         enabled_instrumental = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_INSTRUMENTAL_ENABLED_BUTTON)
         disabled_instrumental = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_INSTRUMENTAL_DISABLED_BUTTON)
 
@@ -143,7 +204,7 @@ class ScrapeSong:
     
     def get_current_custom_mode_setting(self):
         """Get the current custom mode setting from the UI."""
-        print("SCRAPE_SONG: Getting the current custom mode setting...")
+        logger.info("Getting the current custom mode setting...")
         enabled_custom = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_CUSTOM_SONG_ENABLED_BUTTON)
         disabled_custom = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_CUSTOM_SONG_DISABLED_BUTTON)
 
@@ -163,17 +224,20 @@ class ScrapeSong:
         
         button.click()
         utils.random_short_sleep()
-        print("SCRAPE_SONG: Clicked a button")
+        logger.debug("Clicked a button")
         return True
 
     def dismiss_intro_tutorial(self):
         """Dismiss the intro tutorial for Suno."""
-        tutorial_overlay = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_TUTORIAL_OVERLAY)
-        if not tutorial_overlay:
+        if self.ui_state.tutorial_dismissed:
             return True
 
-        tutorial_overlay.click()
-        utils.random_micro_sleep()
+        tutorial_overlay = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_TUTORIAL_OVERLAY)
+        if tutorial_overlay:
+            tutorial_overlay.click()
+            utils.random_micro_sleep()
+
+        self.ui_state.tutorial_dismissed = True
         return True
 
     def get_main_ui_elements(self, use_instrumental, use_custom_mode):
@@ -194,8 +258,140 @@ class ScrapeSong:
 
         return elements if all(elements.values()) else None
 
-    def fetch_song(self, start_time, create_song_elements, song_creation_data, downloads_dir, main_text_field, use_instrumental, use_custom_mode):
-        """Create a song based on the song creation data."""
+    def get_main_text_field(self, create_song_elements, use_instrumental, use_custom_mode):
+        """The text field that gets clicked to close the song menus in the current creation mode."""
+        if not use_custom_mode:
+            return create_song_elements["song_description_field"]
+        if not use_instrumental:
+            return create_song_elements["custom_lyrics_field"]
+        return create_song_elements["custom_genre_field"]
+
+    def fetch_song(self, create_song_elements, song_creation_data, downloads_dir, main_text_field, use_instrumental, use_custom_mode):
+        """Create a song based on the song creation data. Returns the saved song output or False."""
+        generated_songs = None
+        if self.checkpoint.can_resume():
+            generated_songs = self.find_songs_by_id(self.checkpoint.get("song_ids"))
+            if generated_songs:
+                logger.info(f"Resuming the generation with {len(generated_songs)} song(s) created by a previous run.")
+                self.budget.end_phase(CONSTANTS.PHASE_SETUP)
+                self.budget.start_phase(CONSTANTS.PHASE_GENERATION)
+            else:
+                logger.warning("Could not find the songs created by a previous run. Creating new ones...")
+
+        if not generated_songs and not self.submit_song_creation(create_song_elements, song_creation_data, use_instrumental, use_custom_mode):
+            return False
+
+        generation_deadline = self.budget.deadline_for(CONSTANTS.MAX_SONG_CREATION_WAIT_TIME, self.get_phases_after(CONSTANTS.PHASE_GENERATION))
+        if generation_deadline <= time.time():
+            logger.warning("Not enough time left to wait for song creation.")
+            self.get_and_save_leftover_credit_amount()
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Not enough time left to wait for song creation.")
+            return False
+
+        finished_songs = self.pick_finished_songs(generation_deadline, generated_songs)
+        target_song = finished_songs[0] if finished_songs else None
+        if not target_song:
+            logger.warning("Could not find a song before the song creation deadline.")
+            if self.page_recycled:
+                # The elements found before the Create page was reloaded are stale
+                create_song_elements = self.get_main_ui_elements(use_instrumental, use_custom_mode)
+                main_text_field = self.get_main_text_field(create_song_elements, use_instrumental, use_custom_mode) if create_song_elements else None
+            if not main_text_field or not self.delete_invalid_songs(main_text_field):
+                logger.warning("Could not delete created songs before exiting.")
+            return False
+
+        self.budget.end_phase(CONSTANTS.PHASE_GENERATION)
+        self.budget.start_phase(CONSTANTS.PHASE_METADATA)
+
+        # Supabase updates and the upload run in the background while the driver keeps working
+        self.post_generation = PostGenerationStage(self.supabase, self.checkpoint)
+        
+        suno_song_title, suno_song_genre = self.get_song_title_and_genre(target_song)
+        if not suno_song_title or not suno_song_genre:
+            logger.warning("Exiting because I couldn't fetch the song title or genre.")
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Exiting because I couldn't fetch the song title or genre.")
+            return False
+        
+        logger.info(f"The target song title is '{suno_song_title}' and the song genre is '{suno_song_genre}'.")
+
+        get_leftover_credit_result = self.get_and_save_leftover_credit_amount(self.post_generation)
+        if not get_leftover_credit_result:
+            logger.warning("Failed to get the leftover Suno credits and save them on Supabase.")
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Failed to get the leftover Suno credits and save them on Supabase.")
+            return False
+
+        self.budget.end_phase(CONSTANTS.PHASE_METADATA)
+
+        if not self.budget.can_afford(self.get_phases_after(CONSTANTS.PHASE_METADATA)):
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Did not have any more time after fetching the song title and genre.")
+            return False
+
+        logger.info("Trying to download the song...")
+        self.budget.start_phase(CONSTANTS.PHASE_DOWNLOAD)
+        download_deadline = self.budget.deadline_for(CONSTANTS.MAX_SONG_DOWNLOAD_WAIT_TIME, self.get_phases_after(CONSTANTS.PHASE_DOWNLOAD))
+        downloaded_song_path = self.download_song_audio(target_song, downloads_dir, download_deadline)
+        if not downloaded_song_path:
+            logger.warning("Could not download the song.")
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not download the song.")
+            return False
+
+        self.budget.end_phase(CONSTANTS.PHASE_DOWNLOAD)
+        logger.info(f"Successfully downloaded the song and stored it at {downloaded_song_path}.")
+
+        self.post_generation.start_upload(downloaded_song_path)
+
+        fixed_song_lyrics = None
+        if use_instrumental: fixed_song_lyrics = "[Instrumental]"
+        elif use_custom_mode: fixed_song_lyrics = song_creation_data["song_input_custom_lyrics"]
+
+        # Harvest the other songs of the generation before the lyrics fallback can navigate away from the Create page
+        extra_songs = []
+        if os.getenv("HARVEST_ALL_SONGS", str(CONSTANTS.HARVEST_ALL_SONGS)).lower() == "true":
+            for extra_song in finished_songs[1:]:
+                extra_song_output = self.harvest_extra_song(extra_song, downloads_dir, fixed_song_lyrics)
+                if extra_song_output:
+                    extra_songs.append(extra_song_output)
+
+        self.checkpoint.record(CONSTANTS.CHECKPOINT_DOWNLOADED)
+
+        suno_song_lyrics = ""
+        if fixed_song_lyrics is None:
+            if not self.budget.can_afford(self.get_phases_after(CONSTANTS.PHASE_DOWNLOAD)):
+                ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Did not have any more time to fetch the lyrics after downloading the song.")
+                return False
+
+            self.budget.start_phase(CONSTANTS.PHASE_LYRICS)
+            suno_song_lyrics = self.fetch_lyrics(target_song)
+            if not suno_song_lyrics:
+                logger.warning("Exiting early because the song lyrics are invalid or couldn't be found.")
+                ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Exiting early because the song lyrics are invalid or couldn't be found.")
+                return False
+
+            self.budget.end_phase(CONSTANTS.PHASE_LYRICS)
+        else:
+            suno_song_lyrics = fixed_song_lyrics
+
+        logger.debug("The song lyrics are:\n\n" + str(suno_song_lyrics) + "\n")
+
+        self.budget.start_phase(CONSTANTS.PHASE_UPLOAD)
+        output_song = self.post_generation.finish([
+            self.create_song_output(suno_song_title, suno_song_genre, suno_song_lyrics, downloaded_song_path, target_song)
+        ] + extra_songs)
+        if not output_song:
+            logger.warning("Could not save the song data on Supabase.")
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not save the song data on Supabase.")
+            return False
+
+        self.budget.end_phase(CONSTANTS.PHASE_UPLOAD)
+
+        return {
+            "output_song": output_song,
+            "song_output_title": suno_song_title,
+            "song_output_genre": suno_song_genre
+        }
+
+    def submit_song_creation(self, create_song_elements, song_creation_data, use_instrumental, use_custom_mode):
+        """Pick the model, enter the song details and click Create."""
         picked_correct_model = False
 
         for _ in range(3):
@@ -209,7 +405,7 @@ class ScrapeSong:
             ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not pick the desired Suno model.")
             return False
 
-        print("SCRAPE_SONG: Trying to start the song creation process...")
+        logger.info("Trying to start the song creation process...")
         if not use_custom_mode:
             create_song_elements["song_description_field"].click()
             utils.random_micro_sleep()
@@ -238,109 +434,87 @@ class ScrapeSong:
             create_song_elements["custom_title_field"].send_keys(song_creation_data["song_input_custom_title"])
             utils.random_micro_sleep()
 
-        if not self.still_have_time(start_time):
-            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Did not have any more time after entering the song description.")
+        self.budget.end_phase(CONSTANTS.PHASE_SETUP)
+
+        # Clicking Create spends credits, so only do it if the rest of the pipeline is expected to fit
+        if not self.budget.can_afford(self.post_creation_phases):
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Not enough time left to generate, download and save a song after entering the song description.")
             return False
 
         create_song_elements["create_action_button"].click()
+        self.budget.start_phase(CONSTANTS.PHASE_GENERATION)
+        self.checkpoint.record(CONSTANTS.CHECKPOINT_SUBMITTED, song_ids=[], submitted_at=int(time.time()))
 
-        print("SCRAPE_SONG: Waiting for the songs to initialize...")
+        logger.info("Waiting for the songs to initialize...")
         utils.sleep_custom(CONSTANTS.TIME_SLEPT_WHILE_SONGS_INITIALIZE)
         song_list = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_CREATE_SONG_LIST)
         if not song_list:
             utils.random_normal_sleep()
             song_list = self.find_one_in_page(By.XPATH, CONSTANTS.SUNO_CREATE_SONG_LIST)
         if not song_list:
-            print("SCRAPE_SONG: Could not find the song list after sending a song generation request.")
+            logger.warning("Could not find the song list after sending a song generation request.")
             self.get_and_save_leftover_credit_amount()
             ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not find the song list after sending a song generation request.")
             return False
 
-        target_song = None
-        if self.still_have_time(start_time - CONSTANTS.MAX_SONG_CREATION_WAIT_TIME):
-            target_song = self.pick_first_finished_song()
-        else:
-            print("SCRAPE_SONG: Not enough time left to wait for song creation.")
-            self.get_and_save_leftover_credit_amount()
-            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Not enough time left to wait for song creation.")
-            return False
-
-        if not target_song:
-            print(f"SCRAPE_SONG: Could not find a song even after waiting for {CONSTANTS.MAX_SONG_CREATION_WAIT_TIME} seconds.")
-            if not self.delete_invalid_songs(main_text_field):
-                print("SCRAPE_SONG: Could not delete created songs before exiting.")
-            return False
-        
-        suno_song_title, suno_song_genre = self.get_song_title_and_genre(target_song)
-        if not suno_song_title or not suno_song_genre:
-            print("SCRAPE_SONG: Exiting because I couldn't fetch the song title or genre.")
-            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Exiting because I couldn't fetch the song title or genre.")
-            return False
-        
-        print(f"SCRAPE_SONG: The target song title is '{suno_song_title}' and the song genre is '{suno_song_genre}'.")
+        return True
 
-        get_leftover_credit_result = self.get_and_save_leftover_credit_amount()
-        if not get_leftover_credit_result:
-            print("SCRAPE_SONG: Failed to get the leftover Suno credits and save them on Supabase.")
-            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Failed to get the leftover Suno credits and save them on Supabase.")
-            return False
+    def harvest_extra_song(self, song, downloads_dir, fixed_song_lyrics):
+        """Download and get the metadata of another finished song from the same generation. Returns the song output or None."""
+        if not self.budget.can_afford([CONSTANTS.PHASE_DOWNLOAD] + self.get_phases_after(CONSTANTS.PHASE_DOWNLOAD)):
+            logger.info("Not enough time left to harvest another song from this generation.")
+            return None
 
-        if not self.still_have_time(start_time):
-            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Did not have any more time after fetching the song title and genre.")
-            return False
+        song_title, song_genre = self.get_song_title_and_genre(song)
+        if not song_title or not song_genre:
+            logger.warning("Skipping an extra song because I couldn't fetch its title or genre.")
+            return None
 
-        print("SCRAPE_SONG: Trying to download the song...")
-        downloaded_song_path = self.download_song_audio(target_song, downloads_dir)
+        download_deadline = self.budget.deadline_for(CONSTANTS.MAX_SONG_DOWNLOAD_WAIT_TIME, self.get_phases_after(CONSTANTS.PHASE_DOWNLOAD))
+        downloaded_song_path = self.download_song_audio(song, downloads_dir, download_deadline)
         if not downloaded_song_path:
-            print("SCRAPE_SONG: Could not download the song.")
-            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not download the song.")
-            return False
-
-        print(f"SCRAPE_SONG: Successfully downloaded the song and stored it at {downloaded_song_path}.")
-
-        suno_song_lyrics = ""
-        if not use_instrumental and not use_custom_mode:
-            if not self.go_to_song_details_screen(target_song):
-                print(f"SCRAPE_SONG: Have to abort given that I'm not on the song details page.")
-                ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Have to abort given that I'm not on the song details page.")
-                return False
-            
-            print("SCRAPE_SONG: Landed on the song details page.")
-
-            if not self.still_have_time(start_time):
-                ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Did not have any more time after landing on the song details page.")
-                return False
-
-            suno_song_lyrics = self.get_lyrics()
-            if not suno_song_lyrics:
-                print("SCRAPE_SONG: Exiting early because the song lyrics are invalid or couldn't be found.")
-                ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Exiting early because the song lyrics are invalid or couldn't be found.")
-                return False
-        else:
-            if use_instrumental: suno_song_lyrics = "[Instrumental]"
-            else: suno_song_lyrics = song_creation_data["song_input_custom_lyrics"]
+            logger.warning("Skipping an extra song because I couldn't download it.")
+            return None
 
-        print("SCRAPE_SONG: The song lyrics are:\n\n" + str(suno_song_lyrics) + "\n")
+        self.post_generation.start_upload(downloaded_song_path)
 
-        if not self.supabase.save_song_data(suno_song_title, suno_song_genre, suno_song_lyrics, downloaded_song_path):
-            print("SCRAPE_SONG: Could not save the song data on Supabase.")
-            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not save the song data on Supabase.")
-            return False
+        song_lyrics = fixed_song_lyrics
+        if song_lyrics is None:
+            song_id = self.get_song_id(song)
+            song_lyrics = (self.song_feed.get_lyrics(song_id) or self.get_lyrics_in_page(song_id)) if song_id else None
+            if not song_lyrics:
+                logger.warning("Skipping an extra song because I couldn't fetch its lyrics.")
+                return None
 
-        return True
+        logger.info(f"Harvested the extra song '{song_title}' stored at {downloaded_song_path}.")
+        return self.create_song_output(song_title, song_genre, song_lyrics, downloaded_song_path, song)
+
+    def create_song_output(self, song_title, song_genre, song_lyrics, downloaded_song_path, song):
+        """Group the data of a song that has to be saved on Supabase."""
+        return {
+            "title": song_title,
+            "genre": song_genre,
+            "lyrics": song_lyrics,
+            "downloaded_song_path": downloaded_song_path,
+            "suno_song_id": self.get_song_id(song)
+        }
     
     def dismiss_entire_custom_mode_intro_flow(self):
         """Click on the right buttons to dismiss the popups you get when you first try custom mode."""
+        if self.ui_state.custom_mode_intro_dismissed:
+            return True
+
         dismissed_custom_mode_get_started_popup = self.dismiss_get_started_custom_mode()
         if not dismissed_custom_mode_get_started_popup:
-            print("SCRAPE_SONG: Could not dismiss the custom mode get started popup.")
+            logger.warning("Could not dismiss the custom mode get started popup.")
             return False
         
         accept_custom_mode_terms = self.accept_custom_mode_terms()
         if not accept_custom_mode_terms:
-            print("SCRAPE_SONG: Could not accept the custom mode terms.")
+            logger.warning("Could not accept the custom mode terms.")
             return False
         
+        self.ui_state.custom_mode_intro_dismissed = True
         return True
 
     def dismiss_get_started_custom_mode(self):
@@ -388,14 +562,21 @@ class ScrapeSong:
 
     def pick_suno_model(self, current_model_span):
         """Pick the desired Suno model."""
-        if current_model_span.text == CONSTANTS.SUNO_DESIRED_MODELS[0]:
+        # The cached model is only a hint, since Suno can switch the model between jobs of the same browser session
+        current_model = current_model_span.text
+        if current_model == CONSTANTS.SUNO_DESIRED_MODELS[0]:
+            self.ui_state.model = current_model
             return True
-        
-        print("SCRAPE_SUNO: Trying to pick the desired Suno model...")
+
+        if self.ui_state.model == CONSTANTS.SUNO_DESIRED_MODELS[0]:
+            logger.info(f"The Create page switched to the {current_model} Suno model since it was last read.")
+        self.ui_state.model = current_model or None
+
+        logger.info("Trying to pick the desired Suno model...")
 
         dismiss_custom_mode_intro_flow = self.dismiss_entire_custom_mode_intro_flow()
         if not dismiss_custom_mode_intro_flow:
-            print("SCRAPE_SONG: Could not dismiss the custom mode intro flow.")
+            logger.warning("Could not dismiss the custom mode intro flow.")
             return False
 
         current_model_span.click()
@@ -403,23 +584,27 @@ class ScrapeSong:
 
         suno_model_options = self.find_many_in_page(By.XPATH, CONSTANTS.SUNO_MODEL_LIST_VERSION_DIV)
         if not suno_model_options:
-            print("SCRAPE_SONG: Could not find the array of Suno models.")
+            logger.warning("Could not find the array of Suno models.")
             return False
 
         for desired_model in CONSTANTS.SUNO_DESIRED_MODELS:
             for option in suno_model_options:
                 if desired_model == option.text:
-                    print(f"SCRAPE_SONG: Selecting the {desired_model} Suno model...")
+                    logger.info(f"Selecting the {desired_model} Suno model...")
                     option.click()
                     utils.random_micro_sleep()
+                    self.ui_state.model = desired_model
                     return True
 
-        print("SCRAPE_SONG: None of the desired Suno models were found.")
+        logger.warning("None of the desired Suno models were found.")
         return False
 
-    def pick_first_finished_song(self):
-        """Pick the first finished song from the list."""
-        print("SCRAPE_SONG: Waiting for songs to generate and picking the first finished one...")
+    def pick_finished_songs(self, deadline, generated_songs=None):
+        """Wait at most until the deadline for the songs to finish and return the valid ones, longest first."""
+        logger.info("Waiting for songs to generate and picking the finished ones...")
+        if generated_songs:
+            return self.wait_for_finished_songs(generated_songs, deadline)
+
         all_songs = self.find_many_in_page(By.XPATH, CONSTANTS.SUNO_SONG_ELEMENT)
         if not all_songs:
             utils.random_short_sleep()
@@ -437,48 +622,103 @@ class ScrapeSong:
                 unfinished_songs = [song for song in all_songs if not self.get_song_duration(self.find_element_in_element(song, By.XPATH, "." + CONSTANTS.SONG_DURATION_SPAN))]
             
         if not 0 < len(unfinished_songs) <= CONSTANTS.SUNO_MAX_SONGS_PER_GENERATION:
-            print(f"SCRAPE_SONG: Invalid number of unfinished songs: {len(unfinished_songs)}")
+            logger.warning(f"Invalid number of unfinished songs: {len(unfinished_songs)}")
             ErrorLogging().save_generation_error_and_send_email(f"SCRAPER - SCRAPE_SONG: Invalid number of unfinished songs: {len(unfinished_songs)}.")
             return None
         
-        print(f"SCRAPE_SONG: The length of the unfinished_songs array is {len(unfinished_songs)}.")
+        logger.info(f"The length of the unfinished_songs array is {len(unfinished_songs)}.")
+
+        song_ids = [self.get_song_id(song) for song in unfinished_songs]
+        if all(song_ids):
+            self.checkpoint.record(CONSTANTS.CHECKPOINT_SONGS_IDENTIFIED, song_ids=song_ids)
+
+        return self.wait_for_finished_songs(unfinished_songs, deadline)
 
-        max_duration = 0
-        target_song = None
+    def wait_for_finished_songs(self, unfinished_songs, deadline):
+        """Wait at most until the deadline for the given songs to finish and return the valid ones, longest first."""
+        song_durations = {}
+        song_ids = [self.get_song_id(song) for song in unfinished_songs]
 
         start_time = time.time()
-        end_time = start_time + CONSTANTS.MAX_SONG_CREATION_WAIT_TIME
 
         all_songs_done_generating = True
 
-        while time.time() < end_time:
+        while time.time() < deadline:
+            # Waiting for the songs is the safest moment to recycle a bloated renderer, since the rows can be found again by id
+            if self.driver.resource_monitor and self.driver.resource_monitor.needs_recycle():
+                unfinished_songs = self.recycle_create_page(song_ids) or unfinished_songs
+
             all_songs_done_generating = True
-            for song in unfinished_songs:
-                song_duration_span = self.find_element_in_element(song, By.XPATH, "." + CONSTANTS.SONG_DURATION_SPAN)
+            self.song_feed.poll()
+            for index, song in enumerate(unfinished_songs):
+                # Prefer the song feed and only read the song row when the feed doesn't know the song yet
+                song_finished = self.song_feed.is_finished(song_ids[index])
+                if song_finished == False:
+                    continue
+                elif song_finished is None and self.song_feed.get_clip(song_ids[index]):
+                    all_songs_done_generating = False
+                    continue
+
+                song_duration_seconds = self.song_feed.get_duration(song_ids[index])
+                if song_duration_seconds:
+                    if song_duration_seconds >= CONSTANTS.MIN_SONG_LENGTH:
+                        song_durations[index] = song_duration_seconds
+                    continue
+
+                try:
+                    song_duration_span = self.find_element_in_element(song, By.XPATH, "." + CONSTANTS.SONG_DURATION_SPAN)
+                except StaleElementReferenceException:
+                    song_duration_span = None
+
                 if not song_duration_span:
                     all_songs_done_generating = False
                     continue
 
                 song_duration_seconds = self.get_song_duration(song_duration_span)
-                if song_duration_seconds and song_duration_seconds > max_duration and song_duration_seconds >= CONSTANTS.MIN_SONG_LENGTH:
-                    max_duration = song_duration_seconds
-                    target_song = song
+                if song_duration_seconds and song_duration_seconds >= CONSTANTS.MIN_SONG_LENGTH:
+                    song_durations[index] = song_duration_seconds
                 elif not song_duration_seconds:
                     all_songs_done_generating = False
 
-            print(f"SCRAPE_SONG: Max song duration is {max_duration}.")
+            logger.info(f"Max song duration is {max(song_durations.values(), default=0)}.", extra={"sample_key": "wait_for_finished_songs"})
 
             if all_songs_done_generating:
                 break
 
             utils.sleep_custom(CONSTANTS.SONG_CREATION_SLEEP_TIME)
 
-        if target_song and max_duration > 0:
-            print(f"SCRAPE_SONG: Picked a song that's {max_duration} seconds in length. Took {time.time() - start_time} seconds to find the song.")
+        finished_songs = [unfinished_songs[index] for index in sorted(song_durations, key=song_durations.get, reverse=True)]
+
+        if finished_songs:
+            logger.info(f"Found {len(finished_songs)} finished song(s), the longest one is {max(song_durations.values())} seconds in length. Took {time.time() - start_time} seconds to find the songs.")
         else:
             ErrorLogging().save_generation_error_and_send_email(f"SCRAPER - SCRAPE_SONG: Did not find a suitable song.")
 
-        return target_song
+        return finished_songs
+
+    def recycle_create_page(self, song_ids):
+        """Reload the Create page to free the renderer's memory and find the song rows again. Returns the new rows or None."""
+        logger.warning("Chrome is using too much memory. Reloading the Create page...")
+        self.driver.resource_monitor.recycled()
+
+        # Any element or cached page state from before the reload describes the old page
+        self.page_recycled = True
+        self.ui_state.reset()
+
+        try:
+            self.driver.refresh()
+            WebDriverWait(self.driver, CONSTANTS.PAGE_LOAD_RETRY_SESSION).until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+        except Exception as e:
+            logger.warning(f"Could not reload the Create page. Details: {e}")
+            return None
+
+        utils.random_short_sleep()
+        songs = self.find_songs_by_id(song_ids) if all(song_ids) else None
+        if not songs or len(songs) != len(song_ids):
+            logger.warning("Could not find every song again after reloading the Create page.")
+            return None
+
+        return songs
 
     def get_song_duration(self, song_duration_span):
         """Get the duration of a song in seconds."""
@@ -493,7 +733,7 @@ class ScrapeSong:
                self.is_valid_time_format(duration):
                 return self.time_to_seconds(duration)
         except Exception as e:
-            print(f"SCRAPE_SONG: Got an error while trying to get a song duration: {e}")
+            logger.warning(f"Got an error while trying to get a song duration: {e}")
         return None
 
     def get_song_title_and_genre(self, target_song):
@@ -501,6 +741,10 @@ class ScrapeSong:
         if not target_song:
             return (None, None)
 
+        song_title, song_genre = self.song_feed.get_title_and_genre(self.get_song_id(target_song))
+        if song_title and song_genre:
+            return (song_title, song_genre)
+
         try:
             title_span = self.find_element_in_element(target_song, By.XPATH, "." + CONSTANTS.CREATE_SCREEN_SONG_TITLE_SPAN)
             genre_a = self.find_element_in_element(target_song, By.XPATH, "." + CONSTANTS.CREATE_SCREEN_SONG_GENRE)
@@ -511,9 +755,132 @@ class ScrapeSong:
     
             return (title_span.text, genre_a.text)
         except Exception as e:
-            print(f"SCRAPE_SONG: Could not fetch the title and/or the genre of the target song. Details: {e}")
+            logger.warning(f"Could not fetch the title and/or the genre of the target song. Details: {e}")
             return (None, None)
 
+    def fetch_lyrics(self, target_song):
+        """Get the lyrics of a song, preferably without leaving the Create page."""
+        song_id = self.get_song_id(target_song)
+        song_lyrics = self.song_feed.get_lyrics(song_id)
+        if song_lyrics:
+            logger.info("Got the song lyrics from the song feed.")
+            return song_lyrics
+
+        if os.getenv("LYRICS_RETRIEVAL_MODE", CONSTANTS.LYRICS_RETRIEVAL_MODE) == CONSTANTS.LYRICS_RETRIEVAL_IN_PAGE:
+            song_lyrics = self.get_lyrics_in_page(song_id) if song_id else None
+            if song_lyrics:
+                logger.info("Got the song lyrics without leaving the Create page.")
+                return song_lyrics
+
+            logger.warning("Could not get the lyrics from the Create page. Going to the song details page instead...")
+
+        if not self.go_to_song_details_screen(target_song):
+            logger.warning("Have to abort given that I'm not on the song details page.")
+            return None
+
+        logger.info("Landed on the song details page.")
+
+        if self.budget.remaining() <= 0:
+            logger.warning("Did not have any more time after landing on the song details page.")
+            return None
+
+        return self.get_lyrics()
+
+    def find_songs_by_id(self, song_ids):
+        """Find the rows of the given songs in the song list."""
+        songs = self.find_many_in_page(By.XPATH, CONSTANTS.SUNO_SONG_ELEMENT)
+        if not songs or not song_ids:
+            return None
+
+        songs_by_id = {self.get_song_id(song): song for song in songs}
+        return [songs_by_id[song_id] for song_id in song_ids if song_id in songs_by_id] or None
+
+    def save_checkpointed_songs(self):
+        """Save the data of the songs that a previous run already uploaded."""
+        songs = self.checkpoint.get("songs")
+        if not songs:
+            logger.info("The checkpoint doesn't have any uploaded songs.")
+            return False
+
+        main_song = songs[0]
+        # The commit also clears the error message left by the run that failed after uploading the songs
+        output_song = self.supabase.commit_song_output(main_song["title"], main_song["genre"], main_song["lyrics"], main_song["song"], songs[1:])
+        if not output_song:
+            logger.warning("Could not save the checkpointed song data on Supabase.")
+            ErrorLogging().save_error_and_send_email("SCRAPER - SCRAPE_SONG: Could not save the checkpointed song data on Supabase.")
+            return False
+
+        self.checkpoint.record(CONSTANTS.CHECKPOINT_SAVED)
+        return {
+            "output_song": output_song,
+            "song_output_title": main_song["title"],
+            "song_output_genre": main_song["genre"]
+        }
+
+    def get_song_id(self, target_song):
+        """Get the Suno ID of a song from the link to its details page."""
+        if not target_song:
+            return None
+
+        try:
+            song_link = self.find_element_in_element(target_song, By.XPATH, "." + CONSTANTS.SONG_ROW_DETAILS_LINK)
+            song_href = song_link.get_attribute("href") if song_link else None
+            if not song_href or "/song/" not in song_href:
+                logger.warning("Could not find the link to the song details page.")
+                return None
+
+            return song_href.split("/song/")[1].split("?")[0].strip("/")
+        except Exception as e:
+            logger.warning(f"Could not get the song ID. Details: {e}")
+            return None
+
+    def get_lyrics_in_page(self, song_id):
+        """Fetch the song details page in the background from the Create page and extract the lyrics from it."""
+        try:
+            song_page = utils.execute_async_script_with_timeout(self.driver, CONSTANTS.LYRICS_FETCH_TIMEOUT + CONSTANTS.MICRO_MAX_SECONDS_TO_WAIT, """
+                const done = arguments[arguments.length - 1];
+                const controller = new AbortController();
+                setTimeout(() => controller.abort(), arguments[1] * 1000);
+                fetch(arguments[0], {credentials: 'include', signal: controller.signal})
+                    .then(response => response.ok ? response.text() : null)
+                    .then(done)
+                    .catch(() => done(null));
+            """, CONSTANTS.SONG_DETAILS_URL + song_id, CONSTANTS.LYRICS_FETCH_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not fetch the song details page in the background. Details: {e}")
+            return None
+
+        if not song_page:
+            return None
+
+        return self.extract_lyrics_from_song_page(song_page)
+
+    def extract_lyrics_from_song_page(self, song_page):
+        """Extract the lyrics from the HTML of a song details page."""
+        soup = BeautifulSoup(song_page, 'html.parser')
+        for lyrics_text_area in soup.select("section textarea"):
+            song_lyrics = lyrics_text_area.get_text()
+            if song_lyrics and len(song_lyrics) >= CONSTANTS.MIN_LYRICS_LENGTH:
+                return song_lyrics
+
+        # The lyrics are also part of the serialized page data as the song prompt
+        try:
+            page_data = "".join(json.loads(chunk) for chunk in re.findall(CONSTANTS.SONG_PAGE_DATA_PATTERN, song_page))
+        except ValueError:
+            page_data = ""
+
+        for serialized_lyrics in re.findall(CONSTANTS.SONG_PAGE_LYRICS_PATTERN, page_data):
+            try:
+                song_lyrics = json.loads(serialized_lyrics)
+            except ValueError:
+                continue
+
+            if song_lyrics and len(song_lyrics) >= CONSTANTS.MIN_LYRICS_LENGTH:
+                return song_lyrics
+
+        logger.warning("Could not find the lyrics in the song details page.")
+        return None
+
     def get_lyrics(self):
         """Get the lyrics of a song."""
         if not self.driver.current_url.startswith(CONSTANTS.SONG_DETAILS_URL):
@@ -521,12 +888,12 @@ class ScrapeSong:
 
         lyrics_text_area = self.find_one_in_page(By.XPATH, CONSTANTS.SONG_SCREEN_LYRICS_TEXT_AREA)
         if not lyrics_text_area or not self.driver.current_url.startswith(CONSTANTS.SONG_DETAILS_URL):
-            print("SCRAPE_SONG: Could not find the lyrics text area.")
+            logger.warning("Could not find the lyrics text area.")
             return None
         
         song_lyrics = lyrics_text_area.text
         if not song_lyrics or len(song_lyrics) < CONSTANTS.MIN_LYRICS_LENGTH:
-            print("SCRAPE_SONG: Invalid song lyrics.")
+            logger.warning("Invalid song lyrics.")
             return None
         
         return song_lyrics
@@ -534,40 +901,40 @@ class ScrapeSong:
     def go_to_song_details_screen(self, target_song, max_retries=5):
         """Navigate to the song details screen with retries and full page load check."""
         if not target_song:
-            print("SCRAPE_SONG: Null target song provided to go_to_song_details_screen.")
+            logger.warning("Null target song provided to go_to_song_details_screen.")
             return False
         
         try:
             title_span = self.find_element_in_element(target_song, By.XPATH, "." + CONSTANTS.CREATE_SCREEN_SONG_TITLE_SPAN)
             if not title_span:
-                print("SCRAPE_SONG: Could not find the target song's title span.")
+                logger.warning("Could not find the target song's title span.")
                 return False
             
-            print("SCRAPE_SONG: Clicking on the song title span...")
+            logger.info("Clicking on the song title span...")
             title_span.click()
             utils.random_micro_sleep()
         except Exception as e:
-            print(f"SCRAPE_SONG: Could not click on the song title to go to the details page. Details: {e}")
+            logger.warning(f"Could not click on the song title to go to the details page. Details: {e}")
             return False
 
         for attempt in range(max_retries):
             try:                
                 # Wait for the page to load
                 if self.wait_for_page_load():
-                    print("SCRAPE_SONG: Loading the song detail page worked")
+                    logger.info("Loading the song detail page worked")
                     if self.driver.current_url.startswith(CONSTANTS.SONG_DETAILS_URL):
-                        print("SCRAPE_SONG: The page URL is correct!")
+                        logger.info("The page URL is correct!")
                         return True
-                    print("SCRAPE_SONG: The page URL is incorrect")
+                    logger.warning("The page URL is incorrect")
                     return False
                 
-                print(f"SCRAPE_SONG: Attempt {attempt + 1} failed. Reloading page...")
+                logger.warning(f"Attempt {attempt + 1} failed. Reloading page...")
                 self.driver.refresh()
                 utils.random_short_sleep()
             except Exception as e:
-                print(f"SCRAPE_SONG: Error during attempt {attempt + 1}. Details: {e}")
+                logger.warning(f"Error during attempt {attempt + 1}. Details: {e}")
     
-        print(f"SCRAPE_SONG: Failed to go to song details after {max_retries} attempts.")
+        logger.warning(f"Failed to go to song details after {max_retries} attempts.")
         return False
 
     def wait_for_page_load(self, timeout=CONSTANTS.TIME_SLEPT_STEP_GOING_TO_SONG_DETAILS):
@@ -577,27 +944,32 @@ class ScrapeSong:
             WebDriverWait(self.driver, timeout).until(
                 lambda d: d.execute_script('return document.readyState') == 'complete'
             )
+            self.driver.performance_log.poll_if_due()
             
             return True
         except TimeoutException:
             return False
 
-    def download_song_audio(self, target_song, downloads_dir):
-        """Download the audio of a song."""
+    def download_song_audio(self, target_song, downloads_dir, deadline):
+        """Download the audio of a song, waiting at most until the deadline for the file to land."""
         if not target_song: 
-            print("SCRAPE_SONG: Null target song passed to the download method.")
+            logger.warning("Null target song passed to the download method.")
             return None
         menu_toggle = self.find_element_in_element(target_song, By.XPATH, "." + CONSTANTS.SONG_MENU_TOGGLE_BUTTON)
         if not menu_toggle:
-            print("SCRAPE_SONG: Could not find the target song menu toggle inside the download method.")
+            logger.warning("Could not find the target song menu toggle inside the download method.")
             return None
         
+        # Songs downloaded earlier in this job stay in the directory, so only a new file counts
+        known_files = set(os.listdir(downloads_dir)) if os.path.isdir(downloads_dir) else set()
+        known_downloads = self.driver.download_tracker.started_downloads() if self.driver.download_tracker else set()
+
         menu_toggle.click()
         utils.random_short_sleep()
 
         download_option = self.find_one_in_page(By.XPATH, CONSTANTS.SONG_DOWNLOAD_BUTTON)
         if not download_option:
-            print("SCRAPE_SONG: Could not find the download button for the song.")
+            logger.warning("Could not find the download button for the song.")
             return None
         
         download_option.click()
@@ -605,7 +977,7 @@ class ScrapeSong:
 
         audio_option = self.find_one_in_page(By.XPATH, CONSTANTS.SONG_MP3_DOWNLOAD_OPTION)
         if not audio_option:
-            print("SCRAPE_SONG: Found too many or not enough audio download options for the song.")
+            logger.warning("Found too many or not enough audio download options for the song.")
             return None
 
         # Focus on the audio option div
@@ -616,31 +988,54 @@ class ScrapeSong:
         audio_option.send_keys(Keys.ENTER)
         utils.random_short_sleep()
 
-        # Wait for the download to end
-        end_time = time.time() + CONSTANTS.MAX_SONG_DOWNLOAD_WAIT_TIME
-        while time.time() < end_time:
-            downloaded_song_path = self.get_song_name_from_directory(downloads_dir)
-            if downloaded_song_path == None:
-                return None
-            elif downloaded_song_path == False:
-                utils.sleep_custom(CONSTANTS.SONG_DOWNLOAD_STEP_WAIT_TIME)
-            else:
-                return os.path.join(downloads_dir, downloaded_song_path)
+        if self.driver.download_tracker:
+            downloaded_song_path = self.driver.download_tracker.wait_for_download(known_downloads, known_files, deadline)
+            if downloaded_song_path is not False:
+                return downloaded_song_path
+            logger.warning("Falling back to polling the downloads dir...")
+
+        # Wait for the download to end, waking up as soon as a file lands in the downloads dir
+        download_dir_watcher = DownloadDirWatcher(downloads_dir)
+        try:
+            while time.time() < deadline:
+                downloaded_song_path = self.get_song_name_from_directory(downloads_dir, known_files)
+                if downloaded_song_path == None:
+                    return None
+                elif downloaded_song_path == False:
+                    download_dir_watcher.wait(max(0, min(CONSTANTS.SONG_DOWNLOAD_STEP_WAIT_TIME, deadline - time.time())))
+                else:
+                    return os.path.join(downloads_dir, downloaded_song_path)
+        finally:
+            download_dir_watcher.close()
 
         return None
 
-    def get_and_save_leftover_credit_amount(self):
-        """Fetch and save the remaining credit amount."""
-        print("SCRAPE_SONG: Fetching and saving the latest number of credits...")
+    def get_and_save_leftover_credit_amount(self, post_generation=None):
+        """Fetch and save the remaining credit amount. The save runs in the background if a post generation stage is passed."""
+        logger.info("Fetching and saving the latest number of credits...")
         remaining_credits_number = self.get_leftover_credit_amount()
         if not remaining_credits_number:
-            print(f"SCRAPE_SONG: Got an error fetching the credits number for {os.getenv('PHONE_NUMBER')}.")
+            logger.warning(f"Got an error fetching the credits number for {os.getenv('PHONE_NUMBER')}.")
             return False
-        
+
+        if post_generation:
+            # The credits are saved along with the song output, in the same transaction
+            post_generation.set_remaining_credits(remaining_credits_number)
+            post_generation.submit(self.warn_if_low_credit_balance, remaining_credits_number)
+            return True
+
+        return self.save_leftover_credit_amount(remaining_credits_number)
+
+    def warn_if_low_credit_balance(self, remaining_credits_number):
         if int(remaining_credits_number) <= CONSTANTS.MIN_SUNO_CREDIT_BALANCE:
             ErrorLogging().send_email("SCRAPER - SCRAPE_SONG: This account's Suno credit balance is at or below the minimum. Please top up the account soon.")
+        return True
+
+    def save_leftover_credit_amount(self, remaining_credits_number):
+        """Save the remaining credit amount and warn if the balance is low."""
+        self.warn_if_low_credit_balance(remaining_credits_number)
 
-        print(f"SCRAPE_SONG: Saving the latest number of credits for {os.getenv('PHONE_NUMBER')} in the scraper_stats table...")
+        logger.info(f"Saving the latest number of credits for {os.getenv('PHONE_NUMBER')} in the scraper_stats table...")
         self.supabase.update_credit_number(remaining_credits_number)
         return True
 
@@ -653,7 +1048,7 @@ class ScrapeSong:
             
             return self.extract_credit_number(leftover_credits_span.text)
         except Exception as e:
-            print(f"SCRAPE_SONG: {e}")
+            logger.warning(f"Could not read the leftover credits. Details: {e}")
             return None
 
     def delete_invalid_songs(self, text_field):
@@ -668,7 +1063,7 @@ class ScrapeSong:
             if not self.get_song_duration(song_duration_span):
                 menu_toggle = self.find_element_in_element(song, By.XPATH, "." + CONSTANTS.SONG_MENU_TOGGLE_BUTTON)
                 if not menu_toggle:
-                    print("SCRAPE_SONG: Could not find a song's menu toggle.")
+                    logger.warning("Could not find a song's menu toggle.")
                     return False
                 song_menu_toggles.append(menu_toggle)
         
@@ -678,7 +1073,7 @@ class ScrapeSong:
         deleted_songs = 0
         for menu_toggle in song_menu_toggles:
             if deleted_songs >= CONSTANTS.MAX_SONGS_TO_DELETE: 
-                print("SCRAPE_SONG: There are too many songs to delete.")
+                logger.warning("There are too many songs to delete.")
                 return False
             
             menu_toggle.click()
@@ -686,12 +1081,12 @@ class ScrapeSong:
 
             song_options_menu = self.find_one_in_page(By.XPATH, CONSTANTS.SONG_OPTIONS_MENU)
             if not song_options_menu:
-                print("SCRAPE_SONG: Couldn't find a song's menu so that I can delete it.")
+                logger.warning("Couldn't find a song's menu so that I can delete it.")
                 return False
 
             song_delete_button = self.find_element_in_element(song_options_menu, By.XPATH, "." + CONSTANTS.SONG_AUDIO_DELETE)
             if not song_delete_button:
-                print("SCRAPE_SONG: Couldn't find a song's delete button.")
+                logger.warning("Couldn't find a song's delete button.")
                 return False
             
             song_delete_button.click()
@@ -702,10 +1097,6 @@ class ScrapeSong:
 
         return True
 
-    def still_have_time(self, start_time):
-        """Check if there's still time left in the scraping process."""
-        return int(time.time()) - start_time < int(os.getenv('MAX_RUNTIME', CONSTANTS.RUNTIME_ERROR_MARGIN)) - CONSTANTS.RUNTIME_ERROR_MARGIN
-
     def is_valid_time_format(self, time_string):
         """Check if the time string is in a valid format."""
         pattern = r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$'
@@ -744,31 +1135,33 @@ class ScrapeSong:
         else:
             raise ValueError("SCRAPE_SONG: No valid credits number found.")
         
-    def get_song_name_from_directory(self, directory_path):
-        """Get the name of the downloaded song from the directory."""
+    def get_song_name_from_directory(self, directory_path, known_files=()):
+        """Get the name of the downloaded song from the directory, ignoring the files that were there before the download."""
         if not os.path.isdir(directory_path):
-            print(f"SCRAPE_SONG: The song downloads directory {directory_path} does not exist.")
+            logger.warning(f"The song downloads directory {directory_path} does not exist.")
             return None
 
-        files = [item for item in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, item))]
+        # A .crdownload file is a download still in progress, which Chrome renames once it completes
+        files = [item for item in os.listdir(directory_path)
+                 if item not in known_files and not item.endswith(".crdownload") and os.path.isfile(os.path.join(directory_path, item))]
 
         if len(files) == 1:
-            print("SCRAPE_SONG: Found a file in the song downloads dir. Checking its extension...")
+            logger.info("Found a file in the song downloads dir. Checking its extension...")
 
             file_path = os.path.join(directory_path, files[0])
             file_extension = os.path.splitext(file_path)[1].lower()
 
             if file_extension in CONSTANTS.ACCEPTED_SONG_FILE_TYPES:
-                print(f"SCRAPE_SONG: The downloaded song has a valid extension.")
+                logger.info(f"The downloaded song has a valid extension.")
                 return files[0]
             
-            print("SCRAPE_SONG: The downloaded song has an invalid extension.")
+            logger.warning("The downloaded song has an invalid extension.")
             return None
         elif len(files) == 0:
-            print("SCRAPE_SONG: The song downloads directory is empty.")
+            logger.info("The song downloads directory is empty.", extra={"sample_key": "get_song_name_from_directory"})
             return False
         else:
-            print(f"SCRAPE_SONG: There are too many files in the song downloads dir.")
+            logger.warning(f"There are too many files in the song downloads dir.")
             return None
     
     def time_to_seconds(self, time_str):
@@ -778,15 +1171,29 @@ class ScrapeSong:
 
     def find_one_in_page(self, by_method, identifier):
         """Find a single element on the page."""
+        self.driver.performance_log.poll_if_due()
+        locator_name = self.locators.get_name(identifier) if by_method == By.XPATH else None
+        if locator_name:
+            return self.locators.find(locator_name, single=True)
+
         elements = self.driver.find_elements(by_method, identifier)
         return elements[0] if len(elements) == 1 else None
     
     def find_element_in_element(self, ui_element, by_method, identifier):
         """Find a single element within another element."""
+        locator_name = self.locators.get_name(identifier[1:]) if by_method == By.XPATH and identifier.startswith(".") else None
+        if locator_name:
+            return self.locators.find(locator_name, single=True, within=ui_element)
+
         elements = ui_element.find_elements(by_method, identifier)
         return elements[0] if len(elements) == 1 else None
     
     def find_many_in_page(self, by_method, identifier):
         """Find multiple elements on the page."""
+        self.driver.performance_log.poll_if_due()
+        locator_name = self.locators.get_name(identifier) if by_method == By.XPATH else None
+        if locator_name:
+            return self.locators.find(locator_name, single=False)
+
         elements = self.driver.find_elements(by_method, identifier)
         return elements if len(elements) > 0 else None
\ No newline at end of file
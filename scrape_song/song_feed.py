@@ -0,0 +1,132 @@
+import json
+import base64
+import fnmatch
+import constants as CONSTANTS
+from metrics.metrics import get_metrics
+from structured_logging.structured_logging import get_logger
+
+logger = get_logger("SONG_FEED")
+
+class SongFeed:
+    """Collects the song data (status, duration, title, tags, lyrics) from the Suno API responses the Create page already downloads."""
+
+    def __init__(self, driver, performance_log):
+        self.driver = driver
+        self.performance_log = performance_log
+        self.pending_responses = {}
+        self.clips = {}
+        self.listeners = []
+
+        self.keep_response_bodies()
+        performance_log.add_listener(self.on_network_event, [
+            "Network.responseReceived",
+            "Network.loadingFinished",
+            "Network.loadingFailed"
+        ])
+
+    def add_listener(self, listener):
+        """Call listener(clip) every time the data of a song is updated."""
+        self.listeners.append(listener)
+
+    def keep_response_bodies(self):
+        """Raise Chrome's network buffers so that the feed responses are still there when their loadingFinished event is read."""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {
+                "maxResourceBufferSize": CONSTANTS.SONG_FEED_RESOURCE_BUFFER_SIZE,
+                "maxTotalBufferSize": CONSTANTS.SONG_FEED_TOTAL_BUFFER_SIZE
+            })
+        except Exception as e:
+            logger.warning(f"Could not raise Chrome's network buffers, some song feed responses may be evicted. Details: {e}")
+
+    def on_network_event(self, method, params):
+        request_id = params.get("requestId")
+
+        if method == "Network.responseReceived":
+            url = params.get("response", {}).get("url", "")
+            if any(fnmatch.fnmatch(url, pattern) for pattern in CONSTANTS.SONG_FEED_URL_PATTERNS):
+                self.pending_responses[request_id] = url
+        elif request_id in self.pending_responses:
+            url = self.pending_responses.pop(request_id)
+            if method == "Network.loadingFinished":
+                # The body can only be read once the response finished loading, so read it right away before Chrome evicts it
+                self.read_response(request_id, url)
+            else:
+                logger.warning(f"The song feed response from {url} failed to load: {params.get('errorText')}.")
+                get_metrics().increment("SongFeedResponses", Outcome="failed")
+
+    def read_response(self, request_id, url):
+        try:
+            response = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            body = response.get("body", "")
+            if response.get("base64Encoded"):
+                body = base64.b64decode(body).decode("utf-8")
+            data = json.loads(body)
+        except Exception as e:
+            # The songs are then only followed through the page, so make the missed responses visible
+            logger.warning(f"Could not read the song feed response from {url}, falling back to the page. Details: {e}")
+            get_metrics().increment("SongFeedResponses", Outcome="failed")
+            return
+
+        get_metrics().increment("SongFeedResponses", Outcome="read")
+
+        for clip in self.find_clips(data):
+            self.clips[clip["id"]] = {**self.clips.get(clip["id"], {}), **clip}
+            for listener in self.listeners:
+                listener(self.clips[clip["id"]])
+
+    def find_clips(self, data):
+        """The feed, clip and generate endpoints nest the songs differently, so look for every object that looks like a song."""
+        if isinstance(data, dict):
+            if data.get("id") and "status" in data:
+                return [data]
+            return [clip for value in data.values() for clip in self.find_clips(value)]
+        elif isinstance(data, list):
+            return [clip for value in data for clip in self.find_clips(value)]
+        return []
+
+    def poll(self):
+        """Read the responses received since the last poll."""
+        self.performance_log.poll()
+
+    def get_clip(self, song_id):
+        return self.clips.get(song_id) if song_id else None
+
+    def is_finished(self, song_id):
+        """True if the song finished generating, False if it failed, None if it's still generating or unknown."""
+        clip = self.get_clip(song_id)
+        if not clip:
+            return None
+        if clip.get("status") == CONSTANTS.SONG_FEED_ERROR_STATUS:
+            return False
+        if clip.get("status") == CONSTANTS.SONG_FEED_COMPLETE_STATUS:
+            return True
+        return None
+
+    def get_duration(self, song_id):
+        """Duration in seconds of a finished song."""
+        if not self.is_finished(song_id):
+            return None
+
+        duration = (self.get_clip(song_id).get("metadata") or {}).get("duration")
+        return int(duration) if isinstance(duration, (int, float)) and duration > 0 else None
+
+    def get_title_and_genre(self, song_id):
+        clip = self.get_clip(song_id)
+        if not clip:
+            return (None, None)
+
+        title = clip.get("title")
+        genre = (clip.get("metadata") or {}).get("tags")
+        if not title or not genre:
+            return (None, None)
+        return (title, genre)
+
+    def get_lyrics(self, song_id):
+        clip = self.get_clip(song_id)
+        if not clip:
+            return None
+
+        song_lyrics = (clip.get("metadata") or {}).get("prompt")
+        if not song_lyrics or len(song_lyrics) < CONSTANTS.MIN_LYRICS_LENGTH:
+            return None
+        return song_lyrics
@@ -0,0 +1,68 @@
+import json
+import utils.utils as utils
+import constants as CONSTANTS
+
+class SunoApi:
+    """Calls Suno's API from the page context, authenticated with the session token of the logged in account."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def call(self, method, path, body=None):
+        """Send a request to the Suno API. Returns the decoded JSON response or None."""
+        try:
+            response = utils.execute_async_script_with_timeout(self.driver, CONSTANTS.SUNO_API_TIMEOUT + CONSTANTS.MICRO_MAX_SECONDS_TO_WAIT, """
+                const [url, method, body, timeout, done] = arguments;
+                const controller = new AbortController();
+                setTimeout(() => controller.abort(), timeout * 1000);
+                (async () => {
+                    const token = await window.Clerk.session.getToken();
+                    const response = await fetch(url, {
+                        method: method,
+                        headers: {"Authorization": "Bearer " + token, "Content-Type": "application/json"},
+                        body: body,
+                        signal: controller.signal
+                    });
+                    done({status: response.status, body: await response.text()});
+                })().catch(error => done({status: 0, body: String(error)}));
+            """, CONSTANTS.SUNO_API_BASE_URL + path, method, json.dumps(body) if body is not None else None, CONSTANTS.SUNO_API_TIMEOUT)
+        except Exception as e:
+            print(f"SUNO_API: Could not call {path}. Details: {e}")
+            return None
+
+        if not response or not 200 <= response["status"] < 300:
+            print(f"SUNO_API: {path} failed with the status {response['status'] if response else None}: {response['body'][:200] if response else ''}")
+            return None
+
+        try:
+            return json.loads(response["body"]) if response["body"] else {}
+        except ValueError:
+            print(f"SUNO_API: {path} did not return JSON.")
+            return None
+
+    def list_library(self):
+        """Every song in the account's library. Returns None if a page couldn't be fetched."""
+        songs = []
+        for page in range(CONSTANTS.LIBRARY_MAX_PAGES):
+            response = self.call("GET", CONSTANTS.SUNO_LIBRARY_API_PATH.format(page=page))
+            if response is None:
+                return None
+
+            page_songs = response.get("clips", []) if isinstance(response, dict) else response
+            if not page_songs:
+                break
+            songs += page_songs
+
+        return songs
+
+    def trash_songs(self, song_ids):
+        """Move songs to the trash in batches. Returns the number of songs trashed."""
+        trashed_songs = 0
+        for index in range(0, len(song_ids), CONSTANTS.LIBRARY_CLEANUP_BATCH_SIZE):
+            batch = song_ids[index:index + CONSTANTS.LIBRARY_CLEANUP_BATCH_SIZE]
+            if self.call("POST", CONSTANTS.SUNO_TRASH_API_PATH, {"trash": True, "clip_ids": batch}) is None:
+                print(f"SUNO_API: Could not trash a batch of {len(batch)} songs.")
+                continue
+            trashed_songs += len(batch)
+
+        return trashed_songs
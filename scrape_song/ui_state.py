@@ -0,0 +1,60 @@
+import constants as CONSTANTS
+
+class CreatePageState:
+    """What the Create page currently shows (mode toggles, model, onboarding), read in a single snapshot and kept for the browser session."""
+
+    def __init__(self):
+        self.reset()
+        self.toggles = 0
+        self.toggle_seconds = 0.0
+
+    def reset(self):
+        """Forget what was read on the page, e.g. after it was loaded again. The toggle timings are kept."""
+        self.instrumental = None
+        self.custom_mode = None
+        self.model = None
+        self.tutorial_dismissed = False
+        self.custom_mode_intro_dismissed = False
+
+    def record_toggle(self, seconds):
+        """Add the measured duration of a mode toggle."""
+        self.toggles += 1
+        self.toggle_seconds += seconds
+
+    def refresh(self, driver):
+        """Read the state of the page in one script call. Returns False if the mode toggles couldn't be read."""
+        locators = []
+        for name in CONSTANTS.UI_STATE_SNAPSHOT_LOCATORS:
+            strategy = CONSTANTS.LOCATOR_STRATEGIES[name][0]
+            locators.append([name, strategy[1], strategy[2] if strategy[0] == "css_text" else None])
+
+        try:
+            snapshot = driver.execute_script("""
+                const counts = {};
+                for (const [name, selector, text] of arguments[0]) {
+                    counts[name] = Array.from(document.querySelectorAll(selector))
+                        .filter(element => !text || element.textContent.toLowerCase().includes(text)).length;
+                }
+                const model = document.querySelector(arguments[1]);
+                return {counts: counts, model: model ? model.textContent.trim() : null};
+            """, locators, CONSTANTS.LOCATOR_STRATEGIES["SUNO_MODEL_VERSION_SPAN"][0][1])
+        except Exception as e:
+            print(f"UI_STATE: Could not read the state of the Create page. Details: {e}")
+            return False
+
+        counts = snapshot["counts"]
+        self.instrumental = self.get_toggle_state(counts, "SUNO_INSTRUMENTAL_ENABLED_BUTTON", "SUNO_INSTRUMENTAL_DISABLED_BUTTON")
+        self.custom_mode = self.get_toggle_state(counts, "SUNO_CUSTOM_SONG_ENABLED_BUTTON", "SUNO_CUSTOM_SONG_DISABLED_BUTTON")
+        self.model = snapshot["model"] or None
+        if counts["SUNO_TUTORIAL_OVERLAY"] == 0:
+            self.tutorial_dismissed = True
+
+        print(f"UI_STATE: Instrumental is {self.instrumental}, custom mode is {self.custom_mode} and the model is {self.model}.")
+        return self.instrumental is not None and self.custom_mode is not None
+
+    def get_toggle_state(self, counts, enabled_name, disabled_name):
+        if counts[enabled_name] == 1 and counts[disabled_name] == 0:
+            return True
+        if counts[enabled_name] == 0 and counts[disabled_name] == 1:
+            return False
+        return None
@@ -0,0 +1,160 @@
+import os
+import re
+import sys
+import json
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from logging.handlers import QueueHandler, QueueListener
+
+PRINT_LINE_PATTERN = re.compile(r"^([A-Z][A-Z_]+): (.*)$", re.DOTALL)
+RUN_ID = os.getenv("RUN_ID") or uuid.uuid4().hex[:12]
+
+logging_lock = threading.Lock()
+logging_listener = None
+
+class ContextFilter(logging.Filter):
+    """Adds the run, generation and phone number to a record in the thread that logged it, since a worker changes them between jobs."""
+
+    def filter(self, record):
+        record.run_id = RUN_ID
+        record.generation_id = os.getenv("GENERATION_ID")
+        record.phone_number = os.getenv("PHONE_NUMBER")
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps the first record and then one out of every `rate` records logged with the same sample_key, e.g. from a polling loop."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, rate)
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        sample_key = getattr(record, "sample_key", None)
+        if not sample_key:
+            return True
+
+        with self.lock:
+            count = self.counts.get(sample_key, 0)
+            self.counts[sample_key] = count + 1
+
+        return count % self.rate == 0
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, which CloudWatch Logs Insights can query without parsing patterns."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": round(record.created, 3),
+            "level": record.levelname,
+            "module": record.name.split(".")[-1].upper(),
+            "message": record.getMessage(),
+            "run_id": getattr(record, "run_id", RUN_ID),
+            "generation_id": getattr(record, "generation_id", None),
+            "phone_number": getattr(record, "phone_number", None)
+        }
+        for field in getattr(record, "fields", None) or {}:
+            entry[field] = record.fields[field]
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class PlainFormatter(logging.Formatter):
+    """The MODULE: message lines the scraper always printed."""
+
+    def format(self, record):
+        return f"{record.name.split('.')[-1].upper()}: {record.getMessage()}"
+
+class PrintBridge:
+    """
+    Stands in for stdout and turns every printed "MODULE: message" into an INFO record,
+    so that the remaining print calls go through the queue, the formatting and the level control too.
+    Code that logs at another level, or from a loop that needs sampling, calls the logger of its module instead.
+    A print call ends with its newline, so the text written before it (even over several lines) becomes a single record.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.buffers, "text", "") + text
+        if buffer.endswith("\n"):
+            self.buffers.text = ""
+            if buffer.strip():
+                self.log_line(buffer.rstrip("\n"))
+        else:
+            self.buffers.text = buffer
+        return len(text)
+
+    def log_line(self, line):
+        match = PRINT_LINE_PATTERN.match(line)
+        module, message = (match.group(1), match.group(2)) if match else ("STDOUT", line)
+        get_logger(module).info(message)
+
+    def flush(self):
+        buffer = getattr(self.buffers, "text", "")
+        if buffer.strip():
+            self.buffers.text = ""
+            self.log_line(buffer)
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def get_logger(module):
+    """The logger of a module, e.g. get_logger("SCRAPE_SONG")."""
+    return logging.getLogger(f"{CONSTANTS.LOGGER_NAME}.{module.lower()}")
+
+def setup_logging():
+    """
+    Route the scraper logs through a queue to a background thread that formats and writes them, so logging never blocks the scraping thread.
+    LOG_FORMAT picks JSON lines or the plain MODULE: message lines, and LOG_LEVEL drops the records below it.
+    """
+    global logging_listener
+    load_dotenv()
+
+    with logging_lock:
+        if logging_listener:
+            return logging_listener
+
+        log_format = os.getenv("LOG_FORMAT", CONSTANTS.LOG_FORMAT)
+        stream_handler = logging.StreamHandler(sys.__stdout__)
+        stream_handler.setFormatter(JsonFormatter() if log_format == CONSTANTS.LOG_FORMAT_JSON else PlainFormatter())
+
+        # Unbounded, so that a slow stdout never makes the scraping thread wait
+        log_queue = queue.Queue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        queue_handler.addFilter(SamplingFilter(int(os.getenv("LOG_SAMPLE_RATE", CONSTANTS.LOG_SAMPLE_RATE))))
+
+        logger = logging.getLogger(CONSTANTS.LOGGER_NAME)
+        logger.setLevel(os.getenv("LOG_LEVEL", CONSTANTS.LOG_LEVEL).upper())
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+        logging_listener = QueueListener(log_queue, stream_handler)
+        logging_listener.start()
+        sys.stdout = PrintBridge(sys.stdout)
+        atexit.register(stop_logging)
+        return logging_listener
+
+def stop_logging():
+    """Write the records still in the queue and give stdout back."""
+    global logging_listener
+    with logging_lock:
+        if not logging_listener:
+            return
+
+        if isinstance(sys.stdout, PrintBridge):
+            sys.stdout.flush()
+            sys.stdout = sys.stdout.stream
+
+        logging_listener.stop()
+        logging_listener = None
@@ -0,0 +1,117 @@
+import constants as CONSTANTS
+from types import SimpleNamespace
+
+class FakeQuery:
+    """The part of the PostgREST query builder used by db/supabase.py, run against in-memory rows."""
+
+    def __init__(self, client, table_name):
+        self.client = client
+        self.rows = client.tables.setdefault(table_name, [])
+        self.operation = "select"
+        self.values = None
+        self.filters = []
+        self.max_rows = None
+
+    def select(self, columns="*"):
+        return self
+
+    def update(self, values):
+        self.operation, self.values = "update", values
+        return self
+
+    def insert(self, values):
+        self.operation, self.values = "insert", values
+        return self
+
+    def upsert(self, values, on_conflict=None):
+        self.operation, self.values = "upsert", values
+        self.conflict_columns = [column.strip() for column in (on_conflict or "").split(",") if column.strip()]
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: self.get_value(row, column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: self.get_value(row, column) != value)
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(lambda row: self.get_value(row, column) is None)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: self.get_value(row, column) in values)
+        return self
+
+    def limit(self, max_rows):
+        self.max_rows = max_rows
+        return self
+
+    def get_value(self, row, column):
+        if "->>" in column:
+            column, field = column.split("->>")
+            return (row.get(column) or {}).get(field)
+        return row.get(column)
+
+    def execute(self):
+        matching_rows = [row for row in self.rows if all(row_filter(row) for row_filter in self.filters)]
+
+        if self.operation == "update":
+            for row in matching_rows:
+                row.update(self.values)
+        elif self.operation == "insert":
+            new_rows = self.values if isinstance(self.values, list) else [self.values]
+            self.rows.extend(dict(row) for row in new_rows)
+            matching_rows = new_rows
+        elif self.operation == "upsert":
+            new_rows = self.values if isinstance(self.values, list) else [self.values]
+            for new_row in new_rows:
+                existing_row = next((row for row in self.rows if all(row.get(column) == new_row.get(column) for column in self.conflict_columns)), None)
+                if existing_row and self.conflict_columns:
+                    existing_row.update(new_row)
+                else:
+                    self.rows.append(dict(new_row))
+            matching_rows = new_rows
+        elif self.operation == "delete":
+            for row in matching_rows:
+                self.rows.remove(row)
+
+        self.client.requests.append((self.operation, self.values))
+        return SimpleNamespace(data=[dict(row) for row in matching_rows[:self.max_rows]])
+
+class FakeRpc:
+    def __init__(self, client, function_name, params):
+        self.client = client
+        self.function_name = function_name
+        self.params = params
+
+    def execute(self):
+        self.client.requests.append(("rpc", self.function_name))
+        if self.function_name not in self.client.functions:
+            raise Exception({"code": CONSTANTS.POSTGREST_MISSING_FUNCTION_CODE, "message": f"Could not find the function {self.function_name}"})
+        return SimpleNamespace(data=self.client.functions[self.function_name](self.client, self.params))
+
+class FakeSupabaseClient:
+    """An in-memory stand-in for the Supabase client. Database functions are Python callables registered in functions."""
+
+    def __init__(self, tables=None, functions=None):
+        self.tables = tables or {}
+        self.functions = functions or {}
+        self.requests = []
+
+    def table(self, table_name):
+        return FakeQuery(self, table_name)
+
+    def rpc(self, function_name, params):
+        return FakeRpc(self, function_name, params)
+
+def use_fake_client(supabase, client, monkeypatch):
+    """Make a db.supabase.Supabase instance talk to the fake client."""
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", "test-secret")
+    monkeypatch.setattr(supabase, "get_supabase_client", lambda token: client)
+    return supabase
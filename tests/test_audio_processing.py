@@ -0,0 +1,65 @@
+import wave
+import struct
+import pytest
+from audio.audio_processing import probe_audio, parse_mp3_frame_header
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo: 144 * 128000 / 44100 = 417 bytes per frame
+FRAME_HEADER = b"\xff\xfb\x90\x00"
+FRAME_LENGTH = 417
+
+def make_frame(payload=b""):
+    return FRAME_HEADER + payload + b"\x00" * (FRAME_LENGTH - len(FRAME_HEADER) - len(payload))
+
+def make_id3_tag(size):
+    # The tag size is syncsafe: 7 bits per byte. Cover art can hold bytes that look like a frame sync.
+    syncsafe_size = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe_size + (b"\xff\xfb\x90\x00" * size)[:size]
+
+def test_frame_header_is_parsed():
+    frame = parse_mp3_frame_header(FRAME_HEADER)
+
+    assert frame == {"version": 3, "bitrate": 128, "sample_rate": 44100, "samples_per_frame": 1152, "channels": 2, "length": FRAME_LENGTH}
+
+@pytest.mark.parametrize("header", [b"\xff\xfb\x90", b"\x00\xfb\x90\x00", b"\xff\xfd\x90\x00", b"\xff\xfb\xf0\x00", b"\xff\xfb\x9c\x00"])
+def test_other_bytes_are_not_frame_headers(header):
+    # Too short, no sync, Layer II, a bad bitrate and a reserved sample rate
+    assert parse_mp3_frame_header(header) is None
+
+def test_cbr_duration_comes_from_the_bitrate(tmp_path):
+    song_path = tmp_path / "song.mp3"
+    song_path.write_bytes(make_frame() * 100)
+
+    probe = probe_audio(str(song_path))
+
+    assert probe["format"] == "mp3"
+    assert probe["duration"] == pytest.approx(100 * FRAME_LENGTH * 8 / 128000)
+    assert (probe["sample_rate"], probe["channels"], probe["bitrate"]) == (44100, 2, 128)
+
+def test_xing_frame_count_gives_the_vbr_duration_after_an_id3_tag(tmp_path):
+    # The Xing header follows the 32 bytes of side information of a stereo MPEG-1 frame
+    xing_frame = make_frame(b"\x00" * 32 + b"Xing" + struct.pack(">II", 0x1, 1000))
+    song_path = tmp_path / "song.mp3"
+    song_path.write_bytes(make_id3_tag(4096) + xing_frame + make_frame() * 10)
+
+    probe = probe_audio(str(song_path))
+
+    assert probe["duration"] == pytest.approx(1000 * 1152 / 44100)
+
+def test_wav_duration_comes_from_the_frame_count(tmp_path):
+    song_path = tmp_path / "song.wav"
+    with wave.open(str(song_path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(8000)
+        wav_file.writeframes(b"\x00\x00" * 12000)
+
+    assert probe_audio(str(song_path)) == {"format": "wav", "duration": 1.5, "sample_rate": 8000, "channels": 1, "sample_width": 2}
+
+def test_files_without_audio_frames_are_rejected(tmp_path):
+    truncated_path = tmp_path / "truncated.mp3"
+    truncated_path.write_bytes(b"<html>Access denied</html>" + FRAME_HEADER)
+    broken_wav_path = tmp_path / "broken.wav"
+    broken_wav_path.write_bytes(b"RIFF")
+
+    assert probe_audio(str(truncated_path)) is None
+    assert probe_audio(str(broken_wav_path)) is None
@@ -0,0 +1,76 @@
+import json
+import pytest
+import constants as CONSTANTS
+from db.supabase import Supabase
+from checkpoint.checkpoint import GenerationCheckpoint, is_resumable_checkpoint, get_pending_song_ids
+from fake_supabase import FakeSupabaseClient, use_fake_client
+
+def make_checkpoint(phase, phone_number="+100", song_ids=("first", "second")):
+    return {"phase": phase, "phone_number": phone_number, "song_ids": list(song_ids)}
+
+@pytest.mark.parametrize("phase", [CONSTANTS.CHECKPOINT_SONGS_IDENTIFIED, CONSTANTS.CHECKPOINT_DOWNLOADED, CONSTANTS.CHECKPOINT_UPLOADED])
+def test_checkpoints_with_identified_songs_are_resumable(phase):
+    assert is_resumable_checkpoint(make_checkpoint(phase), "+100")
+
+@pytest.mark.parametrize("checkpoint", [
+    None,
+    {},
+    make_checkpoint(CONSTANTS.CHECKPOINT_SUBMITTED),
+    make_checkpoint(CONSTANTS.CHECKPOINT_SAVED),
+    make_checkpoint("unknown"),
+    make_checkpoint(CONSTANTS.CHECKPOINT_DOWNLOADED, song_ids=()),
+    make_checkpoint(CONSTANTS.CHECKPOINT_DOWNLOADED, phone_number="+200")
+])
+def test_other_checkpoints_are_not_resumable(checkpoint):
+    assert not is_resumable_checkpoint(checkpoint, "+100")
+
+def test_local_checkpoint_is_resumed_by_a_rerun_of_the_same_account(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHECKPOINT_BACKEND", CONSTANTS.CHECKPOINT_BACKEND_LOCAL)
+    monkeypatch.setenv("CHECKPOINTS_DIR_PATH", str(tmp_path))
+    monkeypatch.setenv("GENERATION_ID", "generation")
+    monkeypatch.setenv("PHONE_NUMBER", "+100")
+
+    first_run = GenerationCheckpoint(supabase=None)
+    assert first_run.record(CONSTANTS.CHECKPOINT_SUBMITTED)
+    assert not GenerationCheckpoint(supabase=None).can_resume()
+    assert first_run.record(CONSTANTS.CHECKPOINT_SONGS_IDENTIFIED, song_ids=["first", "second"])
+
+    rerun = GenerationCheckpoint(supabase=None)
+    assert rerun.can_resume()
+    assert rerun.reached(CONSTANTS.CHECKPOINT_SUBMITTED) and not rerun.reached(CONSTANTS.CHECKPOINT_DOWNLOADED)
+
+    monkeypatch.setenv("PHONE_NUMBER", "+200")
+    assert not GenerationCheckpoint(supabase=None).can_resume()
+
+def test_pending_song_ids_of_local_checkpoints(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHECKPOINT_BACKEND", CONSTANTS.CHECKPOINT_BACKEND_LOCAL)
+    monkeypatch.setenv("CHECKPOINTS_DIR_PATH", str(tmp_path))
+    checkpoints = {
+        "pending": make_checkpoint(CONSTANTS.CHECKPOINT_DOWNLOADED, song_ids=["first", "second"]),
+        "saved": make_checkpoint(CONSTANTS.CHECKPOINT_SAVED, song_ids=["third"]),
+        "other_account": make_checkpoint(CONSTANTS.CHECKPOINT_DOWNLOADED, phone_number="+200", song_ids=["fourth"]),
+        "submitted": {"phase": CONSTANTS.CHECKPOINT_SUBMITTED, "phone_number": "+100"}
+    }
+    for generation_id, checkpoint in checkpoints.items():
+        (tmp_path / f"{generation_id}.json").write_text(json.dumps(checkpoint))
+
+    assert get_pending_song_ids(None, "+100") == {"first", "second"}
+
+def test_pending_song_ids_of_supabase_checkpoints(monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_BACKEND", CONSTANTS.CHECKPOINT_BACKEND_SUPABASE)
+    client = FakeSupabaseClient(tables={CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE: [
+        {"generation_id": "pending", "scrape_checkpoint": make_checkpoint(CONSTANTS.CHECKPOINT_UPLOADED, song_ids=["first"])},
+        {"generation_id": "saved", "scrape_checkpoint": make_checkpoint(CONSTANTS.CHECKPOINT_SAVED, song_ids=["second"])},
+        {"generation_id": "other_account", "scrape_checkpoint": make_checkpoint(CONSTANTS.CHECKPOINT_UPLOADED, phone_number="+200", song_ids=["third"])},
+        {"generation_id": "new", "scrape_checkpoint": None}
+    ]})
+    supabase = use_fake_client(Supabase(), client, monkeypatch)
+
+    assert get_pending_song_ids(supabase, "+100") == {"first"}
+
+def test_pending_song_ids_are_none_when_supabase_fails(monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_BACKEND", CONSTANTS.CHECKPOINT_BACKEND_SUPABASE)
+    supabase = Supabase()
+    monkeypatch.setattr(supabase, "get_pending_scrape_checkpoints", lambda phone_number: None)
+
+    assert get_pending_song_ids(supabase, "+100") is None
@@ -0,0 +1,25 @@
+import os
+import time
+import threading
+from driver.download_tracker import DownloadDirWatcher
+
+def test_watcher_wakes_up_when_a_download_is_renamed_into_the_dir(tmp_path):
+    partial_path = tmp_path / "song.mp3.crdownload"
+    partial_path.write_bytes(b"ID3")
+    watcher = DownloadDirWatcher(str(tmp_path))
+
+    # Chrome renames the partial file once the download completes
+    threading.Timer(0.2, os.rename, (partial_path, tmp_path / "song.mp3")).start()
+    started_at = time.time()
+    landed = watcher.wait(5)
+    watcher.close()
+
+    assert landed is True
+    assert time.time() - started_at < 5
+    assert (tmp_path / "song.mp3").exists()
+
+def test_watcher_times_out_without_files(tmp_path):
+    watcher = DownloadDirWatcher(str(tmp_path))
+
+    assert watcher.wait(0.1) is False
+    watcher.close()
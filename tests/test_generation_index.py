@@ -0,0 +1,42 @@
+import time
+import constants as CONSTANTS
+from generation_index.generation_index import SqliteGenerationIndex
+
+def test_claim_rejects_a_generation_in_flight():
+    generation_index = SqliteGenerationIndex(":memory:")
+
+    assert generation_index.claim("generation") == (True, CONSTANTS.GENERATION_STATE_IN_FLIGHT, None)
+    assert generation_index.claim("generation") == (False, CONSTANTS.GENERATION_STATE_IN_FLIGHT, None)
+
+def test_completed_generation_is_answered_from_the_index():
+    generation_index = SqliteGenerationIndex(":memory:")
+    generation_index.claim("generation")
+
+    assert generation_index.mark_completed("generation", {"output_song": {"song": "sha256/ab/song.mp3"}})
+    assert generation_index.claim("generation") == (False, CONSTANTS.GENERATION_STATE_COMPLETED, {"output_song": {"song": "sha256/ab/song.mp3"}})
+
+def test_released_generation_can_be_claimed_again():
+    generation_index = SqliteGenerationIndex(":memory:")
+    generation_index.claim("generation")
+
+    assert generation_index.release("generation")
+    assert generation_index.claim("generation")[0]
+
+def test_failed_generation_stays_failed():
+    generation_index = SqliteGenerationIndex(":memory:")
+    generation_index.claim("generation")
+    generation_index.mark_failed("generation", "Rejected by Supabase.")
+
+    # Releasing only drops in flight entries
+    assert generation_index.release("generation")
+    assert generation_index.claim("generation") == (False, CONSTANTS.GENERATION_STATE_FAILED, None)
+
+def test_stale_claim_of_a_killed_run_is_taken_over():
+    generation_index = SqliteGenerationIndex(":memory:")
+    generation_index.claim("generation")
+    generation_index.connection.execute(
+        "UPDATE generation_index SET updated_at = ? WHERE generation_id = ?",
+        (int(time.time()) - CONSTANTS.MAX_RUNTIME - 1, "generation")
+    )
+
+    assert generation_index.claim("generation") == (True, CONSTANTS.GENERATION_STATE_IN_FLIGHT, None)
@@ -0,0 +1,75 @@
+import time
+import constants as CONSTANTS
+from job_queue.job_queue import SqliteJobQueue
+
+def get_status(job_queue, generation_id):
+    return job_queue.connection.execute(
+        f"SELECT status, worker_id, attempts FROM {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} WHERE generation_id = ?",
+        (generation_id,)
+    ).fetchone()
+
+def expire_lease(job_queue, generation_id):
+    job_queue.connection.execute(
+        f"UPDATE {CONSTANTS.SUPABASE_GENERATION_JOBS_TABLE} SET lease_expires_at = ? WHERE generation_id = ?",
+        (time.time() - 1, generation_id)
+    )
+
+def test_claim_leases_the_oldest_job_once():
+    job_queue = SqliteJobQueue(":memory:")
+    assert job_queue.enqueue("first", max_runtime=600)
+    assert job_queue.enqueue("second", max_runtime=600)
+    assert not job_queue.enqueue("first", max_runtime=600)
+
+    job = job_queue.claim("worker-1", "+100")
+    assert job == {"generation_id": "first", "phone_number": "+100", "max_runtime": 600, "attempts": 1}
+    assert job_queue.claim("worker-2", "+100")["generation_id"] == "second"
+    assert job_queue.claim("worker-3", "+100") is None
+
+def test_claim_skips_jobs_of_other_accounts():
+    job_queue = SqliteJobQueue(":memory:")
+    job_queue.enqueue("other", phone_number="+200")
+
+    assert job_queue.claim("worker-1", "+100") is None
+    assert job_queue.claim("worker-2", "+200")["generation_id"] == "other"
+
+def test_expired_lease_goes_to_another_worker():
+    job_queue = SqliteJobQueue(":memory:")
+    job_queue.enqueue("generation")
+    job_queue.claim("worker-1", "+100")
+    assert job_queue.heartbeat("generation", "worker-1")
+
+    expire_lease(job_queue, "generation")
+    job = job_queue.claim("worker-2", "+100")
+
+    assert job["attempts"] == 2
+    assert get_status(job_queue, "generation")["worker_id"] == "worker-2"
+    # The first worker lost the lease, so it can neither extend nor acknowledge the job
+    assert not job_queue.heartbeat("generation", "worker-1")
+    assert not job_queue.complete("generation", "worker-1")
+    assert job_queue.complete("generation", "worker-2")
+    assert get_status(job_queue, "generation")["status"] == CONSTANTS.JOB_STATUS_DONE
+
+def test_expired_lease_fails_after_max_attempts():
+    job_queue = SqliteJobQueue(":memory:")
+    job_queue.enqueue("generation")
+
+    for _ in range(CONSTANTS.MAX_JOB_ATTEMPTS):
+        assert job_queue.claim("worker", "+100")
+        expire_lease(job_queue, "generation")
+
+    assert job_queue.requeue_expired() == 0
+    assert get_status(job_queue, "generation")["status"] == CONSTANTS.JOB_STATUS_FAILED
+    assert job_queue.claim("worker", "+100") is None
+
+def test_retry_requeues_until_max_attempts():
+    job_queue = SqliteJobQueue(":memory:")
+    job_queue.enqueue("generation")
+
+    for attempt in range(1, CONSTANTS.MAX_JOB_ATTEMPTS):
+        assert job_queue.claim("worker", "+100")["attempts"] == attempt
+        assert job_queue.retry("generation", "worker", "transient")
+        assert get_status(job_queue, "generation")["status"] == CONSTANTS.JOB_STATUS_PENDING
+
+    assert job_queue.claim("worker", "+100")["attempts"] == CONSTANTS.MAX_JOB_ATTEMPTS
+    assert job_queue.retry("generation", "worker", "transient")
+    assert get_status(job_queue, "generation")["status"] == CONSTANTS.JOB_STATUS_FAILED
@@ -0,0 +1,97 @@
+import pytest
+import constants as CONSTANTS
+from db.supabase import Supabase
+from locators.locators import LocatorRegistry
+from selenium.webdriver.common.by import By
+from fake_supabase import FakeSupabaseClient, use_fake_client
+
+FAST_CSS = ("css", "div[data-testid='create']")
+SLOW_CSS = ("css", "div.create")
+XPATH = "//div[contains(translate(text(), 'CREATE', 'create'), 'create')]"
+
+class FakeDriver:
+    """Answers find_elements with the elements each selector currently matches."""
+
+    def __init__(self, elements):
+        self.elements = elements
+        self.calls = []
+
+    def find_elements(self, by, selector):
+        self.calls.append((by, selector))
+        return self.elements.get(selector, [])
+
+def record_locator_lookups(client, params):
+    """The upsert of db/sql/locator_strategies.sql."""
+    rows = client.tables.setdefault(CONSTANTS.SUPABASE_LOCATOR_STRATEGIES_TABLE, [])
+    for lookup in params["p_lookups"]:
+        row = next((row for row in rows if row["locator_name"] == lookup["locator_name"] and row["strategy"] == lookup["strategy"]), None)
+        if not row:
+            row = {"locator_name": lookup["locator_name"], "strategy": lookup["strategy"], "lookups": 0, "total_seconds": 0.0, "won_at": None}
+            rows.append(row)
+        row["lookups"] += lookup["lookups"]
+        row["total_seconds"] += lookup["total_seconds"]
+        if lookup["won"] is not None:
+            row["won_at"] = f"2026-10-19T00:00:{len(client.requests):02d}" if lookup["won"] else None
+
+@pytest.fixture(autouse=True)
+def create_locator(monkeypatch, tmp_path):
+    monkeypatch.setattr(CONSTANTS, "LOCATOR_STRATEGIES", {"CREATE_BUTTON": [FAST_CSS, SLOW_CSS]})
+    monkeypatch.setattr(CONSTANTS, "CREATE_BUTTON", XPATH, raising=False)
+    monkeypatch.setenv("LOCATOR_CACHE_BACKEND", CONSTANTS.LOCATOR_CACHE_BACKEND_LOCAL)
+    monkeypatch.setenv("LOCATOR_CACHE_PATH", str(tmp_path / "locator_cache.json"))
+
+def test_missing_fast_paths_fall_through_to_the_xpath():
+    driver = FakeDriver({XPATH: ["button"]})
+    registry = LocatorRegistry(driver)
+
+    assert registry.find("CREATE_BUTTON", single=True) == "button"
+    assert driver.calls == [(By.CSS_SELECTOR, FAST_CSS[1]), (By.CSS_SELECTOR, SLOW_CSS[1]), (By.XPATH, XPATH)]
+    assert registry.winners["CREATE_BUTTON"] == f"xpath:{XPATH}"
+
+def test_winner_that_misses_is_evicted_and_the_others_are_tried():
+    driver = FakeDriver({SLOW_CSS[1]: ["button"]})
+    registry = LocatorRegistry(driver)
+    registry.winners["CREATE_BUTTON"] = registry.get_key(FAST_CSS)
+
+    assert registry.find("CREATE_BUTTON", single=True) == "button"
+    assert registry.winners["CREATE_BUTTON"] == registry.get_key(SLOW_CSS)
+
+    driver.elements = {}
+    assert registry.find("CREATE_BUTTON", single=True) is None
+    assert "CREATE_BUTTON" not in registry.winners
+    assert registry.get_strategies("CREATE_BUTTON")[0] == FAST_CSS
+
+def test_winner_is_tried_first_after_a_restart():
+    driver = FakeDriver({SLOW_CSS[1]: ["button"]})
+    registry = LocatorRegistry(driver)
+    registry.find("CREATE_BUTTON", single=True)
+    assert registry.save()
+
+    driver.calls = []
+    assert LocatorRegistry(driver).find("CREATE_BUTTON", single=True) == "button"
+    assert driver.calls == [(By.CSS_SELECTOR, SLOW_CSS[1])]
+
+def test_strategies_with_numbers_are_timed():
+    registry = LocatorRegistry(FakeDriver({}))
+    registry.record_timing("CREATE_BUTTON", registry.get_key(("css_maxlength", "textarea", 1000, None)), 0.5)
+
+    assert registry.timings["CREATE_BUTTON"]["css_maxlength:textarea:1000:None"] == {"lookups": 1, "total_seconds": 0.5}
+
+def test_winners_are_shared_through_supabase(monkeypatch):
+    monkeypatch.setenv("LOCATOR_CACHE_BACKEND", CONSTANTS.LOCATOR_CACHE_BACKEND_SUPABASE)
+    client = FakeSupabaseClient(functions={"record_locator_lookups": record_locator_lookups})
+    supabase = use_fake_client(Supabase(), client, monkeypatch)
+
+    first_task = LocatorRegistry(FakeDriver({SLOW_CSS[1]: ["button"]}), supabase=supabase)
+    first_task.find("CREATE_BUTTON", single=True)
+    assert first_task.save()
+    assert LocatorRegistry(FakeDriver({}), supabase=supabase).winners == {"CREATE_BUTTON": first_task.get_key(SLOW_CSS)}
+
+    # A later task whose winner misses evicts it for the fleet
+    second_task = LocatorRegistry(FakeDriver({}), supabase=supabase)
+    assert second_task.find("CREATE_BUTTON", single=True) is None
+    assert second_task.save()
+    assert LocatorRegistry(FakeDriver({}), supabase=supabase).winners == {}
+
+    rows = client.tables[CONSTANTS.SUPABASE_LOCATOR_STRATEGIES_TABLE]
+    assert sum(row["lookups"] for row in rows) == 5
@@ -0,0 +1,80 @@
+import io
+import json
+import httpx
+import constants as CONSTANTS
+from metrics.metrics import MetricsCollector, instrument_driver, get_metrics
+from driver.webdriver_profiler import WebDriverProfiler
+from db.supabase import Supabase
+
+def read_emf_lines(collector):
+    stream = io.StringIO()
+    lines = collector.flush(stream)
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(entries) == lines
+    return entries
+
+def test_flush_writes_counters_as_emf():
+    collector = MetricsCollector(version="1.2.3")
+    collector.increment("SongsFailed", Reason="SCRAPE_SONG")
+    collector.increment("SongsFailed", Reason="SCRAPE_SONG")
+
+    entry, = read_emf_lines(collector)
+
+    metric_directive = entry["_aws"]["CloudWatchMetrics"][0]
+    assert metric_directive["Namespace"] == CONSTANTS.METRICS_NAMESPACE
+    assert metric_directive["Dimensions"] == [["Reason", "Version"]]
+    assert metric_directive["Metrics"] == [{"Name": "SongsFailed", "Unit": "Count"}]
+    assert entry["Reason"] == "SCRAPE_SONG"
+    assert entry["Version"] == "1.2.3"
+    assert entry["SongsFailed"] == 2
+
+def test_flush_splits_histograms_into_emf_sized_chunks():
+    collector = MetricsCollector(version="1.2.3")
+    for value in range(CONSTANTS.EMF_MAX_VALUES + 50):
+        collector.observe("PhaseDuration", value, Phase="download")
+
+    entries = read_emf_lines(collector)
+
+    assert [len(entry["PhaseDuration"]) for entry in entries] == [CONSTANTS.EMF_MAX_VALUES, 50]
+    assert entries[0]["_aws"]["CloudWatchMetrics"][0]["Metrics"] == [{"Name": "PhaseDuration", "Unit": "Seconds"}]
+    assert sum(entries[0]["PhaseDuration"] + entries[1]["PhaseDuration"]) == sum(range(CONSTANTS.EMF_MAX_VALUES + 50))
+
+def test_flush_starts_over():
+    collector = MetricsCollector(version="1.2.3")
+    collector.increment("SongsCompleted")
+
+    assert len(read_emf_lines(collector)) == 1
+    assert read_emf_lines(collector) == []
+    assert collector.snapshot() == {"counters": {}, "histograms": {}}
+
+class FakeDriver:
+    def execute(self, driver_command, params=None):
+        return {"value": None}
+
+def test_instrumented_driver_feeds_metrics_and_profiler(tmp_path):
+    driver = instrument_driver(FakeDriver())
+    driver.webdriver_profiler = WebDriverProfiler(driver, str(tmp_path))
+    latency_count = len(get_metrics().get_observations("WebDriverCallLatency", Command="findElements"))
+
+    driver.execute("findElements", {"using": "css selector", "value": "div[role='grid']"})
+
+    assert len(get_metrics().get_observations("WebDriverCallLatency", Command="findElements")) == latency_count + 1
+    summary = driver.webdriver_profiler.summarize()
+    assert summary["commands"] == 1
+    call_site, = summary["call_sites"].values()
+    assert call_site["locators"] == {"css selector=div[role='grid']": 1}
+
+def test_supabase_requests_are_counted_per_round_trip(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "http://supabase.test")
+    monkeypatch.setenv("SUPABASE_ANON_KEY", "header.payload.signature")
+    client = Supabase().get_supabase_client("token")
+    client.postgrest.session._transport = httpx.MockTransport(lambda request: httpx.Response(200, json=[]))
+    request_count = get_metrics().get_counter("SupabaseRequests", Service="rest")
+    latency_count = len(get_metrics().get_observations("SupabaseRequestLatency", Service="rest"))
+
+    client.table("users").select("*").execute()
+    client.table("users").update({"user_id": "user"}).eq("user_id", "user").execute()
+    client.rpc("claim_generation_job", {}).execute()
+
+    assert get_metrics().get_counter("SupabaseRequests", Service="rest") == request_count + 3
+    assert len(get_metrics().get_observations("SupabaseRequestLatency", Service="rest")) == latency_count + 3
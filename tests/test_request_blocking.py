@@ -0,0 +1,56 @@
+import fnmatch
+import constants as CONSTANTS
+from driver.request_blocking import RequestBlocker
+
+class FakePerformanceLog:
+    def add_listener(self, listener, methods):
+        self.listener = listener
+
+class FakeDriver:
+    def __init__(self):
+        self.blocked_urls = None
+
+    def execute_cdp_cmd(self, command, params):
+        if command == "Network.setBlockedURLs":
+            self.blocked_urls = params["urls"]
+        return {}
+
+def is_blocked(url, patterns):
+    # Chrome matches the patterns against the whole URL, with * as the only wildcard
+    return any(fnmatch.fnmatchcase(url, pattern) for pattern in patterns)
+
+def test_images_and_trackers_are_blocked_with_or_without_a_query_string():
+    driver = FakeDriver()
+    assert RequestBlocker(driver, FakePerformanceLog()).enable()
+
+    assert is_blocked("https://cdn1.suno.ai/image_large.jpeg", driver.blocked_urls)
+    assert is_blocked("https://cdn1.suno.ai/image_large.webp?width=256", driver.blocked_urls)
+    assert is_blocked("https://www.googletagmanager.com/gtm.js?id=GTM-1", driver.blocked_urls)
+
+def test_song_audio_and_svg_icons_are_never_blocked():
+    driver = FakeDriver()
+    RequestBlocker(driver, FakePerformanceLog()).enable()
+
+    assert not is_blocked("https://cdn1.suno.ai/4f0b2a.mp3", driver.blocked_urls)
+    assert not is_blocked("https://cdn1.suno.ai/4f0b2a.m4a?download=true", driver.blocked_urls)
+    assert not is_blocked("https://suno.com/icons/toggle.svg", driver.blocked_urls)
+    assert not is_blocked("https://suno.com/icons/toggle.svg?v=2", driver.blocked_urls)
+
+def test_sign_in_page_keeps_its_captcha_images():
+    driver = FakeDriver()
+    blocker = RequestBlocker(driver, FakePerformanceLog())
+    blocker.enable()
+
+    assert blocker.apply_for_url(CONSTANTS.SIGN_IN_URL + "?redirect_url=create")
+    assert not is_blocked("https://captcha.example/challenge.png?id=1", driver.blocked_urls)
+    assert is_blocked("https://fonts.example/inter.woff2", driver.blocked_urls)
+
+    assert blocker.apply_for_url(CONSTANTS.BASE_URL)
+    assert is_blocked("https://captcha.example/challenge.png?id=1", driver.blocked_urls)
+
+def test_untyped_requests_are_typed_from_the_url_path():
+    blocker = RequestBlocker(FakeDriver(), FakePerformanceLog())
+
+    assert blocker.guess_request_type("https://cdn1.suno.ai/cover.PNG?width=256#top") == "Image"
+    assert blocker.guess_request_type("https://suno.com/fonts/inter.woff2") == "Font"
+    assert blocker.guess_request_type("https://studio-api.suno.ai/api/feed/?ids=a.png") == "Other"
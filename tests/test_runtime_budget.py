@@ -0,0 +1,67 @@
+import json
+import time
+import pytest
+import constants as CONSTANTS
+from db.supabase import Supabase
+from runtime_budget.runtime_budget import RuntimeBudget
+from fake_supabase import FakeSupabaseClient, use_fake_client
+
+@pytest.fixture
+def stats_path(monkeypatch, tmp_path):
+    monkeypatch.setenv("RUNTIME_STATS_BACKEND", CONSTANTS.RUNTIME_STATS_BACKEND_LOCAL)
+    return str(tmp_path / "runtime_stats.json")
+
+def make_budget(stats_path, history, max_runtime=600, start_time=None):
+    with open(stats_path, "w") as stats_file:
+        json.dump(history, stats_file)
+    return RuntimeBudget(start_time or time.time(), max_runtime=max_runtime, stats_path=stats_path)
+
+def test_phase_is_predicted_from_its_90th_percentile(stats_path):
+    budget = make_budget(stats_path, {CONSTANTS.PHASE_GENERATION: [float(duration) for duration in range(100, 0, -1)]})
+
+    # Index int(100 * 0.9) of the sorted durations 1..100
+    assert budget.predict_phase(CONSTANTS.PHASE_GENERATION) == 91
+    assert budget.predict([CONSTANTS.PHASE_GENERATION, CONSTANTS.PHASE_UPLOAD]) == 91 + CONSTANTS.DEFAULT_PHASE_DURATIONS[CONSTANTS.PHASE_UPLOAD]
+
+def test_short_history_falls_back_to_the_default(stats_path):
+    budget = make_budget(stats_path, {CONSTANTS.PHASE_DOWNLOAD: [500.0] * (CONSTANTS.RUNTIME_STATS_MIN_SAMPLES - 1)})
+
+    assert budget.predict_phase(CONSTANTS.PHASE_DOWNLOAD) == CONSTANTS.DEFAULT_PHASE_DURATIONS[CONSTANTS.PHASE_DOWNLOAD]
+
+def test_can_afford_compares_the_prediction_with_the_time_left(stats_path):
+    history = {CONSTANTS.PHASE_GENERATION: [150.0] * 10}
+    # 600 seconds minus the error margin and the 300 seconds already spent leave 200 seconds
+    budget = make_budget(stats_path, history, max_runtime=600, start_time=time.time() - 300)
+
+    assert budget.can_afford([CONSTANTS.PHASE_GENERATION])
+    assert not budget.can_afford([CONSTANTS.PHASE_GENERATION, CONSTANTS.PHASE_LYRICS, CONSTANTS.PHASE_DOWNLOAD])
+
+def test_deadline_leaves_time_for_the_reserved_phases(stats_path):
+    budget = make_budget(stats_path, {}, max_runtime=600)
+
+    deadline = budget.deadline_for(10000, [CONSTANTS.PHASE_UPLOAD])
+    assert deadline == pytest.approx(budget.end_time() - CONSTANTS.DEFAULT_PHASE_DURATIONS[CONSTANTS.PHASE_UPLOAD])
+    assert budget.deadline_for(5) <= time.time() + 5
+
+def test_unfinished_phases_are_saved_with_the_history(stats_path):
+    budget = make_budget(stats_path, {CONSTANTS.PHASE_SETUP: [20.0]})
+    budget.start_phase(CONSTANTS.PHASE_SETUP)
+    budget.end_phase(CONSTANTS.PHASE_SETUP)
+    budget.start_phase(CONSTANTS.PHASE_GENERATION)
+
+    assert budget.save()
+
+    with open(stats_path) as stats_file:
+        history = json.load(stats_file)
+    assert len(history[CONSTANTS.PHASE_SETUP]) == 2
+    assert len(history[CONSTANTS.PHASE_GENERATION]) == 1
+
+def test_history_is_read_from_supabase(monkeypatch, tmp_path):
+    monkeypatch.setenv("RUNTIME_STATS_BACKEND", CONSTANTS.RUNTIME_STATS_BACKEND_SUPABASE)
+    durations = [{"phase": CONSTANTS.PHASE_LYRICS, "duration": float(duration)} for duration in range(1, 11)]
+    client = FakeSupabaseClient(functions={"recent_runtime_phase_durations": lambda client, params: durations})
+    supabase = use_fake_client(Supabase(), client, monkeypatch)
+
+    budget = RuntimeBudget(time.time(), max_runtime=600, stats_path=str(tmp_path / "unused.json"), supabase=supabase)
+
+    assert budget.predict_phase(CONSTANTS.PHASE_LYRICS) == 10
@@ -0,0 +1,88 @@
+import json
+import base64
+from metrics.metrics import get_metrics
+from scrape_song.song_feed import SongFeed
+
+LYRICS = "[Verse]\nThe tide comes in and the tide goes out\n"
+
+class FakePerformanceLog:
+    def add_listener(self, listener, methods):
+        self.listener = listener
+
+    def poll(self):
+        pass
+
+class FakeDriver:
+    """Answers Network.getResponseBody with the bodies of the responses it was given."""
+
+    def __init__(self):
+        self.bodies = {}
+
+    def execute_cdp_cmd(self, command, params):
+        if command == "Network.getResponseBody":
+            return self.bodies[params["requestId"]]
+        return {}
+
+def deliver(feed, driver, request_id, url, data, base64_encoded=False):
+    body = json.dumps(data)
+    if base64_encoded:
+        body = base64.b64encode(body.encode("utf-8")).decode("ascii")
+    driver.bodies[request_id] = {"body": body, "base64Encoded": base64_encoded}
+    feed.on_network_event("Network.responseReceived", {"requestId": request_id, "response": {"url": url}})
+    feed.on_network_event("Network.loadingFinished", {"requestId": request_id})
+
+def make_feed():
+    driver = FakeDriver()
+    return SongFeed(driver, FakePerformanceLog()), driver
+
+def test_clips_are_found_in_every_endpoint_shape():
+    feed, driver = make_feed()
+    deliver(feed, driver, "1", "https://studio-api.suno.ai/api/generate/v2/", {"clips": [{"id": "first", "status": "submitted"}, {"id": "second", "status": "queued"}]})
+    deliver(feed, driver, "2", "https://studio-api.suno.ai/api/feed/?ids=first", [{"id": "first", "status": "streaming", "metadata": {}}])
+    deliver(feed, driver, "3", "https://studio-api.suno.ai/api/clip/second", {"id": "second", "status": "error"}, base64_encoded=True)
+
+    assert feed.get_clip("first")["status"] == "streaming"
+    assert feed.is_finished("first") is None
+    assert feed.is_finished("second") is False
+    assert feed.is_finished("unknown") is None
+
+def test_finished_clip_gives_the_song_data_and_keeps_earlier_fields():
+    feed, driver = make_feed()
+    updates = []
+    feed.add_listener(lambda clip: updates.append(clip["status"]))
+    deliver(feed, driver, "1", "https://studio-api.suno.ai/api/generate/v2/", {"clips": [{"id": "first", "status": "submitted", "title": "Tides"}]})
+    deliver(feed, driver, "2", "https://studio-api.suno.ai/api/feed/?ids=first", [
+        {"id": "first", "status": "complete", "metadata": {"duration": 187.4, "tags": "sea shanty", "prompt": LYRICS}}
+    ])
+
+    assert updates == ["submitted", "complete"]
+    assert feed.is_finished("first") is True
+    assert feed.get_duration("first") == 187
+    assert feed.get_title_and_genre("first") == ("Tides", "sea shanty")
+    assert feed.get_lyrics("first") == LYRICS
+
+def test_incomplete_song_data_is_left_to_the_page():
+    feed, driver = make_feed()
+    deliver(feed, driver, "1", "https://studio-api.suno.ai/api/feed/", [
+        {"id": "streaming", "status": "streaming", "metadata": {"duration": 30}},
+        {"id": "bare", "status": "complete", "title": "Tides", "metadata": {"duration": 0, "prompt": "Too short"}}
+    ])
+
+    assert feed.get_duration("streaming") is None
+    assert feed.get_duration("bare") is None
+    assert feed.get_title_and_genre("bare") == (None, None)
+    assert feed.get_lyrics("bare") is None
+
+def test_other_and_unreadable_responses_are_skipped():
+    feed, driver = make_feed()
+    failed_count = get_metrics().get_counter("SongFeedResponses", Outcome="failed")
+    deliver(feed, driver, "1", "https://suno.com/_next/static/chunk.js", {"id": "other", "status": "complete"})
+    driver.bodies["2"] = {"body": "<html>Bad gateway</html>", "base64Encoded": False}
+    feed.on_network_event("Network.responseReceived", {"requestId": "2", "response": {"url": "https://studio-api.suno.ai/api/feed/"}})
+    feed.on_network_event("Network.loadingFinished", {"requestId": "2"})
+    feed.on_network_event("Network.responseReceived", {"requestId": "3", "response": {"url": "https://studio-api.suno.ai/api/feed/"}})
+    feed.on_network_event("Network.loadingFailed", {"requestId": "3", "errorText": "net::ERR_ABORTED"})
+
+    assert feed.clips == {}
+    assert feed.pending_responses == {}
+    assert get_metrics().get_counter("SongFeedResponses", Outcome="failed") == failed_count + 2
@@ -0,0 +1,117 @@
+import pytest
+import constants as CONSTANTS
+from db.supabase import Supabase
+from fake_supabase import FakeSupabaseClient, use_fake_client
+
+RESUMABLE_PHASES = (CONSTANTS.CHECKPOINT_SONGS_IDENTIFIED, CONSTANTS.CHECKPOINT_DOWNLOADED, CONSTANTS.CHECKPOINT_UPLOADED)
+
+def commit_song_output(client, params):
+    """The checks and updates of db/sql/commit_song_output.sql."""
+    generation = next(row for row in client.tables[CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE] if row["generation_id"] == params["p_generation_id"])
+    if generation["output_song"] is not None:
+        if generation["output_song"]["song"] == params["p_output_song"]["song"]:
+            return generation["output_song"]
+        raise Exception("already has another song output")
+
+    checkpoint = generation["scrape_checkpoint"] or {}
+    resumable = checkpoint.get("phase") in RESUMABLE_PHASES and checkpoint.get("phone_number") == params["p_phone_number"] and bool(checkpoint.get("song_ids"))
+    if generation["user_id"] is None or generation["output_reply_id"] is None or (generation["error_message"] is not None and not resumable):
+        raise Exception("cannot receive a song output")
+
+    audio_rows = client.tables.get(CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_TABLE, [])
+    if not any(row["generation_id"] == params["p_generation_id"] and row["bucket_path"] == params["p_output_song"]["song"] for row in audio_rows):
+        raise Exception("was not uploaded")
+
+    generation.update({
+        "output_song": params["p_output_song"],
+        "song_output_title": params["p_song_title"],
+        "song_output_genre": params["p_song_genre"],
+        "song_output_lyrics": params["p_song_lyrics"],
+        "error_message": None
+    })
+    return params["p_output_song"]
+
+def make_generation(**fields):
+    return {
+        "generation_id": "generation",
+        "song_prompt": "a song about the sea",
+        "use_custom_mode": False,
+        "song_input_genre": None,
+        "use_instrumental_only": False,
+        "song_input_custom_lyrics": None,
+        "song_input_custom_title": None,
+        "error_message": None,
+        "user_id": "user",
+        "replies_guild": "guild",
+        "initial_reply_id": "initial-reply",
+        "output_song": None,
+        "output_reply_id": "output-reply",
+        "song_output_genre": None,
+        "song_output_title": None,
+        "song_output_lyrics": None,
+        "song_output_cover": None,
+        "scrape_checkpoint": None,
+        **fields
+    }
+
+def make_client(generation, functions=None, uploaded_paths=()):
+    return FakeSupabaseClient(tables={
+        CONSTANTS.SUPABASE_DISCORD_SONG_GENERATIONS_TABLE: [generation],
+        CONSTANTS.SUPABASE_USERS_TABLE: [{"user_id": "user", "platform_user_id": "discord-user"}],
+        CONSTANTS.SUPABASE_SONG_OUTPUT_AUDIO_TABLE: [{"generation_id": "generation", "sha256": "ab" * 32, "bucket_path": path} for path in uploaded_paths]
+    }, functions=functions)
+
+@pytest.fixture(autouse=True)
+def generation_env(monkeypatch):
+    monkeypatch.setenv("GENERATION_ID", "generation")
+    monkeypatch.setenv("PHONE_NUMBER", "+100")
+    monkeypatch.setenv("WRITE_BEHIND_ENABLED", "false")
+
+def test_failed_generation_with_identified_songs_is_resumed_through_to_commit(monkeypatch):
+    checkpoint = {"phase": CONSTANTS.CHECKPOINT_UPLOADED, "phone_number": "+100", "song_ids": ["first", "second"]}
+    generation = make_generation(error_message="SCRAPER - SCRAPE_SONG: Timed out.", scrape_checkpoint=checkpoint)
+    client = make_client(generation, {"commit_song_output": commit_song_output}, uploaded_paths=["sha256/ab/song.mp3"])
+    supabase = use_fake_client(Supabase(), client, monkeypatch)
+
+    assert supabase.is_valid_song_generation() is True
+    output_song = supabase.commit_song_output("Sea", "folk", "lyrics " * 10, "sha256/ab/song.mp3", remaining_credits=400)
+
+    assert output_song == {"song": "sha256/ab/song.mp3"}
+    assert generation["output_song"] == {"song": "sha256/ab/song.mp3"}
+    assert generation["error_message"] is None
+
+def test_failed_generation_without_identified_songs_is_rejected(monkeypatch):
+    checkpoint = {"phase": CONSTANTS.CHECKPOINT_SUBMITTED, "phone_number": "+100"}
+    generation = make_generation(error_message="SCRAPER - SCRAPE_SONG: Timed out.", scrape_checkpoint=checkpoint)
+    supabase = use_fake_client(Supabase(), make_client(generation, {"commit_song_output": commit_song_output}), monkeypatch)
+
+    assert supabase.is_valid_song_generation() is False
+
+def test_commit_fallback_clears_the_error_message(monkeypatch):
+    checkpoint = {"phase": CONSTANTS.CHECKPOINT_UPLOADED, "phone_number": "+100", "song_ids": ["first"]}
+    generation = make_generation(error_message="SCRAPER - SCRAPE_SONG: Timed out.", scrape_checkpoint=checkpoint)
+    client = make_client(generation, uploaded_paths=["sha256/ab/song.mp3"])
+    supabase = use_fake_client(Supabase(), client, monkeypatch)
+
+    # Without the commit_song_output function the output is saved with a plain update
+    output_song = supabase.commit_song_output("Sea", "folk", "lyrics " * 10, "sha256/ab/song.mp3")
+
+    assert output_song == {"song": "sha256/ab/song.mp3"}
+    assert ("rpc", "commit_song_output") in client.requests
+    assert generation["song_output_title"] == "Sea"
+    assert generation["error_message"] is None
+
+def test_upload_left_by_a_killed_run_is_resumed(monkeypatch):
+    # The task was killed after the background upload linked the song but before the uploaded checkpoint
+    checkpoint = {"phase": CONSTANTS.CHECKPOINT_DOWNLOADED, "phone_number": "+100", "song_ids": ["first"]}
+    generation = make_generation(scrape_checkpoint=checkpoint)
+    supabase = use_fake_client(Supabase(), make_client(generation, uploaded_paths=["sha256/ab/song.mp3"]), monkeypatch)
+
+    assert supabase.is_valid_song_generation() is True
+
+def test_upload_without_a_resumable_checkpoint_is_rejected(monkeypatch):
+    checkpoint = {"phase": CONSTANTS.CHECKPOINT_DOWNLOADED, "phone_number": "+200", "song_ids": ["first"]}
+    generation = make_generation(scrape_checkpoint=checkpoint)
+    supabase = use_fake_client(Supabase(), make_client(generation, uploaded_paths=["sha256/ab/song.mp3"]), monkeypatch)
+
+    assert supabase.is_valid_song_generation() is False
@@ -0,0 +1,89 @@
+import pytest
+import constants as CONSTANTS
+from db.supabase import Supabase
+from db.write_behind import WriteBehindBuffer
+from fake_supabase import FakeSupabaseClient, use_fake_client
+
+STATUS_TABLE = CONSTANTS.SUPABASE_SCRAPER_STATUS_TABLE
+
+def apply_status_updates(client, params):
+    """The updates of db/sql/apply_status_updates.sql."""
+    updated_rows = 0
+    for status_update in params["p_updates"]:
+        for row in client.tables.get(status_update["table"], []):
+            if row.get(status_update["key_column"]) != status_update["key_value"]:
+                continue
+            row.update(status_update["values"])
+            for column, value in status_update["only_if_null"].items():
+                if row.get(column) is None:
+                    row[column] = value
+            updated_rows += 1
+    return updated_rows
+
+def fail_to_apply(client, params):
+    raise Exception("connection reset")
+
+def make_buffer(monkeypatch, functions=None):
+    client = FakeSupabaseClient(tables={STATUS_TABLE: [
+        {"phone_number": "+100", "remaining_credits": 500, "latest_error": None},
+        {"phone_number": "+200", "remaining_credits": 500, "latest_error": "An earlier error."}
+    ]}, functions=functions)
+    # A flush interval longer than the test, so that only the explicit flushes write
+    buffer = WriteBehindBuffer(use_fake_client(Supabase(), client, monkeypatch), flush_interval=3600)
+    return buffer, client
+
+@pytest.fixture
+def bulk_buffer(monkeypatch):
+    buffer, client = make_buffer(monkeypatch, {"apply_status_updates": apply_status_updates})
+    yield buffer, client
+    buffer.close()
+
+def test_repeated_writes_to_a_row_are_coalesced_into_one_request(bulk_buffer):
+    buffer, client = bulk_buffer
+    for credits in (490, 480, 470):
+        buffer.set(STATUS_TABLE, "phone_number", "+100", {"remaining_credits": credits})
+    buffer.set(STATUS_TABLE, "phone_number", "+200", {"remaining_credits": 300})
+
+    assert buffer.flush()
+
+    assert client.requests == [("rpc", "apply_status_updates")]
+    assert [row["remaining_credits"] for row in client.tables[STATUS_TABLE]] == [470, 300]
+    assert (buffer.writes, buffer.updates, buffer.requests) == (4, 2, 1)
+
+def test_only_if_null_keeps_the_first_error_and_the_stored_one(bulk_buffer):
+    buffer, client = bulk_buffer
+    for phone_number in ("+100", "+200"):
+        buffer.set(STATUS_TABLE, "phone_number", phone_number, {"latest_error": "The first error."}, only_if_null=True)
+        buffer.set(STATUS_TABLE, "phone_number", phone_number, {"latest_error": "A later error."}, only_if_null=True)
+
+    assert buffer.flush()
+
+    assert [row["latest_error"] for row in client.tables[STATUS_TABLE]] == ["The first error.", "An earlier error."]
+
+def test_failed_flush_is_queued_again_under_newer_writes(bulk_buffer):
+    buffer, client = bulk_buffer
+    buffer.set(STATUS_TABLE, "phone_number", "+100", {"remaining_credits": 490})
+    client.functions["apply_status_updates"] = fail_to_apply
+
+    assert not buffer.flush()
+    buffer.set(STATUS_TABLE, "phone_number", "+100", {"remaining_credits": 480})
+    client.functions["apply_status_updates"] = apply_status_updates
+
+    assert buffer.flush()
+    assert client.tables[STATUS_TABLE][0]["remaining_credits"] == 480
+
+def test_rows_are_updated_separately_without_the_function(monkeypatch):
+    buffer, client = make_buffer(monkeypatch)
+    buffer.set(STATUS_TABLE, "phone_number", "+100", {"remaining_credits": 490})
+    buffer.set(STATUS_TABLE, "phone_number", "+100", {"latest_error": "The first error."}, only_if_null=True)
+    buffer.set(STATUS_TABLE, "phone_number", "+200", {"latest_error": "A later error."}, only_if_null=True)
+
+    assert buffer.flush()
+    buffer.set(STATUS_TABLE, "phone_number", "+100", {"remaining_credits": 480})
+    assert buffer.flush()
+    buffer.close()
+
+    assert [row["remaining_credits"] for row in client.tables[STATUS_TABLE]] == [480, 500]
+    assert [row["latest_error"] for row in client.tables[STATUS_TABLE]] == ["The first error.", "An earlier error."]
+    # The missing function is only asked for once
+    assert client.requests.count(("rpc", "apply_status_updates")) == 1
@@ -1,9 +1,11 @@
 import os
 import stat
+import hashlib
 import shutil
 from time import sleep
 from random import randint
 import constants as CONSTANTS
+from dotenv import load_dotenv
 
 def random_micro_sleep(min=CONSTANTS.MICRO_MIN_SECONDS_TO_WAIT, max=CONSTANTS.MICRO_MAX_SECONDS_TO_WAIT):
     """Sleeps for a random minuscule duration."""
@@ -34,6 +36,37 @@ def ensure_directory_exists(directory_path):
     else:
         print(f"UTILS: Directory already exists: {directory_path}")
 
+def get_tmpfs_dir(required_bytes):
+    """Returns the RAM-backed working dir if it's enabled and has room for required_bytes, None otherwise."""
+    load_dotenv()
+
+    if os.getenv("STORAGE_PLACEMENT", CONSTANTS.STORAGE_PLACEMENT) != CONSTANTS.STORAGE_PLACEMENT_TMPFS:
+        return None
+
+    tmpfs_dir = os.getenv("TMPFS_DIR_PATH") or CONSTANTS.TMPFS_DIR_PATH
+    try:
+        os.makedirs(tmpfs_dir, exist_ok=True)
+        free_bytes = shutil.disk_usage(tmpfs_dir).free
+    except Exception as e:
+        print(f"UTILS: Could not use {tmpfs_dir} as a RAM-backed dir: {e}")
+        return None
+
+    if free_bytes < required_bytes + CONSTANTS.TMPFS_MIN_FREE_BYTES:
+        print(f"UTILS: Only {free_bytes // (1024 * 1024)} MB free in {tmpfs_dir}. Spilling over to disk.")
+        return None
+
+    return tmpfs_dir
+
+def place_working_directory(dir_path, required_bytes):
+    """Returns where a working dir should live: in RAM if there's room for it, at dir_path on disk otherwise."""
+    tmpfs_dir = get_tmpfs_dir(required_bytes)
+    if not tmpfs_dir:
+        return os.path.abspath(dir_path)
+
+    placed_dir_path = os.path.join(tmpfs_dir, os.path.basename(os.path.normpath(dir_path)))
+    print(f"UTILS: Placed {dir_path} in RAM at {placed_dir_path}.")
+    return placed_dir_path
+
 def force_delete(action, name, exc):
     """Forcibly deletes a file by changing its permissions."""
     try:
@@ -55,8 +88,31 @@ def delete_file(file_path):
         print(f"UTILS: Error deleting file {file_path}: {e}")
         return False
 
+def get_file_sha256(file_path):
+    """Hashes a file in chunks so that big songs never have to fit in memory. Returns the hex digest or None."""
+    sha256 = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(CONSTANTS.FILE_HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    except Exception as e:
+        print(f"UTILS: Error hashing file {file_path}: {e}")
+        return None
+
 def delete_directory(dir_path):
     """Deletes a directory and its contents, returns True if successful, False otherwise."""
+    # Most trees are writable, so only walk them to fix permissions if a plain delete fails
+    try:
+        shutil.rmtree(dir_path)
+        print(f"UTILS: Deleted directory: {dir_path}")
+        return True
+    except FileNotFoundError:
+        print(f"UTILS: Directory not found during deletion attempt: {dir_path}")
+        return False
+    except Exception as e:
+        print(f"UTILS: Could not delete {dir_path} right away, fixing its permissions first: {e}")
+
     try:
         # Ensure the directory and all its contents have write permission
         for root, dirs, files in os.walk(dir_path, topdown=False):
@@ -83,4 +139,13 @@ def delete_directory(dir_path):
         return False
     except Exception as e:
         print(f"UTILS: Error deleting directory {dir_path}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def execute_async_script_with_timeout(driver, timeout, script, *args):
+    """Run an async script with its own script timeout, then restore the driver's previous one for the other scripts."""
+    previous_timeout = driver.timeouts.script
+    driver.set_script_timeout(timeout)
+    try:
+        return driver.execute_async_script(script, *args)
+    finally:
+        driver.set_script_timeout(previous_timeout)
@@ -0,0 +1,116 @@
+import os
+import time
+import socket
+import create_song
+import utils.utils as utils
+import constants as CONSTANTS
+from dotenv import load_dotenv
+from db.write_behind import flush_write_behind_buffer
+from job_queue.dispatcher import GroupingDispatcher
+from metrics.metrics import start_prometheus_exporter
+from job_queue.job_queue import get_job_queue, JobHeartbeat
+from structured_logging.structured_logging import setup_logging
+
+def get_worker_id():
+    """Returns a unique ID for this worker."""
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+def flush_status_updates(generation_id):
+    """Retry the pending status updates of a job while its lease is still alive. Returns False if some are still unsaved."""
+    for attempt in range(CONSTANTS.WRITE_BEHIND_ACK_FLUSH_TRIES):
+        if flush_write_behind_buffer():
+            return True
+        print(f"WORKER: Could not save the status updates of the generation {generation_id} (attempt #{attempt + 1}).")
+        utils.sleep_custom(CONSTANTS.WRITE_BEHIND_FLUSH_INTERVAL)
+    return False
+
+def run_job(job_queue, job, worker_id, phone_number=None, browser_session=None):
+    """Scrapes a leased job while keeping its lease alive, on the browser of the session if one is given."""
+    # Jobs enqueued without a phone number run on the account of this worker
+    job_phone_number = job["phone_number"] or phone_number
+    if not job_phone_number:
+        print(f"WORKER: The generation {job['generation_id']} has no phone number and neither has this worker.")
+        return job_queue.fail(job["generation_id"], worker_id, "No phone number to scrape the generation with.")
+
+    os.environ["GENERATION_ID"] = job["generation_id"]
+    os.environ["PHONE_NUMBER"] = job_phone_number
+    os.environ["MAX_RUNTIME"] = str(job["max_runtime"])
+
+    print(f"WORKER: Claimed the generation {job['generation_id']} (attempt #{job['attempts']}).")
+
+    heartbeat = JobHeartbeat(job_queue, job["generation_id"], worker_id)
+    heartbeat.start()
+
+    result = {"song_output": None, "retryable": True, "status_saved": False}
+    try:
+        start_time = int(time.time())
+        result = create_song.main(start_time, browser_session)
+        status_saved = result["status_saved"] or flush_status_updates(job["generation_id"])
+    except Exception as e:
+        print(f"WORKER: Got an unexpected error while scraping the generation {job['generation_id']}. Details: {e}")
+        if browser_session:
+            browser_session.close()
+        status_saved = flush_status_updates(job["generation_id"])
+    finally:
+        heartbeat.stop()
+
+    if heartbeat.lost_lease:
+        print(f"WORKER: Not acknowledging the generation {job['generation_id']} because the lease was lost.")
+        return False
+
+    if not status_saved:
+        # The lease expires and the job goes back in the queue instead of being acknowledged with its credits or errors unsaved
+        print(f"WORKER: Not acknowledging the generation {job['generation_id']} because its status updates could not be saved.")
+        return False
+
+    if result["song_output"]:
+        return job_queue.complete(job["generation_id"], worker_id)
+
+    if result["retryable"]:
+        print(f"WORKER: Putting the generation {job['generation_id']} back in the queue after attempt #{job['attempts']}.")
+        return job_queue.retry(job["generation_id"], worker_id, "The scraper could not create and save the song.")
+
+    return job_queue.fail(job["generation_id"], worker_id, "The scraper could not create and save the song.")
+
+def run_worker():
+    """Claims and scrapes generations until the queue stays empty for WORKER_MAX_IDLE_TIME seconds."""
+    load_dotenv()
+
+    job_queue = get_job_queue()
+    browser_session = None
+    if os.getenv("WORKER_REUSE_BROWSER", str(CONSTANTS.WORKER_REUSE_BROWSER)).lower() == "true":
+        browser_session = create_song.BrowserSession()
+    dispatcher = GroupingDispatcher(job_queue, browser_reused=browser_session is not None)
+    worker_id = get_worker_id()
+    phone_number = os.getenv("PHONE_NUMBER")
+    max_idle_time = int(os.getenv("WORKER_MAX_IDLE_TIME", CONSTANTS.WORKER_MAX_IDLE_TIME))
+
+    print(f"WORKER: Started the worker {worker_id} for the phone number {phone_number}.")
+    start_prometheus_exporter()
+
+    last_job_time = time.time()
+    try:
+        while time.time() - last_job_time < max_idle_time:
+            job = dispatcher.claim(worker_id, phone_number)
+            if not job:
+                utils.sleep_custom(CONSTANTS.WORKER_POLL_INTERVAL)
+                continue
+
+            run_job(job_queue, job, worker_id, phone_number, browser_session)
+            if browser_session and not browser_session.driver:
+                dispatcher.forget_mode()
+            last_job_time = time.time()
+
+        print(f"WORKER: No jobs for {max_idle_time} seconds. Shutting down the worker {worker_id}.")
+    finally:
+        if browser_session:
+            browser_session.close()
+
+    if browser_session:
+        dispatcher.report(*browser_session.get_toggle_stats())
+    else:
+        dispatcher.report()
+
+if __name__ == '__main__':
+    setup_logging()
+    run_worker()